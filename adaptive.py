@@ -0,0 +1,166 @@
+"""
+Monte Carlo sweeps that decide for themselves how many replicates each point
+needs. Rather than running the same fixed number everywhere (N_SIMS in
+experiments.py), replicates are added to each point in rounds until the
+confidence interval of its summary statistic is narrower than a requested
+half-width, or until the point (or the whole sweep) runs out of budget.
+Points that settle quickly stop early and the budget goes to the noisy ones.
+
+Replicates run on an executor.ReplicateExecutor. Every point gets its own
+seed sequence spawned from the root seed, and each new replicate the next
+child of it, so replicate i of a point is the same whatever the batch sizes
+or the number of workers.
+"""
+from statistics import NormalDist
+import numpy as np
+from executor import ReplicateExecutor
+
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_MIN_REPLICATES = 10
+DEFAULT_MAX_REPLICATES = 1000
+
+
+def half_width(values, confidence=DEFAULT_CONFIDENCE):
+    """
+    Half-width of the normal-approximation confidence interval for the mean
+    of values, i.e. z * s / sqrt(n). Infinite with fewer than two values.
+    """
+    n = len(values)
+    if n < 2:
+        return float('inf')
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    return float(z * np.std(values, ddof=1) / np.sqrt(n))
+
+
+class PointResult:
+    """
+    The replicates run at one sweep point so far: the summary of each one in
+    order, the mean and half-width of its confidence interval, and whether
+    the half-width target has been reached.
+    """
+
+    def __init__(self, confidence):
+        self.confidence = confidence
+        self.values = []
+        self.converged = False
+
+    def get_n_replicates(self):
+        return len(self.values)
+
+    def get_mean(self):
+        return float(np.mean(self.values)) if self.values else float('nan')
+
+    def get_half_width(self):
+        return half_width(self.values, self.confidence)
+
+    def replicates_needed(self, target):
+        """
+        Rough total number of replicates needed to bring the half-width down
+        to target, from the spread seen so far. Infinite if the spread isn't
+        finite, e.g. when some replicates blew up to inf or nan, since then
+        no number of replicates will do.
+        """
+        spread = self.get_half_width() * np.sqrt(len(self.values))
+        with np.errstate(over='ignore'):
+            needed = (spread / target) ** 2
+        if not np.isfinite(needed):
+            return float('inf')
+        return int(np.ceil(needed))
+
+
+def summarize(results):
+    """
+    Dict of arrays with one entry per point: the mean, the half-width, the
+    number of replicates used and whether the target was reached.
+    """
+    return {
+        'mean' : np.array([result.get_mean() for result in results]),
+        'half_width' : np.array([result.get_half_width()
+                                 for result in results]),
+        'n_replicates' : np.array([result.get_n_replicates()
+                                   for result in results]),
+        'converged' : np.array([result.converged for result in results])
+    }
+
+
+class AdaptiveSweep:
+    """
+    Runs a list of TaskSpecs (one per sweep point) with as many replicates
+    each as it takes to estimate the mean of their summary to within
+    target_half_width.
+
+    target_half_width: the confidence interval half-width to stop at
+    confidence: confidence level of the interval
+    min_replicates: replicates every point starts with
+    max_replicates: most replicates any one point gets
+    budget: most replicates in the whole sweep, None for no limit
+    workers: number of worker processes, as in ReplicateExecutor
+    """
+
+    def __init__(self, target_half_width, confidence=DEFAULT_CONFIDENCE,
+                 min_replicates=DEFAULT_MIN_REPLICATES,
+                 max_replicates=DEFAULT_MAX_REPLICATES, budget=None,
+                 workers=None):
+        if min_replicates < 2:
+            raise ValueError("need at least 2 replicates for an interval")
+        self.target_half_width = target_half_width
+        self.confidence = confidence
+        self.min_replicates = min_replicates
+        self.max_replicates = max_replicates
+        self.budget = budget
+        self.executor = ReplicateExecutor(workers)
+
+    def next_batch(self, result):
+        """
+        Number of replicates to add to a point in the next round: enough to
+        reach the target going by the spread so far, but at most as many as
+        it already has (the spread of a few replicates is a poor guide) and
+        no more than max_replicates in total. A point whose spread isn't
+        finite never converges, so it just keeps doubling up to
+        max_replicates.
+        """
+        n = result.get_n_replicates()
+        if n == 0:
+            wanted = self.min_replicates
+        else:
+            needed = result.replicates_needed(self.target_half_width)
+            wanted = max(min(needed - n, n), 1)
+        return max(min(wanted, self.max_replicates - n), 0)
+
+    def run(self, specs, seed=None):
+        """
+        Runs the sweep and returns a list with a PointResult for each spec.
+        Each round, every point that hasn't converged gets its next batch of
+        replicates, all of them sharing one pool, until every point has
+        converged or hit max_replicates, or the budget is used up. If the
+        budget runs out partway through a round the points earlier in the
+        list get their batches first.
+
+        seed: root seed; the results are the same for the same seed
+        """
+        point_seeds = np.random.SeedSequence(seed).spawn(len(specs))
+        results = [PointResult(self.confidence) for _ in specs]
+        remaining = self.budget
+        while True:
+            tasks = []
+            for index, result in enumerate(results):
+                if result.converged:
+                    continue
+                batch = self.next_batch(result)
+                if remaining is not None:
+                    batch = min(batch, remaining)
+                    remaining -= batch
+                tasks.extend((index, child)
+                             for child in point_seeds[index].spawn(batch))
+            if not tasks:
+                break
+            values = self.executor.run_tasks(
+                [specs[index] for index, _ in tasks],
+                [child for _, child in tasks])
+            for (index, _), value in zip(tasks, values):
+                results[index].values.append(value)
+            for result in results:
+                if (result.get_n_replicates() >= self.min_replicates and
+                        result.get_half_width() <= self.target_half_width):
+                    result.converged = True
+        return results
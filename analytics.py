@@ -0,0 +1,141 @@
+"""
+NumPy versions of the inflation calculations. Everything here works on arrays
+(along the last axis, so a batch of price indices with one row per replicate
+works too) and avoids re-summing the same data: moving averages come from
+cumulative sums, and questions about the inflation between two periods are
+answered from prefix sums in constant time.
+"""
+import numpy as np
+
+PERIODS_PER_YEAR = 12 # convention used throughout the model
+
+
+def lagged_inflation(price_index, lag):
+    """
+    Rate of change of the price index in each period compared to 'lag'
+    periods earlier. Has lag fewer entries than the price index.
+
+    price_index: array of price index values
+    lag: the length of the lag
+    """
+    price_index = np.asarray(price_index, dtype=float)
+    n_values = max(price_index.shape[-1] - lag, 0)
+    earlier = price_index[..., :n_values]
+    later = price_index[..., lag:lag + n_values]
+    return (later - earlier) / earlier
+
+
+def tail_inflation(tail):
+    """
+    Period-to-period and year-over-year inflation in the latest period, for
+    streaming runs that only keep the last few raw index values. Returns a
+    dict with 'inflation' and 'yoy_inflation', leaving either out until the
+    tail goes back far enough for it.
+
+    tail: the latest raw index values, oldest first (e.g. a deque); each
+        can be a scalar or an array with one value per replicate
+    """
+    rates = {}
+    raw_value = tail[-1]
+    for key, lag in [('inflation', 1), ('yoy_inflation', PERIODS_PER_YEAR)]:
+        if len(tail) > lag:
+            earlier = tail[-lag - 1]
+            rates[key] = (raw_value - earlier) / earlier
+    return rates
+
+
+def period_to_period_inflation(price_index):
+    """Rate of change of the price index from one period to the next."""
+    return lagged_inflation(price_index, 1)
+
+
+def moving_average(series, window):
+    """
+    Moving average of a series over a window, computed from a cumulative sum
+    so it takes O(n) rather than O(n * window). Has window - 1 fewer entries
+    than the series.
+
+    series: the data to calculate the moving average on
+    window: the size of the window over which the moving average is done
+    """
+    series = np.asarray(series, dtype=float)
+    n_values = max(series.shape[-1] - window + 1, 0)
+    zeros = np.zeros(series.shape[:-1] + (1,))
+    sums = np.concatenate([zeros, np.cumsum(series, axis=-1)], axis=-1)
+    return (sums[..., window:window + n_values] - sums[..., :n_values]) / window
+
+
+def annualize(rate, periods=1, periods_per_year=PERIODS_PER_YEAR):
+    """
+    Converts a rate of inflation over some number of periods into an
+    annual rate, compounding.
+
+    rate: inflation rate over the given number of periods
+    periods: how many periods the rate is measured over
+    """
+    return (1 + np.asarray(rate)) ** (periods_per_year / periods) - 1
+
+
+class InflationRanges:
+    """
+    Answers questions about inflation between any two periods in constant
+    time. Built once from a price index: the log of the price index is the
+    prefix sum of the period-to-period log growth rates, and a second prefix
+    sum is kept of the period-to-period inflation rates themselves.
+    """
+
+    def __init__(self, price_index):
+        price_index = np.asarray(price_index, dtype=float)
+        self.log_index = np.log(price_index)
+        inflation = period_to_period_inflation(price_index)
+        self.inflation_sums = np.concatenate([[0.0], np.cumsum(inflation)])
+
+    def get_n_periods(self):
+        return len(self.log_index)
+
+    def inflation_between(self, start, end):
+        """
+        Total inflation from period start to period end.
+
+        start, end: period numbers, with start before end
+        """
+        return float(np.expm1(self.log_index[end] - self.log_index[start]))
+
+    def annualized_between(self, start, end,
+                           periods_per_year=PERIODS_PER_YEAR):
+        """
+        Average annual (compounded) rate of inflation from period start to
+        period end.
+        """
+        log_growth = self.log_index[end] - self.log_index[start]
+        return float(np.expm1(log_growth * periods_per_year / (end - start)))
+
+    def mean_period_inflation_between(self, start, end):
+        """
+        Mean of the period-to-period inflation rates in periods start + 1 to
+        end, i.e. over the changes that happen between start and end.
+        """
+        total = self.inflation_sums[end] - self.inflation_sums[start]
+        return float(total / (end - start))
+
+
+def cross_sector_stats(prices, last_prices, wage_shares, counts=None):
+    """
+    How much sectors differ from each other in a single period: the mean
+    and standard deviation across sectors of the wage share and of each
+    sector's own period-to-period inflation. Returns a dict.
+
+    prices, last_prices: arrays of sector prices this period and last period
+    wage_shares: array of sector wage shares this period
+    counts: how many sectors each entry stands for (e.g. the size of each
+        cohort in the array engine); None counts every entry once
+    """
+    sector_inflation = (prices - last_prices) / last_prices
+    stats = {}
+    for name, values in [('wage_share', wage_shares),
+                         ('sector_inflation', sector_inflation)]:
+        mean = np.average(values, weights=counts)
+        variance = np.average((values - mean) ** 2, weights=counts)
+        stats[name + '_mean'] = float(mean)
+        stats[name + '_std'] = float(np.sqrt(variance))
+    return stats
@@ -0,0 +1,138 @@
+"""
+Headless entry point for batch jobs and worker processes. Runs any function
+in experiments.py with the arguments given on the command line and writes
+what it returns as JSON, with graphs saved to files (Agg backend) instead of
+shown. Nothing imports matplotlib or tqdm unless a graph or progress bar is
+actually needed, so starting up is quick.
+
+    python batch.py yoy_inflation_based_on_desire_offset lags_match=True \\
+        n_sectors=50 n_periods=100 seed=1 -o result.json
+    python batch.py --startup    # time from a cold start to the first period
+
+Arguments are name=value, with the value read as a Python literal (numbers,
+True/False, None, lists, quoted strings) or as a plain string otherwise.
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import time
+
+# what a fresh worker does before it can do any work: import the experiments
+# and the model, make an economy and advance it once
+STARTUP_SCRIPT = '''
+import time
+start = time.perf_counter()
+import experiments
+from settings import Settings
+from gen import Generator
+economy = Generator().generate(Settings(), {n_sectors})
+economy.advance()
+print(time.perf_counter() - start)
+'''
+
+
+def parse_value(text):
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+def parse_arguments(pairs):
+    """Turns a list of 'name=value' strings into a dict of keyword arguments."""
+    kwargs = {}
+    for pair in pairs:
+        name, separator, value = pair.partition('=')
+        if not separator:
+            raise ValueError(f"expected name=value, got '{pair}'")
+        kwargs[name] = parse_value(value)
+    return kwargs
+
+
+def to_json(value):
+    """Makes arrays (and anything else with tolist) JSON-friendly."""
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    if isinstance(value, dict):
+        return {str(key) : to_json(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+    return value
+
+
+def run_experiment(name, kwargs, figure_directory=None):
+    """
+    Runs experiments.<name>(**kwargs) headless and returns the result and
+    how long it took.
+    """
+    import graphing
+    graphing.set_headless(True, figure_directory)
+    import experiments
+    function = getattr(experiments, name, None)
+    if not callable(function):
+        raise ValueError(f"experiments.py has no function '{name}'")
+    start = time.perf_counter()
+    result = function(**kwargs)
+    return result, time.perf_counter() - start
+
+
+def measure_startup(n_sectors=1, repeats=5):
+    """
+    Starts a fresh interpreter repeats times and times it from launch to the
+    end of the first period. Returns a dict with the best total time and the
+    best time spent after the interpreter itself was up (imports, generating
+    and one advance).
+    """
+    script = STARTUP_SCRIPT.format(n_sectors=n_sectors)
+    totals = []
+    in_process = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, '-c', script], check=True, capture_output=True,
+            text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        totals.append(time.perf_counter() - start)
+        in_process.append(float(output.split()[-1]))
+    return {'total' : min(totals), 'import_to_first_period' : min(in_process)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Runs an experiments.py function headless.')
+    parser.add_argument('experiment', nargs='?',
+                        help='name of a function in experiments.py')
+    parser.add_argument('arguments', nargs='*', help='name=value arguments')
+    parser.add_argument('-o', '--output', help='JSON file for the result')
+    parser.add_argument('--figures', help='directory to save graphs in')
+    parser.add_argument('--startup', action='store_true',
+                        help='measure cold start to first period instead')
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        timings = measure_startup()
+        print(f"cold start to first period: {timings['total']:.3f} s "
+              f"({timings['import_to_first_period']:.3f} s after the "
+              "interpreter started)")
+        return 0
+    if args.experiment is None:
+        parser.error('an experiment or --startup is required')
+    try:
+        kwargs = parse_arguments(args.arguments)
+    except ValueError as error:
+        parser.error(str(error))
+    result, seconds = run_experiment(args.experiment, kwargs, args.figures)
+    report = {'experiment' : args.experiment, 'arguments' : kwargs,
+              'seconds' : seconds, 'result' : to_json(result)}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=1)
+    else:
+        print(json.dumps(report))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
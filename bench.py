@@ -0,0 +1,305 @@
+"""
+Headless benchmarks for the hot paths: generating economies, advancing them,
+building the price index and the inflation and moving average series, and a
+representative experiments.py sweep. Each benchmark is timed over a grid of
+sector counts and horizons, and the results are written as JSON along with
+scaling curves (the log-log slope of time against size), so they can be
+kept and compared against later runs.
+
+    python bench.py run -o bench.json               # default grid
+    python bench.py run --quick -o bench.json       # small grid, seconds
+    python bench.py compare baseline.json bench.json
+
+compare flags every benchmark that got slower than the baseline by more than
+the tolerance and exits with status 1 if there are any, so it can gate a
+change. run --baseline does both in one go.
+"""
+import argparse
+import json
+import platform
+import random as rd
+import sys
+import time
+import numpy as np
+import catalog
+from settings import Settings
+from gen import Generator
+
+SECTOR_COUNTS = [1, 10, 100, 1000, 10000, 100000]
+HORIZONS = [100, 1000, 10000, 100000]
+QUICK_SECTOR_COUNTS = [1, 100, 1000]
+QUICK_HORIZONS = [100, 1000]
+# cells with more sector-periods than this are skipped, since the biggest
+# corner of the grid (10^10 sector-periods) would run for hours
+DEFAULT_MAX_WORK = 2 * 10 ** 7
+DEFAULT_REPEATS = 3
+DEFAULT_TOLERANCE = 0.25 # 25% slower than the baseline is a regression
+# cells faster than this in the baseline are too noisy to compare
+MIN_COMPARE_SECONDS = 0.001
+
+
+def random_settings():
+    """Settings with every sector parameter random, the hardest case."""
+    settings = Settings()
+    settings.set_all_random()
+    return settings
+
+
+def seed_everything(seed=0):
+    rd.seed(seed)
+    np.random.seed(seed)
+
+
+def advanced_economy(n_sectors, n_periods):
+    """A random economy of n_sectors, already advanced by n_periods."""
+    economy = Generator().generate_bulk(random_settings(), n_sectors, rng=0)
+    economy.advance_n(n_periods)
+    return economy
+
+
+def fresh_series(economy):
+    """Forgets the stored index and derived series, as after a change."""
+    economy.raw_index = None
+    economy.series_cache.invalidate()
+
+
+SWEEP_REPLICATES = 100 # experiments.N_SIMS
+
+
+def cold_start(n_sectors):
+    """A fresh interpreter, from launch to the end of the first period."""
+    import batch
+    return batch.measure_startup(n_sectors, repeats=1)
+
+
+def sweep_point(n_sectors, n_periods):
+    """
+    One point of experiments.yoy_inflation_based_on_desire_offset: a batch
+    of replicates summarized by their average YoY inflation rate.
+    """
+    from montecarlo import BatchRunner
+    settings = Settings()
+    settings.set_lags_match(False)
+    return BatchRunner(0).run_summary(settings, n_sectors, n_periods,
+                                      SWEEP_REPLICATES)
+
+
+""" Every benchmark, as name : (setup, timed, work). setup(n_sectors,
+    n_periods) is not timed and returns the argument for timed, which is.
+    work(n_sectors, n_periods) is the size compared against the max_work
+    limit. Benchmarks that don't depend on the horizon (or the number of
+    sectors) ignore it."""
+BENCHMARKS = {
+    'generate' : (
+        lambda n_sectors, n_periods: seed_everything(),
+        lambda n_sectors, n_periods, _: Generator().generate(
+            random_settings(), n_sectors),
+        lambda n_sectors, n_periods: n_sectors),
+    'generate_bulk' : (
+        lambda n_sectors, n_periods: None,
+        lambda n_sectors, n_periods, _: Generator().generate_bulk(
+            random_settings(), n_sectors, rng=0),
+        lambda n_sectors, n_periods: n_sectors),
+    'advance_n' : (
+        lambda n_sectors, n_periods: Generator().generate_bulk(
+            random_settings(), n_sectors, rng=0),
+        lambda n_sectors, n_periods, economy: economy.advance_n(n_periods),
+        lambda n_sectors, n_periods: n_sectors * n_periods),
+    'calculate_price_index' : (
+        lambda n_sectors, n_periods: advanced_economy(n_sectors, n_periods),
+        lambda n_sectors, n_periods, economy: (
+            fresh_series(economy), economy.calculate_price_index()),
+        lambda n_sectors, n_periods: n_sectors * n_periods),
+    'inflation_series' : (
+        lambda n_sectors, n_periods: advanced_economy(n_sectors, n_periods),
+        lambda n_sectors, n_periods, economy: (
+            economy.series_cache.invalidate(),
+            economy.period_to_period_inflation_series(),
+            economy.year_over_year_inflation_series(),
+            economy.get_ptp_moving_average(6),
+            economy.get_yoy_moving_average(6)),
+        lambda n_sectors, n_periods: n_periods),
+    'cold_start' : (
+        lambda n_sectors, n_periods: None,
+        lambda n_sectors, n_periods, _: cold_start(n_sectors),
+        lambda n_sectors, n_periods: n_sectors),
+    'sweep_point' : (
+        lambda n_sectors, n_periods: None,
+        lambda n_sectors, n_periods, _: sweep_point(n_sectors, n_periods),
+        lambda n_sectors, n_periods: SWEEP_REPLICATES * n_sectors * n_periods)
+}
+
+
+def time_cell(name, n_sectors, n_periods, repeats):
+    """Times one benchmark at one grid point; returns every run's time."""
+    setup, timed, _ = BENCHMARKS[name]
+    times = []
+    # fully random economies can blow up over long horizons, which is
+    # fine here but not worth a warning per cell
+    with np.errstate(all='ignore'):
+        for _ in range(repeats):
+            argument = setup(n_sectors, n_periods)
+            start = time.perf_counter()
+            timed(n_sectors, n_periods, argument)
+            times.append(time.perf_counter() - start)
+    return times
+
+
+def grid_for(name, sector_counts, horizons):
+    """
+    The grid points a benchmark is run on. The ones that only depend on
+    one of the two sizes are run along that axis alone.
+    """
+    _, _, work = BENCHMARKS[name]
+    if work(2, 1) == work(2, 3):
+        return [(n_sectors, horizons[0]) for n_sectors in sector_counts]
+    if work(2, 3) == work(1, 3):
+        return [(sector_counts[0], n_periods) for n_periods in horizons]
+    return [(n_sectors, n_periods) for n_sectors in sector_counts
+            for n_periods in horizons]
+
+
+def slope(sizes, seconds):
+    """Log-log slope of time against size: ~1 is linear, ~2 quadratic."""
+    if len(sizes) < 2:
+        return None
+    return float(np.polyfit(np.log(sizes), np.log(seconds), 1)[0])
+
+
+def scaling_curves(results):
+    """
+    For every benchmark, the slope of time against the number of sectors at
+    each horizon, and against the horizon at each number of sectors.
+    """
+    curves = {}
+    for name in BENCHMARKS:
+        cells = [cell for cell in results if cell['benchmark'] == name]
+        curve = {'sectors' : {}, 'periods' : {}}
+        for axis, other in [('sectors', 'periods'), ('periods', 'sectors')]:
+            for value in sorted({cell[f'n_{other}'] for cell in cells}):
+                line = sorted((cell[f'n_{axis}'], cell['seconds'])
+                              for cell in cells
+                              if cell[f'n_{other}'] == value)
+                value_slope = slope(*zip(*line)) if len(line) > 1 else None
+                if value_slope is not None:
+                    curve[axis][str(value)] = value_slope
+        curves[name] = curve
+    return curves
+
+
+def run(benchmarks, sector_counts, horizons, repeats=DEFAULT_REPEATS,
+        max_work=DEFAULT_MAX_WORK, verbose=True):
+    """
+    Runs the benchmarks over the grid and returns the report as a dict:
+    metadata about the machine and code, one entry per grid cell with the
+    best of the repeated times (and all of them), and the scaling curves.
+    """
+    results = []
+    for name in benchmarks:
+        for n_sectors, n_periods in grid_for(name, sector_counts, horizons):
+            if BENCHMARKS[name][2](n_sectors, n_periods) > max_work:
+                continue
+            times = time_cell(name, n_sectors, n_periods, repeats)
+            results.append({'benchmark' : name, 'n_sectors' : n_sectors,
+                            'n_periods' : n_periods, 'seconds' : min(times),
+                            'times' : times})
+            if verbose:
+                print(f"{name:<24}{n_sectors:>8} sectors{n_periods:>8} "
+                      f"periods{min(times):>12.6f} s", flush=True)
+    return {
+        'meta' : {
+            'created' : time.time(),
+            'code_version' : catalog.code_version(),
+            'python' : platform.python_version(),
+            'numpy' : np.__version__,
+            'machine' : platform.platform(),
+            'repeats' : repeats,
+            'max_work' : max_work
+        },
+        'results' : results,
+        'scaling' : scaling_curves(results)
+    }
+
+
+def compare(baseline, current, tolerance=DEFAULT_TOLERANCE,
+            min_seconds=MIN_COMPARE_SECONDS):
+    """
+    Matches up the cells of two reports and returns a list of
+    (benchmark, n_sectors, n_periods, baseline seconds, current seconds,
+    ratio) for every cell that got slower by more than tolerance. Cells
+    that took less than min_seconds in the baseline are left out.
+    """
+    old = {(cell['benchmark'], cell['n_sectors'], cell['n_periods']) :
+           cell['seconds'] for cell in baseline['results']}
+    regressions = []
+    for cell in current['results']:
+        key = (cell['benchmark'], cell['n_sectors'], cell['n_periods'])
+        if key in old and old[key] >= min_seconds:
+            ratio = cell['seconds'] / old[key]
+            if ratio > 1 + tolerance:
+                regressions.append(key + (old[key], cell['seconds'], ratio))
+    return regressions
+
+
+def report_regressions(regressions, tolerance):
+    if not regressions:
+        print(f"no regressions over {tolerance:.0%}")
+        return 0
+    for name, n_sectors, n_periods, old, new, ratio in regressions:
+        print(f"REGRESSION {name} ({n_sectors} sectors, {n_periods} "
+              f"periods): {old:.6f} s -> {new:.6f} s ({ratio:.2f}x)")
+    return 1
+
+
+def load(filename):
+    with open(filename) as file:
+        return json.load(file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('-o', '--output', help='JSON file to write')
+    run_parser.add_argument('--quick', action='store_true',
+                            help='small grid, for a smoke test')
+    run_parser.add_argument('--benchmarks', nargs='+',
+                            choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    run_parser.add_argument('--sectors', nargs='+', type=int)
+    run_parser.add_argument('--horizons', nargs='+', type=int)
+    run_parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS)
+    run_parser.add_argument('--max-work', type=float, default=DEFAULT_MAX_WORK,
+                            help='skip cells with more sector-periods')
+    run_parser.add_argument('--baseline',
+                            help='report to compare the results against')
+    run_parser.add_argument('--tolerance', type=float,
+                            default=DEFAULT_TOLERANCE)
+    compare_parser = commands.add_parser(
+        'compare', help='compare two reports written by run')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--tolerance', type=float,
+                                default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        return report_regressions(
+            compare(load(args.baseline), load(args.current), args.tolerance),
+            args.tolerance)
+    sector_counts = args.sectors or (QUICK_SECTOR_COUNTS if args.quick
+                                     else SECTOR_COUNTS)
+    horizons = args.horizons or (QUICK_HORIZONS if args.quick else HORIZONS)
+    report = run(args.benchmarks, sector_counts, horizons, args.repeats,
+                 args.max_work)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=1)
+    if args.baseline:
+        return report_regressions(
+            compare(load(args.baseline), report, args.tolerance),
+            args.tolerance)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,283 @@
+"""
+A local catalog of results, so that runs don't have to be simulated again
+every time they are looked at. Each run is recorded in an SQLite database
+with the settings and global parameters it was made with, the number of
+sectors and periods, the seed and the version of the code, and its series
+are saved next to the database as .npy files. Queries on the metadata return
+the matching runs, whose arrays are loaded memory-mapped.
+"""
+import hashlib
+import json
+import os
+import time
+import numpy as np
+from settings import Settings, settings_record
+
+DEFAULT_DIRECTORY = 'results'
+DATABASE_NAME = 'catalog.sqlite'
+
+""" Modules whose code decides what a run produces, including the
+    experiments whose results go through simcache.cached_call. Only these go
+    into the code version, so changing tooling like bench.py or sweep.py
+    doesn't make every cached or catalogued result look out of date."""
+MODEL_MODULES = ['economy', 'engine', 'sectors', 'params', 'shocks', 'gen',
+                 'montecarlo', 'settings', 'analytics', 'schedule', 'series',
+                 'convergence', 'online', 'experiments', 'executor',
+                 'adaptive']
+
+""" Global parameters recorded as columns of their own, so they can be
+    queried on."""
+GLOBAL_COLUMNS = ['v_w', 'v_f', 'mu_bar', 'phi_bar', 'freq_max']
+
+""" Every column that find accepts, along with its SQL type."""
+RUN_COLUMNS = {
+    'id' : 'INTEGER PRIMARY KEY',
+    'created' : 'REAL',
+    'label' : 'TEXT',
+    'code_version' : 'TEXT',
+    'n_sectors' : 'INTEGER',
+    'n_periods' : 'INTEGER',
+    'n_replicates' : 'INTEGER',
+    'seed' : 'INTEGER',
+    'lags_match' : 'INTEGER',
+    'stochastic' : 'INTEGER',
+    'locally_stochastic' : 'INTEGER',
+    'v_w' : 'REAL',
+    'v_f' : 'REAL',
+    'mu_bar' : 'REAL',
+    'phi_bar' : 'REAL',
+    'freq_max' : 'REAL',
+    'desire_offset' : 'REAL', # v_w - v_f
+    'settings' : 'TEXT' # everything in the Settings object, as JSON
+}
+
+
+def code_version(directory=None):
+    """
+    A short hash of the model's source files (see MODEL_MODULES), so results
+    can be tied to the exact code that produced them.
+    """
+    if directory is None:
+        directory = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for module in sorted(MODEL_MODULES):
+        name = module + '.py'
+        digest.update(name.encode())
+        with open(os.path.join(directory, name), 'rb') as source:
+            digest.update(source.read())
+    return digest.hexdigest()[:16]
+
+
+def global_values(settings : Settings, global_params=None):
+    """
+    Values for the global parameter columns. Taken from global_params if
+    given, either a GlobalParams object or a dict of per-replicate arrays
+    like BatchResult.global_params, where a parameter only gets a value if
+    every replicate has the same one. Otherwise the settings' defaults are
+    used for the parameters that aren't drawn at random.
+    """
+    values = {}
+    for name in GLOBAL_COLUMNS:
+        if global_params is None:
+            if settings.check_if_default(name):
+                values[name] = float(settings.get_global_default(name))
+            else:
+                values[name] = None
+        elif isinstance(global_params, dict):
+            column = np.asarray(global_params[name], dtype=float)
+            values[name] = (float(column.flat[0])
+                            if np.all(column == column.flat[0]) else None)
+        else:
+            attribute = 'frequency_max' if name == 'freq_max' else name
+            values[name] = float(getattr(global_params, attribute))
+    return values
+
+
+class CatalogRun:
+    """
+    One run in the catalog: its metadata as attributes named after the
+    columns in RUN_COLUMNS, and the names of its saved arrays, which are
+    loaded memory-mapped on request.
+    """
+
+    def __init__(self, catalog, row, array_names):
+        self.catalog = catalog
+        for name, value in row.items():
+            setattr(self, name, value)
+        self.settings = json.loads(row['settings'])
+        self.array_names = array_names
+
+    def get_array(self, name):
+        """Returns one of the run's arrays, memory-mapped read-only."""
+        return self.catalog.load_array(self.id, name)
+
+    def get_arrays(self):
+        """Returns a dict of all the run's arrays, memory-mapped."""
+        return {name : self.get_array(name) for name in self.array_names}
+
+
+class ResultsCatalog:
+    """
+    The catalog itself: a directory holding the SQLite database and a
+    subdirectory of .npy files for each run.
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY):
+        self.directory = directory
+        # only imported once a catalog is opened, since everything that
+        # needs code_version (e.g. the result cache) imports this module
+        import sqlite3
+        os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(directory,
+                                                       DATABASE_NAME))
+        self.connection.row_factory = sqlite3.Row
+        columns = ', '.join(f'{name} {kind}'
+                            for name, kind in RUN_COLUMNS.items())
+        with self.connection:
+            self.connection.execute(
+                f'CREATE TABLE IF NOT EXISTS runs ({columns})')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS arrays (run_id INTEGER, '
+                'name TEXT, file TEXT, PRIMARY KEY (run_id, name))')
+        self.code_version = code_version()
+
+    def close(self):
+        self.connection.close()
+
+    def add_run(self, settings : Settings, n_sectors, n_periods, arrays,
+                global_params=None, seed=None, n_replicates=1, label=None):
+        """
+        Records a run and saves its arrays. Returns the new run's id.
+
+        arrays: dict of the arrays to save, keyed by name
+        global_params: the GlobalParams (or per-replicate dict of arrays)
+            the run actually used, if not just the settings' defaults
+        seed: the seed the run was made from, if any
+        label: any name to make the run easier to find again
+        """
+        values = global_values(settings, global_params)
+        desire_offset = None
+        if values['v_w'] is not None and values['v_f'] is not None:
+            desire_offset = values['v_w'] - values['v_f']
+        row = {
+            'created' : time.time(),
+            'label' : label,
+            'code_version' : self.code_version,
+            'n_sectors' : n_sectors,
+            'n_periods' : n_periods,
+            'n_replicates' : n_replicates,
+            'seed' : seed,
+            'lags_match' : int(settings.lags_match()),
+            'stochastic' : int(settings.is_stochastic()),
+            'locally_stochastic' : int(settings.is_locally_stochastic()),
+            'desire_offset' : desire_offset,
+            'settings' : json.dumps(settings_record(settings))
+        }
+        row.update(values)
+        names = list(row)
+        with self.connection:
+            cursor = self.connection.execute(
+                f'INSERT INTO runs ({", ".join(names)}) VALUES '
+                f'({", ".join("?" * len(names))})',
+                [row[name] for name in names])
+            run_id = cursor.lastrowid
+            run_directory = os.path.join(self.directory, f'run_{run_id}')
+            os.makedirs(run_directory, exist_ok=True)
+            for name, array in arrays.items():
+                file = os.path.join(f'run_{run_id}', f'{name}.npy')
+                np.save(os.path.join(self.directory, file),
+                        np.asarray(array))
+                self.connection.execute(
+                    'INSERT INTO arrays (run_id, name, file) VALUES (?, ?, ?)',
+                    (run_id, name, file))
+        return run_id
+
+    def add_economy(self, economy, settings : Settings, seed=None,
+                    label=None):
+        """
+        Records a finished Economy: its price index and its
+        period-to-period and year-over-year inflation series.
+        """
+        arrays = {
+            'price_index' : economy.calculate_price_index(),
+            'period_to_period' : economy.period_to_period_inflation_series(),
+            'yoy_inflation' : economy.year_over_year_inflation_series()
+        }
+        return self.add_run(settings, economy.get_n_sectors(),
+                            economy.periods - 1, arrays,
+                            economy.global_params, seed, label=label)
+
+    def add_batch(self, result, settings : Settings, n_sectors, seed=None,
+                  label=None):
+        """
+        Records a montecarlo.BatchResult: the price index of every
+        replicate, one row each, and the global parameters they were drawn
+        with.
+        """
+        arrays = {'price_index' : result.price_index}
+        for name in GLOBAL_COLUMNS:
+            arrays[name] = np.asarray(result.global_params[name]).reshape(-1)
+        n_periods = result.price_index.shape[1] - 1
+        return self.add_run(settings, n_sectors, n_periods, arrays,
+                            result.global_params, seed,
+                            result.get_n_replicates(), label)
+
+    def find(self, **conditions):
+        """
+        Returns a list of CatalogRuns matching every condition, oldest
+        first. Each keyword is a column in RUN_COLUMNS; a value matches
+        exactly, a (low, high) tuple matches anything in between (inclusive,
+        with None for no bound). For example, all runs with matching lags
+        and v_w - v_f between 0.1 and 0.2:
+
+            catalog.find(lags_match=True, desire_offset=(0.1, 0.2))
+        """
+        clauses = []
+        parameters = []
+        for name, value in conditions.items():
+            if name not in RUN_COLUMNS:
+                raise ValueError(f"can't search on '{name}'")
+            if isinstance(value, tuple):
+                low, high = value
+                if low is not None:
+                    clauses.append(f'{name} >= ?')
+                    parameters.append(low)
+                if high is not None:
+                    clauses.append(f'{name} <= ?')
+                    parameters.append(high)
+            elif value is None:
+                clauses.append(f'{name} IS NULL')
+            else:
+                clauses.append(f'{name} = ?')
+                parameters.append(int(value) if isinstance(value, bool)
+                                  else value)
+        query = 'SELECT * FROM runs'
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        query += ' ORDER BY id'
+        rows = self.connection.execute(query, parameters).fetchall()
+        return [CatalogRun(self, dict(row), self.array_names(row['id']))
+                for row in rows]
+
+    def get_run(self, run_id):
+        """Returns the CatalogRun with the given id."""
+        runs = self.find(id=run_id)
+        if not runs:
+            raise KeyError(f'no run with id {run_id}')
+        return runs[0]
+
+    def array_names(self, run_id):
+        rows = self.connection.execute(
+            'SELECT name FROM arrays WHERE run_id = ? ORDER BY name',
+            (run_id,)).fetchall()
+        return [row['name'] for row in rows]
+
+    def load_array(self, run_id, name):
+        """Loads one array of a run, memory-mapped read-only."""
+        row = self.connection.execute(
+            'SELECT file FROM arrays WHERE run_id = ? AND name = ?',
+            (run_id, name)).fetchone()
+        if row is None:
+            raise KeyError(f"run {run_id} has no array '{name}'")
+        return np.load(os.path.join(self.directory, row['file']),
+                       mmap_mode='r')
@@ -0,0 +1,75 @@
+"""
+Helpers for writing and reading Economy checkpoints. A checkpoint is a single
+.npz file of named arrays (see Economy.save_checkpoint for what goes in it);
+this module handles writing it safely and packing the random number
+generator states, which aren't arrays to begin with, into arrays.
+"""
+import json
+import os
+import random as rd
+import tempfile
+import numpy as np
+
+
+def write_snapshot(path, arrays):
+    """
+    Writes a dict of arrays to path as an .npz file. The file is written
+    under a temporary name first and then moved into place, so a process that
+    dies halfway through never leaves a broken checkpoint behind.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temporary = tempfile.mkstemp(suffix='.npz', dir=directory)
+    with os.fdopen(handle, 'wb') as file:
+        np.savez(file, **arrays)
+    os.replace(temporary, path)
+
+
+def read_snapshot(path):
+    """Reads a checkpoint back into a dict of arrays."""
+    with np.load(path) as snapshot:
+        return {name : snapshot[name] for name in snapshot.files}
+
+
+def global_random_state():
+    """
+    The state of the global random and np.random generators, which the
+    generator and shocks draw from when no rng is given, as arrays.
+    """
+    version, internal, gauss_next = rd.getstate()
+    _, keys, position, has_gauss, cached_gaussian = np.random.get_state()
+    return {
+        'python_random.version' : np.array(version),
+        'python_random.internal' : np.array(internal, dtype=np.int64),
+        'python_random.gauss_next' : np.array(
+            np.nan if gauss_next is None else gauss_next),
+        'numpy_random.keys' : keys,
+        'numpy_random.position' : np.array(position),
+        'numpy_random.has_gauss' : np.array(has_gauss),
+        'numpy_random.cached_gaussian' : np.array(cached_gaussian)
+    }
+
+
+def restore_global_random_state(arrays):
+    """Puts back the global random states saved by global_random_state."""
+    gauss_next = float(arrays['python_random.gauss_next'])
+    rd.setstate((int(arrays['python_random.version']),
+                 tuple(int(value)
+                       for value in arrays['python_random.internal']),
+                 None if np.isnan(gauss_next) else gauss_next))
+    np.random.set_state(('MT19937', arrays['numpy_random.keys'],
+                         int(arrays['numpy_random.position']),
+                         int(arrays['numpy_random.has_gauss']),
+                         float(arrays['numpy_random.cached_gaussian'])))
+
+
+def generator_state(rng):
+    """The state of a numpy Generator, as a JSON string array."""
+    return np.array(json.dumps(rng.bit_generator.state))
+
+
+def restore_generator(array):
+    """Makes a numpy Generator in the state saved by generator_state."""
+    state = json.loads(str(array))
+    bit_generator = getattr(np.random, state['bit_generator'])()
+    bit_generator.state = state
+    return np.random.Generator(bit_generator)
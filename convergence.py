@@ -0,0 +1,200 @@
+"""
+Steady state and limit cycle detection. Once every sector's wage share has
+settled down, wages and prices in each sector grow by the same factor every
+cycle, where a cycle is either a single period (a fixed point) or the lowest
+common multiple of the update frequencies. From then on the rest of the run
+can be written down directly instead of being simulated period by period.
+"""
+import math
+import numpy as np
+
+DEFAULT_TOLERANCE = 1e-12
+DEFAULT_MAX_CYCLE = 240 # longest cycle worth looking for, in periods
+
+
+class ConvergenceReport:
+    """
+    What happened during an advance_n run in convergence mode: whether and
+    when the run switched from simulating to extrapolating, the length of the
+    cycle it found (1 for a fixed point) and how far the average wage shares
+    over the cycle are from the equilibrium wage shares.
+    """
+
+    def __init__(self, start_period, n_periods):
+        self.start_period = start_period
+        self.n_periods = n_periods
+        self.converged = False
+        self.switch_period = None
+        self.cycle_length = None
+        self.periods_simulated = 0
+        self.periods_extrapolated = 0
+        self.max_equilibrium_gap = None
+
+    def print_report(self):
+        if not self.converged:
+            print(f"No convergence: simulated all {self.n_periods} periods")
+            return
+        print(f"Cycle of length {self.cycle_length} found in period "
+              f"{self.switch_period}")
+        print(f"Simulated {self.periods_simulated} periods, extrapolated "
+              f"{self.periods_extrapolated}")
+        print(f"Largest gap from equilibrium wage share: "
+              f"{self.max_equilibrium_gap}")
+
+
+def ws_equilibrium(engine):
+    """
+    Array version of Sector.get_ws_equilibrium for every cohort in an
+    ArrayEngine.
+    """
+    global_params = engine.global_params
+    weight = engine.mu + engine.phi
+    with np.errstate(divide='ignore', invalid='ignore'):
+        equilibrium = ((engine.mu * global_params.v_w +
+                        engine.phi * global_params.v_f) / weight)
+    return np.where((engine.mu != 0) | (engine.phi != 0), equilibrium, 0)
+
+
+def cohort_cycle_lengths(engine):
+    """
+    The cycle each cohort can settle into: the lowest common multiple of its
+    wage and price update frequencies. Without whole-number frequencies only
+    fixed points are looked for.
+    """
+    if engine.wage_calendar is None:
+        return np.ones(engine.n_cohorts, dtype=np.int64)
+    return np.lcm(engine.freq_w.astype(np.int64),
+                  engine.freq_f.astype(np.int64))
+
+
+def is_periodic(window, length, tolerance):
+    """
+    Checks whether consecutive ratios window[s] / window[s - length] over the
+    last length periods are all the same, to within tolerance. window is an
+    array with one row per period and at least 2 * length + 1 rows.
+    """
+    window = window[-(2 * length + 1):]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = window[length:] / window[:-length]
+    latest = ratios[-1]
+    return bool(np.all(np.abs(ratios - latest) <= tolerance * np.abs(latest)))
+
+
+def is_repeating(window, length, tolerance):
+    """
+    Checks whether the last length rows of window repeat the length rows
+    before them, to within tolerance.
+    """
+    window = window[-2 * length:]
+    return bool(np.all(np.abs(window[length:] - window[:-length]) <=
+                       tolerance))
+
+
+class ConvergenceDetector:
+    """
+    Watches an ArrayEngine as it advances and tests whether every cohort has
+    settled into its cycle. Sectors don't interact, so each one settles at its
+    own growth rate and with its own cycle length, and the growth of the price
+    index itself need not repeat even when every sector has settled; the test
+    is therefore done on the wages, prices and wage shares of each group of
+    cohorts sharing a cycle length. All groups are tested together once every
+    longest cycle, so the checks add about O(sectors) work per period.
+    """
+
+    def __init__(self, engine, tolerance=DEFAULT_TOLERANCE,
+                 max_cycle=DEFAULT_MAX_CYCLE):
+        self.engine = engine
+        self.tolerance = tolerance
+        lengths = cohort_cycle_lengths(engine)
+        # indices of the cohorts with each cycle length
+        self.groups = {int(length): np.flatnonzero(lengths == length)
+                       for length in np.unique(lengths)}
+        self.longest = max(self.groups, default=1)
+        self.enabled = self.longest <= max_cycle
+
+    def get_cycle_length(self):
+        """Length of the cycle of the economy as a whole."""
+        return math.lcm(*self.groups) if self.groups else 1
+
+    def tail(self, values, n_rows):
+        return np.array(values[-n_rows:])
+
+    def has_converged(self, remaining):
+        """
+        Returns True if every cohort has settled into its cycle.
+
+        remaining: how many periods are still to go; if the longest cycle is
+            not shorter than this, extrapolating is not worth it
+        """
+        engine = self.engine
+        n_periods = engine.get_n_periods()
+        longest = self.longest
+        if not self.enabled or longest >= remaining:
+            return False
+        if n_periods < 2 * longest + 1 or n_periods % longest != 0:
+            return False
+        n_rows = 2 * longest + 1
+        if len(engine.wages) < n_rows:
+            # the engine's history has been trimmed too short to tell
+            return False
+        wages = self.tail(engine.wages, n_rows)
+        prices = self.tail(engine.prices, n_rows)
+        wage_shares = self.tail(engine.wage_shares, n_rows)
+        tolerance = self.tolerance
+        for length, cohorts in self.groups.items():
+            if not (is_periodic(wages[:, cohorts], length, tolerance) and
+                    is_periodic(prices[:, cohorts], length, tolerance) and
+                    is_repeating(wage_shares[:, cohorts], length, tolerance)):
+                return False
+        return True
+
+    def equilibrium_gap(self):
+        """
+        Largest distance between a cohort's average wage share over its last
+        cycle and its equilibrium wage share.
+        """
+        engine = self.engine
+        if engine.n_cohorts == 0:
+            return 0.0
+        wage_shares = self.tail(engine.wage_shares, self.longest)
+        equilibrium = ws_equilibrium(engine)
+        gap = 0.0
+        for length, cohorts in self.groups.items():
+            average = wage_shares[-length:, cohorts].mean(axis=0)
+            gap = max(gap, float(np.max(np.abs(average -
+                                               equilibrium[cohorts]))))
+        return gap
+
+    def extrapolate(self, n_periods):
+        """
+        Extends the engine's histories by n_periods, assuming every cohort is
+        in its cycle: each value is the value one cycle earlier times that
+        cohort's growth factor over a cycle, and wage shares simply repeat.
+        Returns the raw price index in each of the new periods.
+        """
+        engine = self.engine
+        n_rows = self.longest + 1
+        last_wages = self.tail(engine.wages, n_rows)
+        last_prices = self.tail(engine.prices, n_rows)
+        last_wage_shares = self.tail(engine.wage_shares, n_rows)
+        shape = (n_periods, engine.n_cohorts)
+        wages = np.empty(shape)
+        prices = np.empty(shape)
+        wage_shares = np.empty(shape)
+        for length, cohorts in self.groups.items():
+            # the new periods are whole copies of the last cycle, each one
+            # grown by one more cycle's worth of growth
+            n_cycles = -(-n_periods // length) # round up
+            cycles = np.arange(1, n_cycles + 1)[:, None]
+            for new, last in [(wages, last_wages), (prices, last_prices)]:
+                cycle = last[-length:, cohorts]
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    growth = cycle[-1] / last[-length - 1, cohorts]
+                block = (growth ** cycles)[:, None, :] * cycle
+                new[:, cohorts] = block.reshape(-1, len(cohorts))[:n_periods]
+            block = np.tile(last_wage_shares[-length:, cohorts], (n_cycles, 1))
+            wage_shares[:, cohorts] = block[:n_periods]
+        engine.wages.extend(wages)
+        engine.prices.extend(prices)
+        engine.wage_shares.extend(wage_shares)
+        return prices @ engine.index_weight
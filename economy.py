@@ -1,12 +1,18 @@
-from params import SectorParams, GlobalParams
+from params import SectorParams, GlobalParams, ParamTable, sector_arrays
 from sectors import Sector
+from engine import ArrayEngine, ENGINE_PARAMS
+from series import GrowingArray, SeriesCache
 import rw
-from tqdm import tqdm
+import analytics
+import convergence
+import online
+import simcache
+import checkpoint
+import profiling
+import memory
+from shocks import ShockPath, ALPHA, SIGMA_ETA, SIGMA_EPSILON, SHOCK_THRESHOLD
 import numpy as np
-
-# temporarily hard wiring constants here
-ALPHA = 0.4
-SIGMA_ETA = 0.01
+from collections import deque
 
 class Economy:
     """Basically a collection of all the sectors in the economy. Allows
@@ -14,49 +20,793 @@ class Economy:
         at a time. Also handles price index calculation."""
     
     def __init__(self, global_params: GlobalParams, stochastic = False,
-                 single_persistent_shocks = False):
+                 single_persistent_shocks = False, vectorized = True,
+                 locally_stochastic = False, rng = None, result_cache = None):
         self.global_params = global_params
-        self.sectors = []
+        self._sectors = []
+        # the parameters of every sector, one row per sector in the order they
+        # were added. Each sector's SectorParams is a view of its row. Sectors
+        # added by add_sectors_from_arrays only exist as rows (and _sectors is
+        # None) until someone asks for the Sector objects.
+        self.use_param_table(ParamTable(global_params))
         self.periods = 1 # includes the inital values as a period
         self.stochastic = stochastic
         self.single_shocks = single_persistent_shocks
         self.shocks = [0]
+        # idiosyncratic shocks, drawn separately for every sector
+        self.local_stochastic = locally_stochastic
+        # random shocks are drawn from rng (a numpy Generator) if given, and
+        # from the global np.random state otherwise
+        self.rng = rng
+        self.aggregate_shocks = ShockPath(ALPHA, SIGMA_ETA, rng=rng)
+        self.local_shocks = None
+        # a single shock stops being applied once it decays below this
+        self.shock_threshold = SHOCK_THRESHOLD
+        # when vectorized, sectors are advanced together by an ArrayEngine
+        # which is built on the first advance
+        self.vectorized = vectorized
+        self.engine = None
+        # raw (non-normalized) price index, extended every period as the
+        # economy advances. None when it has to be rebuilt from the sectors.
+        self.raw_index = None
+        # streaming state for iter_periods: the raw index in period 0 and in
+        # the last few periods, and how many early periods have been dropped
+        # from the history to keep memory bounded
+        self.base_raw_index = None
+        self.index_tail = None
+        self.trimmed_periods = 0
+        # derived series (inflation, moving averages) are remembered until
+        # something changes the economy
+        self.series_cache = SeriesCache()
+        # report from the last advance_n run in convergence mode
+        self.convergence = None
+        # simcache.ResultCache consulted by advance_n; None uses the default
+        # cache (if there is one)
+        self.result_cache = result_cache
+        # profiling.PhaseStats while profiling is on (see enable_profiling)
+        self.profiler = None
+
+    @property
+    def sectors(self):
+        """
+        The list of Sector objects. Reading them doesn't stop the array
+        engine: their histories read through to it while it is running, so
+        they are always up to date. Changing a history or a parameter hands
+        control back to the sectors first (see hand_to_sectors).
+        """
+        return self.sector_objects()
+
+    def sector_objects(self):
+        """
+        Returns the list of Sector objects, first creating them if the
+        sectors were added as arrays.
+        """
+        if self._sectors is None:
+            table = self.param_table
+            self._sectors = [Sector(table.row(i)) for i in range(len(table))]
+            for index, sector in enumerate(self._sectors):
+                sector.attach(self, index)
+        return self._sectors
+
+    def use_param_table(self, table):
+        """
+        Makes table the economy's parameter table. Changing a value in it
+        (through SectorParams.set or set_column) hands control back to the
+        sectors first, since the engine keeps its own copy of the
+        parameters, and drops the stored price index, which depends on the
+        index weights.
+        """
+        table.listener = self.hand_to_sectors
+        self.param_table = table
+
+    def hand_to_sectors(self):
+        """
+        Gets the Sector objects ready to be changed: if the array engine is
+        running, its histories are written back into the sectors and they
+        take over again until the next advance. Since they are about to be
+        changed, the stored price index is dropped and rebuilt the next time
+        it is needed.
+        """
+        self.release_engine()
+        self.raw_index = None
+        self.index_tail = None
+        self.series_cache.invalidate()
+
+    def get_n_sectors(self):
+        """Number of sectors, without creating any Sector objects."""
+        if self._sectors is None:
+            return len(self.param_table)
+        return len(self._sectors)
+
+    def get_param_column(self, param_name):
+        """
+        Returns an array with the value of a parameter for every sector, in
+        the order the sectors were added. This is a copy; use
+        set_param_column to change the values.
+        """
+        return self.param_table.column(param_name).copy()
+
+    def set_param_column(self, param_name, values):
+        """
+        Sets a parameter for every sector at once.
+
+        param_name: name of the parameter, as in params.PARAMETER_INDICES
+        values: a single value or an array with one entry per sector, in the
+            order the sectors were added
+        """
+        # the engine keeps its own copy of the parameters, so the table hands
+        # back to the sectors and the next advance rebuilds it
+        self.param_table.set_column(param_name, values)
+
+    def release_engine(self):
+        """
+        Writes the array engine's state back into the Sector objects and
+        stops using the engine until the next advance.
+        """
+        if self.engine is not None:
+            self.check_full_history()
+            self.engine.write_back(self.sector_objects())
+            self.engine = None
+
+    def check_full_history(self):
+        """
+        Raises a RuntimeError if iter_periods has thrown away early periods,
+        for anything that needs the whole history.
+        """
+        if self.trimmed_periods:
+            raise RuntimeError(f"the first {self.trimmed_periods} periods "
+                               "were discarded by iter_periods, so the full "
+                               "history is no longer available")
+
+    def set_vectorized(self, value):
+        """Sets whether the array engine is used to advance the sectors."""
+        if not value:
+            self.release_engine()
+        self.vectorized = value
+
+    def engine_supported(self):
+        """
+        The array engine needs every sector to be at the same period. This is
+        not the case if a sector was added after the economy was advanced, in
+        which case sectors are updated one at a time as before.
+        """
+        if self._sectors is None:
+            return True
+        return all(sector.get_n_periods() == self.periods
+                   for sector in self._sectors)
 
     def set_stochastic(self, value):
         self.stochastic = value
 
+    def set_shock_threshold(self, value):
+        """
+        Sets the size below which a decaying single shock is dropped (and
+        recorded as 0). The default drops it once its effect on prices is
+        negligible, which can still change the last bit of a price that fell
+        in the period before; 0 keeps applying it for ever, for results that
+        are exact down to the last bit.
+        """
+        self.shock_threshold = value
+
+    def set_locally_stochastic(self, value):
+        """
+        Sets whether every sector gets its own idiosyncratic shock each
+        period.
+        """
+        # with idiosyncratic shocks identical sectors no longer move together,
+        # so the engine has to be rebuilt without merging them
+        self.release_engine()
+        self.local_stochastic = value
+
+    def get_local_shocks(self):
+        """
+        Returns the ShockPath for the idiosyncratic shocks, with one entry per
+        sector, making a new one if the number of sectors has changed.
+        """
+        n_sectors = self.get_n_sectors()
+        if (self.local_shocks is None or
+                self.local_shocks.shape != (n_sectors,)):
+            self.local_shocks = ShockPath(ALPHA, SIGMA_EPSILON,
+                                          shape=(n_sectors,), rng=self.rng)
+        return self.local_shocks
+
     def add_sector(self, params : SectorParams):
         """
         Creates a sector and adds it to the list of sectors.
 
         params: The parameters of the sector to be created.
         """
+        self.hand_to_sectors()
+        sectors = self.sector_objects()
         new_sector = Sector(params)
-        self.sectors.append(new_sector)
+        # params moves into a new row of the economy's table and is rebound
+        # to it, so it still controls the sector (unless it already belonged
+        # to a table, in which case the sector gets a copy)
+        new_sector.params = self.param_table.adopt(params)
+        new_sector.attach(self, len(sectors))
+        sectors.append(new_sector)
+
+    def add_sectors_from_arrays(self, raw_columns):
+        """
+        Adds many sectors at once from arrays of their parameters. Sectors
+        added to a fresh economy this way are fed straight to the array
+        engine, without making a SectorParams or Sector object for each one.
 
-    def advance_n(self, n):
+        raw_columns: dict of arrays with one entry per sector, keyed by the
+            names in params.PARAMETER_INDICES. As with SectorParams, phi and
+            mu are the sector's own values, which are added to phi_bar and
+            mu_bar.
+        """
+        columns = sector_arrays(raw_columns, self.global_params)
+        self.series_cache.invalidate()
+        self.raw_index = None
+        fresh = self.periods == 1 and self.engine is None
+        if fresh and self._sectors is None:
+            self.param_table.extend(columns)
+        elif fresh and not self._sectors and self.vectorized:
+            self._sectors = None
+            self.use_param_table(ParamTable(self.global_params,
+                                            len(columns['w0'])))
+            self.param_table.extend(columns)
+        else:
+            # the economy already has Sector objects or is under way, so
+            # these have to become Sector objects too
+            self.hand_to_sectors()
+            sectors = self.sector_objects()
+            for index in self.param_table.extend(columns):
+                sector = Sector(self.param_table.row(index))
+                sector.attach(self, index)
+                sectors.append(sector)
+
+    def advance_n(self, n, converge = False,
+                  tolerance = convergence.DEFAULT_TOLERANCE,
+                  max_cycle = convergence.DEFAULT_MAX_CYCLE,
+                  checkpoint_every = None, checkpoint_path = None):
         """
         Advances all sectors by a specified number of periods.
 
         n: the number of periods to advance        
+        converge: if True, stop simulating once the economy has settled into a
+            fixed point or a cycle and extrapolate the remaining periods.
+            Returns a ConvergenceReport saying where it switched.
+        tolerance: relative tolerance used to decide that it has settled
+        max_cycle: longest cycle (in periods) to look for
+        checkpoint_every: if given, save a checkpoint to checkpoint_path
+            every this many periods (see save_checkpoint). A run that dies
+            can be picked up again from the last one with load_checkpoint and
+            an advance_n for the periods that are left, and ends up exactly
+            the same as if it had never stopped.
+        checkpoint_path: file the checkpoints are written to, each one
+            replacing the one before
         """
+        if checkpoint_every is not None:
+            if checkpoint_path is None:
+                raise ValueError("checkpoint_every needs a checkpoint_path")
+            if converge:
+                raise ValueError("checkpoints can't be used with converge")
+        if converge:
+            return self.advance_until_converged(n, tolerance, max_cycle)
+        cache = self.get_result_cache()
+        if (cache is not None and n > 0 and self.cacheable() and
+                checkpoint_every is None):
+            self.advance_n_cached(cache, n)
+            return
+        for i in range(n):
+            self.advance()
+            if checkpoint_every is not None and (i + 1) % checkpoint_every == 0:
+                self.save_checkpoint(checkpoint_path)
+
+    def get_result_cache(self):
+        """The ResultCache advance_n uses: the economy's own or the default."""
+        if self.result_cache is not None:
+            return self.result_cache
+        return simcache.get_default_cache()
+
+    def cacheable(self):
+        """
+        Runs can only be cached if they are deterministic and go through the
+        array engine, whose state is what gets stored.
+        """
+        return (self.vectorized and not self.stochastic and
+                not self.local_stochastic and not self.trimmed_periods and
+                (self.engine is not None or self.engine_supported()))
+
+    def cache_key(self, n):
+        """
+        Hash of everything the next n periods depend on: the code version,
+        the global parameters, each cohort's parameters and latest state,
+        the period number (which decides who resets when) and the single
+        shock that is still going, if any. Earlier history doesn't matter,
+        so this is O(sectors) however long the economy has run.
+        """
+        engine = self.engine
+        global_params = self.global_params
+        state = {name : getattr(engine, name) for name in ENGINE_PARAMS}
+        state.update({
+            'cohort_of_sector' : engine.cohort_of_sector,
+            'wages' : engine.wages[-1],
+            'prices' : engine.prices[-1],
+            'wage_shares' : engine.wage_shares[-1],
+            'shares_stale' : engine.shares_stale,
+            'stale_cohorts' : engine.stale_cohorts
+        })
+        shocks = None
+        if self.single_shocks:
+            shocks = [float(self.shocks[-1]), self.shock_threshold]
+        return simcache.canonical_key(
+            'advance_n', simcache.current_code_version(),
+            [global_params.v_w, global_params.v_f, global_params.mu_bar,
+             global_params.phi_bar, global_params.frequency_max],
+            state, engine.get_n_periods(), shocks, n)
+
+    def advance_n_cached(self, cache, n):
+        """
+        advance_n through the result cache: the new periods are read from
+        the cache if this exact run has been done before, and simulated and
+        stored otherwise.
+        """
+        self.start_engine()
+        if self.raw_index is None:
+            self.rebuild_raw_index()
+        engine = self.engine
+        key = self.cache_key(n)
+        entry = cache.get(key)
+        if entry is not None:
+            self.restore_periods(entry, n)
+            return
+        first_new = engine.get_n_periods()
+        n_shocks = len(self.shocks)
         for _ in range(n):
             self.advance()
+        cache.put(key, {
+            'wages' : np.array(engine.wages[first_new:]),
+            'prices' : np.array(engine.prices[first_new:]),
+            'wage_shares' : np.array(engine.wage_shares[first_new:]),
+            'raw_index' : self.raw_index.view()[first_new:],
+            'shocks' : np.array(self.shocks[n_shocks:], dtype=float),
+            'shares_stale' : np.array(engine.shares_stale),
+            'stale_cohorts' : engine.stale_cohorts
+        })
 
+    def restore_periods(self, entry, n):
+        """
+        Appends n periods read from the result cache, leaving the economy
+        exactly as if it had simulated them.
+        """
+        self.series_cache.invalidate()
+        engine = self.engine
+        engine.wages.extend(entry['wages'])
+        engine.prices.extend(entry['prices'])
+        engine.wage_shares.extend(entry['wage_shares'])
+        engine.shares_stale = bool(entry['shares_stale'])
+        engine.stale_cohorts = entry['stale_cohorts']
+        self.raw_index.extend(entry['raw_index'])
+        if self.index_tail is not None:
+            self.index_tail.extend(entry['raw_index'])
+        self.shocks.extend(entry['shocks'].tolist())
+        self.periods += n
+
+    def advance_until_converged(self, n, tolerance, max_cycle):
+        """
+        Advances by n periods, but checks as it goes whether the economy has
+        settled into a fixed point or cycle, and if so fills in the rest of
+        the periods analytically.
+        """
+        report = convergence.ConvergenceReport(self.periods - 1, n)
+        detector = None
+        for i in range(n):
+            self.advance()
+            report.periods_simulated += 1
+            if not self.can_extrapolate():
+                continue
+            if detector is None or detector.engine is not self.engine:
+                detector = convergence.ConvergenceDetector(
+                    self.engine, tolerance, max_cycle)
+            remaining = n - i - 1
+            if detector.has_converged(remaining):
+                report.converged = True
+                report.switch_period = self.periods - 1
+                report.cycle_length = detector.get_cycle_length()
+                report.periods_extrapolated = remaining
+                report.max_equilibrium_gap = detector.equilibrium_gap()
+                self.extrapolate(detector, remaining)
+                break
+        self.convergence = report
+        return report
+
+    def can_extrapolate(self):
+        """
+        Extrapolation needs the array engine and a deterministic future, so
+        not with stochastic shocks or while a single shock is still going.
+        """
+        return (self.engine is not None and not self.stochastic and
+                not self.local_stochastic and
+                (not self.single_shocks or self.shocks[-1] == 0))
+
+    def extrapolate(self, detector, n):
+        """
+        Extends the economy by n periods by repeating each sector's last
+        cycle, scaled up by its growth over a cycle.
+
+        detector: the ConvergenceDetector which found the cycles
+        """
+        self.series_cache.invalidate()
+        raw_values = detector.extrapolate(n)
+        if self.raw_index is not None:
+            self.raw_index.extend(raw_values)
+        if self.index_tail is not None:
+            self.index_tail.extend(raw_values)
+        if self.single_shocks:
+            # a shock that has died out stays at zero
+            self.shocks.extend([0.0] * n)
+        self.periods += n
+
+
+    def iter_periods(self, n, tail = analytics.PERIODS_PER_YEAR,
+                     stats = False):
+        """
+        Advances by n periods one at a time, yielding a dict for each new
+        period with the period number, the raw and normalized price index,
+        period-to-period inflation, year-over-year inflation (NaN until
+        there are enough periods) and, where there are shocks, the aggregate
+        shock.
+
+        With the array engine running, the sectors' histories are thrown
+        away as it goes, keeping only what the next step needs plus the raw
+        index over the last tail periods, so memory stays O(sectors) however
+        long the run. After that anything that needs the full history
+        (calculate_price_index, the inflation series, the Sector objects)
+        raises a RuntimeError, but the economy can carry on advancing and
+        streaming. Without the engine the history is kept as usual.
+
+        n: the number of periods to advance
+        tail: how many past periods of the raw index to keep for lagged
+            measures; year-over-year inflation needs at least 12
+        stats: if True, also add the cross-sector means and standard
+            deviations from analytics.cross_sector_stats
+        """
+        if self.index_tail is None or not self.trimmed_periods:
+            raw_series = self.get_raw_index_series()
+            self.base_raw_index = float(raw_series[0])
+            self.index_tail = deque(raw_series[-(tail + 1):].tolist(),
+                                    maxlen=tail + 1)
+        elif self.index_tail.maxlen != tail + 1:
+            self.index_tail = deque(self.index_tail, maxlen=tail + 1)
+        for _ in range(n):
+            self.advance()
+            record = self.period_record(stats)
+            if self.engine is not None:
+                self.trim_history()
+            yield record
+
+    def run_summary(self, n, statistics = ('yoy_inflation.mean',)):
+        """
+        Advances by n periods without keeping any history (see iter_periods)
+        and returns a dict with just the statistics asked for, which are
+        worked out as it goes with online accumulators.
+
+        n: the number of periods to advance
+        statistics: names like 'yoy_inflation.mean' or 'inflation.max'; see
+            online.SERIES and online.STATISTICS
+        """
+        summary = online.Summary(statistics)
+        for record in self.iter_periods(
+                n, stats=summary.needs_cross_sector_stats()):
+            summary.add_record(record)
+        return summary.results()
+
+    def period_record(self, stats = False):
+        """
+        The dict yielded by iter_periods for the latest period, worked out
+        from the raw index tail.
+        """
+        tail = self.index_tail
+        raw_value = tail[-1]
+        record = {
+            'period' : self.periods - 1,
+            'raw_index' : raw_value,
+            'price_index' : raw_value / self.base_raw_index,
+            'inflation' : float('nan'),
+            'yoy_inflation' : float('nan')
+        }
+        record.update(analytics.tail_inflation(tail))
+        if self.stochastic or self.single_shocks:
+            record['shock'] = self.shocks[-1]
+        if stats:
+            record.update(self.cross_sector_stats())
+        return record
+
+    def cross_sector_stats(self):
+        """
+        Means and standard deviations across sectors of wage shares and
+        sector inflation in the latest period (see
+        analytics.cross_sector_stats).
+        """
+        engine = self.engine
+        if engine is not None:
+            return analytics.cross_sector_stats(
+                engine.prices[-1], engine.prices[-2], engine.wage_shares[-1],
+                engine.cohort_sizes())
+        sectors = self.sector_objects()
+        return analytics.cross_sector_stats(
+            np.array([sector.prices[-1] for sector in sectors]),
+            np.array([sector.prices[-2] for sector in sectors]),
+            np.array([sector.wage_shares[-1] for sector in sectors]))
+
+    def trim_history(self):
+        """
+        Throws away all but the last two periods of the engine's histories
+        (all that the next step and shocks need) and of the shock record.
+        """
+        self.trimmed_periods += self.engine.trim(2)
+        del self.shocks[:-2]
+        self.raw_index = None
+        self.series_cache.invalidate()
+
+    def save_checkpoint(self, path, history = True):
+        """
+        Saves everything needed to carry on the run exactly where it is to a
+        single .npz file: the parameters, the current state of every sector
+        (or cohort, with the array engine), the shocks so far, the period
+        number, the shocks already drawn but not used yet and the state of
+        the random number generators. Restore it with load_checkpoint.
+
+        path: the file to write; it is replaced in one step, so there is
+            never half a checkpoint on disk
+        history: whether to save every period so far or, with the array
+            engine running, only the last two, which is all that advancing
+            needs. Without the history the checkpoint stays the same size
+            however long the run, but the restored economy is like one that
+            went through iter_periods: it can carry on advancing and
+            streaming, but not give the full price index.
+        """
+        global_params = self.global_params
+        n_sectors = self.get_n_sectors()
+        arrays = {
+            'global_params' : np.array([
+                global_params.v_w, global_params.v_f, global_params.mu_bar,
+                global_params.phi_bar, global_params.frequency_max]),
+            'param_table' : self.param_table.data[:n_sectors],
+            'flags' : np.array([self.stochastic, self.single_shocks,
+                                self.local_stochastic, self.vectorized]),
+            'shock_threshold' : np.array(self.shock_threshold),
+            'periods' : np.array(self.periods)
+        }
+        arrays.update(checkpoint.global_random_state())
+        if self.rng is not None:
+            arrays['rng'] = checkpoint.generator_state(self.rng)
+        for name, shocks in [('aggregate_shocks', self.aggregate_shocks),
+                             ('local_shocks', self.local_shocks)]:
+            if shocks is not None:
+                for key, value in shocks.get_state().items():
+                    arrays[f'{name}.{key}'] = value
+        trimmed = self.trimmed_periods
+        if self.engine is not None:
+            state = self.engine.get_state(history)
+            for key, value in state.items():
+                arrays[f'engine.{key}'] = value
+            trimmed = max(trimmed, int(state['first_period']))
+        elif self._sectors is not None:
+            # sectors advanced one at a time can have histories of different
+            # lengths, so they are saved end to end along with the lengths
+            sectors = self.sector_objects()
+            arrays['sector_lengths'] = np.array(
+                [len(sector.wages) for sector in sectors], dtype=np.int64)
+            for key in ['wages', 'prices', 'wage_shares']:
+                arrays[f'sector_{key}'] = np.array(
+                    [value for sector in sectors
+                     for value in getattr(sector, key)], dtype=float)
+        arrays['trimmed_periods'] = np.array(trimmed)
+        # only the latest shock matters for what comes next, the same as in
+        # trim_history
+        shocks = (self.shocks if trimmed == self.trimmed_periods
+                  else self.shocks[-2:])
+        arrays['shocks'] = np.array(shocks, dtype=float)
+        if not trimmed and self.raw_index is not None:
+            arrays['raw_index'] = self.raw_index.view()
+        index_tail = self.index_tail
+        base_raw_index = self.base_raw_index
+        if index_tail is None and trimmed:
+            # the index can't be rebuilt from a history that isn't there, so
+            # keep enough of it for iter_periods to carry on
+            raw_series = self.get_raw_index_series()
+            base_raw_index = float(raw_series[0])
+            index_tail = deque(
+                raw_series[-(analytics.PERIODS_PER_YEAR + 1):].tolist(),
+                maxlen=analytics.PERIODS_PER_YEAR + 1)
+        if index_tail is not None:
+            arrays['index_tail'] = np.array(index_tail, dtype=float)
+            arrays['index_tail_length'] = np.array(index_tail.maxlen)
+            arrays['base_raw_index'] = np.array(base_raw_index)
+        checkpoint.write_snapshot(path, arrays)
+
+    @classmethod
+    def load_checkpoint(cls, path, restore_random_state = True,
+                        result_cache = None):
+        """
+        Makes an Economy from a file written by save_checkpoint, in exactly
+        the state it was saved in, so advancing it gives the same results the
+        original run would have.
+
+        restore_random_state: whether to also put the global random and
+            np.random states back the way they were, which runs without an
+            rng draw their shocks from
+        result_cache: as in the constructor
+        """
+        arrays = checkpoint.read_snapshot(path)
+        global_params = GlobalParams(*arrays['global_params'].tolist())
+        stochastic, single_shocks, local_stochastic, vectorized = (
+            bool(flag) for flag in arrays['flags'])
+        rng = None
+        if 'rng' in arrays:
+            rng = checkpoint.restore_generator(arrays['rng'])
+        economy = cls(global_params, stochastic, single_shocks, vectorized,
+                      local_stochastic, rng, result_cache)
+        table = arrays['param_table']
+        economy.use_param_table(ParamTable(global_params, len(table)))
+        economy.param_table.data[:len(table)] = table
+        economy.param_table.length = len(table)
+        economy.shock_threshold = float(arrays['shock_threshold'])
+        economy.periods = int(arrays['periods'])
+        economy.trimmed_periods = int(arrays['trimmed_periods'])
+        economy.shocks = arrays['shocks'].tolist()
+        if 'local_shocks.last' in arrays:
+            economy.local_shocks = ShockPath(ALPHA, SIGMA_EPSILON,
+                                             shape=(len(table),), rng=rng)
+        for name in ['aggregate_shocks', 'local_shocks']:
+            if f'{name}.last' in arrays:
+                getattr(economy, name).set_state(
+                    {key : arrays[f'{name}.{key}']
+                     for key in ['last', 'innovations', 'path']})
+        economy._sectors = None
+        if 'engine.cohort_of_sector' in arrays:
+            economy.engine = ArrayEngine.from_state(
+                {key[len('engine.'):] : value
+                 for key, value in arrays.items()
+                 if key.startswith('engine.')}, global_params)
+        elif 'sector_lengths' in arrays:
+            sectors = economy.sector_objects()
+            ends = np.cumsum(arrays['sector_lengths'])
+            histories = [np.split(arrays[f'sector_{key}'], ends[:-1])
+                         for key in ['wages', 'prices', 'wage_shares']]
+            for sector, *values in zip(sectors, *histories):
+                sector.set_histories(*(value.tolist() for value in values))
+        if 'raw_index' in arrays:
+            economy.raw_index = GrowingArray(2 * economy.periods)
+            economy.raw_index.extend(arrays['raw_index'])
+        if 'index_tail' in arrays:
+            economy.index_tail = deque(
+                arrays['index_tail'].tolist(),
+                maxlen=int(arrays['index_tail_length']))
+            economy.base_raw_index = float(arrays['base_raw_index'])
+        if restore_random_state:
+            checkpoint.restore_global_random_state(arrays)
+        return economy
+
+    def start_engine(self):
+        """
+        Builds the array engine from the sectors, if vectorized, not already
+        running and every sector is at the same period.
+        """
+        if (self.vectorized and self.engine is None
+                and self.engine_supported()):
+            # idiosyncratic shocks split up otherwise identical sectors
+            dedupe = not self.local_stochastic
+            if self._sectors is None:
+                self.engine = ArrayEngine.from_arrays(
+                    self.param_table.columns(), self.global_params, dedupe)
+            else:
+                self.engine = ArrayEngine.from_sectors(
+                    self._sectors, self.global_params, dedupe)
+            if (self.profiler is not None and
+                    self.engine.wage_calendar is not None):
+                profiling.instrument(self.engine, self.profiler,
+                                     profiling.RESET_PHASES)
 
     def advance(self):
         """Advances each sector by a single period and updates period number"""
-        for sector in self.sectors:
+        self.series_cache.invalidate()
+        self.start_engine()
+        if (self.engine is not None and self.raw_index is None and
+                not self.trimmed_periods):
+            self.rebuild_raw_index()
+        self.update_sectors()
+        if self.raw_index is not None:
+            self.raw_index.append(self.latest_raw_index_value())
+        if self.index_tail is not None:
+            self.index_tail.append(self.latest_raw_index_value())
+        self.apply_shocks()
+        self.periods += 1
+
+    def update_sectors(self):
+        """Works out every sector's wages and prices in the next period."""
+        if self.engine is not None:
+            self.engine.advance()
+            return
+        sectors = self.sector_objects()
+        if self.profiler is not None:
+            for sector in sectors:
+                profiling.instrument(sector, self.profiler,
+                                     profiling.RESET_PHASES)
+        for sector in sectors:
             sector.update() # uses sector's built-in update methods
-        if self.stochastic:
-            self.stochastic_shocks(ALPHA, SIGMA_ETA)
+
+    def apply_shocks(self):
+        """Applies this period's stochastic or single shocks, if any."""
+        if self.stochastic or self.local_stochastic:
+            self.stochastic_shocks()
         elif self.single_shocks:
             self.track_single_shocks(ALPHA)
-        self.periods += 1
+
+    def enable_profiling(self):
+        """
+        Starts timing the phases of each period (see profiling.PHASES) and
+        returns the profiling.PhaseStats they are added up in, which is also
+        what get_profile returns. When profiling is off (the default) none of
+        this costs anything.
+        """
+        if self.profiler is None:
+            self.profiler = profiling.PhaseStats()
+            profiling.instrument(self, self.profiler,
+                                 profiling.ECONOMY_PHASES)
+            engine = self.engine
+            if engine is not None and engine.wage_calendar is not None:
+                profiling.instrument(engine, self.profiler,
+                                     profiling.RESET_PHASES)
+        return self.profiler
+
+    def disable_profiling(self):
+        """Stops profiling and returns the final PhaseStats."""
+        profiler = self.profiler
+        profiling.uninstrument(self, profiling.ECONOMY_PHASES)
+        if self.engine is not None:
+            profiling.uninstrument(self.engine, profiling.RESET_PHASES)
+        for sector in self._sectors or []:
+            profiling.uninstrument(sector, profiling.RESET_PHASES)
+        self.profiler = None
+        return profiler
+
+    def get_profile(self):
+        """The PhaseStats of the current profiling, or None if it's off."""
+        return self.profiler
+
+    def memory_report(self):
+        """
+        Returns a memory.MemoryReport with the bytes held by the sector
+        histories, the parameters, the shock history and the derived series.
+        """
+        return memory.measure(self)
+
+    def project_memory(self, n_periods, sector_access = False):
+        """
+        Projects the memory (a memory.MemoryReport, whose peak is the most
+        needed at once) of this economy once it has run for n_periods in
+        total, before running it. See memory.project.
+        """
+        n_cohorts = None
+        if self.engine is not None:
+            n_cohorts = self.engine.n_cohorts
+        return memory.project(
+            self.get_n_sectors(), n_periods, self.vectorized, n_cohorts,
+            self.stochastic or self.local_stochastic or self.single_shocks,
+            sector_access)
+
+    def advance_n_traced(self, n, **kwargs):
+        """
+        advance_n under tracemalloc. Returns a memory.TraceResult with the
+        bytes the run allocated and kept, the peak, and where they came
+        from. Much slower than a normal run.
+        """
+        with memory.tracing() as result:
+            self.advance_n(n, **kwargs)
+        return result
     
     def get_sector(self, index):
-        """Returns sector object located at index in the list of sectors."""
-        return self.sectors[index]
+        """
+        Returns sector object located at index in the list of sectors. This
+        doesn't stop the array engine (see sectors).
+        """
+        return self.sector_objects()[index]
     
     def add_sector_from_data(self, param_list):
         """
@@ -66,39 +816,61 @@ class Economy:
         sector_params = SectorParams(param_list, self.global_params)
         self.add_sector(sector_params)
     
-    def add_sectors_from_csv(self, filename):
+    def add_sectors_from_csv(self, filename, chunk_size = rw.CHUNK_SIZE,
+                             validate = True):
         """
-        Takes in a CSV, where each row is the parameters for a sector. Creates
-        a sector from each row and adds it into the economy. Which column
-        corresponds to which parameters are defaults, which can be adjusted in
-        the params class.
+        Takes in a CSV, where each row is the parameters for a sector, and
+        adds a sector for each row. Which column corresponds to which
+        parameters are defaults, which can be adjusted in the params class.
+        The file is parsed in chunks straight into arrays, checked, and
+        handed to add_sectors_from_arrays, so no object is made per row.
         TODO: think more efficiently about in which class these methods should
         live.
 
         filename: the name of the CSV file with the list of parameters 
+        chunk_size: number of rows to parse at a time
+        validate: whether to check the parameters first (see
+            rw.validate_param_columns), raising a ValueError if they're bad
         """
-        # get a list of lists, each item of which is a list of sector params
-        data_rows = rw.get_params(filename)
-        for row in data_rows:
-            # create params from each row
-            sector_params = SectorParams(row, self.global_params)
-            # adds a sector with new params to the economy
-            self.add_sector(sector_params)
+        columns = rw.read_param_columns(filename, chunk_size)
+        if validate:
+            rw.validate_param_columns(columns)
+        self.add_sectors_from_arrays(columns)
 
     def calculate_price_index(self):
         """
-        Calculates the price index for each period and returns a list with the
-        price index over all periods. The value in period 0 is normalized to 1.
+        Calculates the price index for each period and returns an array with
+        the price index over all periods. The value in period 0 is normalized
+        to 1.
+        """
+        def calculate():
+            raw_series = self.get_raw_index_series()
+            return raw_series / raw_series[0]
+        return self.series_cache.get('price_index', calculate)
+
+    def get_raw_index_series(self):
         """
-        # handle the first period and set equal to 1
-        initial_raw_value = self.get_raw_index_value(0)
-        # set the first value of the price series equal to 1
-        price_series = [1]
-        for i in range(1, self.periods): # begin in period 1
-            raw_value = self.get_raw_index_value(i)
-            # add the normalized version of the raw value
-            price_series.append(raw_value / initial_raw_value)
-        return price_series
+        Returns an array with the raw (non-normalized) price index in every
+        period so far. This is kept up to date as the economy advances, so it
+        only has to be worked out from the sectors' histories if they were
+        changed directly in the meantime. The array is a read-only view of
+        the stored index, like the cached series, so copy it to change it.
+        """
+        self.check_full_history()
+        if self.raw_index is None:
+            self.rebuild_raw_index()
+        raw_series = self.raw_index.view()
+        raw_series.flags.writeable = False
+        return raw_series
+
+    def rebuild_raw_index(self):
+        """Recalculates the stored raw price index for all periods."""
+        self.raw_index = GrowingArray(2 * self.periods)
+        if self.engine is not None:
+            self.raw_index.extend(self.engine.raw_index_series())
+        else:
+            self.raw_index.extend(self.sum_indexed_prices(period)
+                                  for period in range(self.periods))
 
     def get_raw_index_value(self, period):
         """
@@ -108,31 +880,52 @@ class Economy:
 
         period: the period to fetch the raw indes value value
         """
+        return float(self.get_raw_index_series()[period])
+
+    def sum_indexed_prices(self, period):
+        """
+        Works out the raw price index in a period directly from the sectors.
+
+        period: the period to calculate the raw index value for
+        """
+        if self.engine is not None:
+            return self.engine.raw_index_value(period)
         value = 0
-        for sector in self.sectors:
+        for sector in self.sector_objects():
             value += sector.get_indexed_price(period) # uses method in Sector
         return value
+
+    def latest_raw_index_value(self):
+        """Raw price index in the most recent period."""
+        return self.sum_indexed_prices(-1)
+
+    def refresh_raw_index(self):
+        """
+        Recalculates the stored raw index for the most recent period, after
+        its prices were changed by a shock.
+        """
+        if self.raw_index is not None:
+            self.raw_index.set_last(self.latest_raw_index_value())
+        if self.index_tail is not None:
+            self.index_tail[-1] = self.latest_raw_index_value()
     
     def period_to_period_inflation_series(self):
         """
         Calculate a period-to-period inflation rate. That is, what is the rate
-        of change from one period to the next? Returns a list of all of these
+        of change from one period to the next? Returns an array of all of these
         values for all periods.
         """
-        price_index = self.calculate_price_index() # get price index series
-        inflation_data = []
-        for i in range(1, self.periods):
-            index_change = price_index[i] - price_index[i-1]
-            percent_change = index_change / price_index[i-1]
-            inflation_data.append(percent_change)
-        return inflation_data
+        def calculate():
+            return analytics.period_to_period_inflation(
+                self.calculate_price_index())
+        return self.series_cache.get('period_to_period', calculate)
 
     def year_over_year_inflation_series(self):
         """
         Gets a year-over-year inflation series, with the convention that a year
         is 12 periods.
         """
-        return self.lagged_inflation_series(12)
+        return self.lagged_inflation_series(analytics.PERIODS_PER_YEAR)
 
     def lagged_inflation_series(self, lag):
         """
@@ -142,13 +935,9 @@ class Economy:
 
         lag: the length of the lag for the lagged series
         """
-        price_index = self.calculate_price_index()
-        inflation_data = []
-        for i in range(self.periods - lag):
-            absolute_change = price_index[i+lag] - price_index[i]
-            percent_change = absolute_change / price_index[i]
-            inflation_data.append(percent_change)
-        return inflation_data
+        def calculate():
+            return analytics.lagged_inflation(self.calculate_price_index(), lag)
+        return self.series_cache.get('lagged', calculate, lag=lag)
     
     def get_moving_average(self, time_series, window):
         """
@@ -158,47 +947,112 @@ class Economy:
         time_series: the data to calculate the moving average on
         window: the size of the window over which the moving average is done
         """
-        avg_series = []
-        periods = len(time_series)
-        for i in range(periods - window + 1):
-            data_subset = time_series[i:i+window]
-            avg_series.append(sum(data_subset) / window)
-        return avg_series
+        return analytics.moving_average(time_series, window)
     
     def get_yoy_moving_average(self, window):
         """
         Gets the moving average of the year-over-year inflation figure over
         a particular window of moving average.
         """
-        return self.get_moving_average(self.year_over_year_inflation_series(), 
-                                       window)
+        def calculate():
+            return self.get_moving_average(
+                self.year_over_year_inflation_series(), window)
+        return self.series_cache.get('moving_average', calculate,
+                                     lag=analytics.PERIODS_PER_YEAR,
+                                     window=window)
     
     def get_ptp_moving_average(self, window):
         """
         Gets the moving average of the period-to-period inflation figure with a
         particular width (window) of moving average.
         """
-        return self.get_moving_average(self.period_to_period_inflation_series(), 
-                                       window)
+        def calculate():
+            return self.get_moving_average(
+                self.period_to_period_inflation_series(), window)
+        return self.series_cache.get('moving_average', calculate, lag=1,
+                                     window=window)
+
+    def get_inflation_ranges(self):
+        """
+        Returns an analytics.InflationRanges for the price index so far, which
+        answers "inflation between period i and j" queries in constant time.
+        """
+        def calculate():
+            return analytics.InflationRanges(self.calculate_price_index())
+        return self.series_cache.get('ranges', calculate)
+
+    def inflation_between(self, start, end):
+        """
+        Total inflation in the price index from period start to period end.
+        """
+        return self.get_inflation_ranges().inflation_between(start, end)
+
+    def get_cache_stats(self):
+        """Hit and miss counts of the derived series cache."""
+        return self.series_cache.get_stats()
 
     def shock_all_sectors(self, shock_size):
         """
         Exogenously shocks all sectors with a price increase.
         'Size' is the magnitude of the shock, in terms of the proportion of
-        previous prices.
+        previous prices. Either a single number or an array with a separate
+        size for every sector.
         """
-        for sector in self.sectors:
-            sector.shock(shock_size)
+        if np.ndim(shock_size) and np.shape(shock_size) != (
+                self.get_n_sectors(),):
+            raise ValueError(f"expected one shock per sector "
+                             f"({self.get_n_sectors()}), got shape "
+                             f"{np.shape(shock_size)}")
+        self.series_cache.invalidate()
+        if self.engine is not None:
+            if np.ndim(shock_size) and not self.engine.is_per_sector():
+                # the sectors of a cohort are about to get different shocks,
+                # so they can't be simulated together any more
+                self.engine.split_cohorts(
+                    self.param_table.column('index_weight'))
+            self.engine.shock(shock_size)
+        elif np.ndim(shock_size) == 0:
+            for sector in self.sector_objects():
+                sector.shock(shock_size)
+        else:
+            for sector, size in zip(self.sector_objects(), shock_size):
+                sector.shock(float(size))
+        self.refresh_raw_index()
 
-    def stochastic_shocks(self, alpha, sigma_eta):
-        this_shock = alpha * self.shocks[-1] + np.random.normal(0, sigma_eta)
-        self.shock_all_sectors(this_shock)
-        self.shocks.append(this_shock)
+    def stochastic_shocks(self):
+        """
+        Shocks prices by this period's aggregate AR(1) shock and, with local
+        stochasticity, every sector's own idiosyncratic shock on top. The
+        shocks come from ShockPaths, which draw them in bulk.
+        """
+        shock_size = 0.0
+        if self.stochastic:
+            this_shock = self.aggregate_shocks.next(self.shocks[-1])
+            shock_size = this_shock
+        if self.local_stochastic:
+            shock_size = shock_size + self.get_local_shocks().next()
+        self.shock_all_sectors(shock_size)
+        if self.stochastic:
+            self.shocks.append(this_shock)
 
     def track_single_shocks(self, alpha, size = 0):
+        """
+        Applies this period's value of a decaying single shock to the sectors
+        whose prices reset this period. Once the shock is smaller than
+        shock_threshold it is recorded as 0 and nothing else is done, so runs
+        don't keep paying for a shock that has died out.
+        """
         this_shock = alpha * self.shocks[-1] + size
-        for sector in self.sectors:
-            sector.shock_if_prices_update(this_shock)
+        if abs(this_shock) < self.shock_threshold:
+            self.shocks.append(0.0)
+            return
+        self.series_cache.invalidate()
+        if self.engine is not None:
+            self.engine.shock_if_prices_update(this_shock)
+        else:
+            for sector in self.sector_objects():
+                sector.shock_if_prices_update(this_shock)
+        self.refresh_raw_index()
         self.shocks.append(this_shock)
 
     def do_single_shock(self, size):
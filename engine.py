@@ -0,0 +1,423 @@
+"""
+Struct-of-arrays version of the sector dynamics. Rather than asking every
+Sector object to update itself, the wages, prices, wage shares and parameters
+of all sectors are held in NumPy arrays and the whole economy is advanced in a
+single vectorized step. The maths is identical to Sector.update; the update
+tests are just done as masks over all sectors at once.
+"""
+import numpy as np
+from schedule import UpdateCalendar
+from params import param_matrix
+
+""" Sector parameters the engine needs to hold as arrays. w0 and p0 only matter
+    through the wage and price histories, so they are not stored separately."""
+ENGINE_PARAMS = ['freq_w', 'freq_f', 'lag_w', 'lag_f', 'mu', 'phi', 'a',
+                 'index_weight']
+
+
+def update_mask(period, freq, lag):
+    """
+    Vectorized version of Sector.wages_update and Sector.prices_update.
+    Returns a boolean array which is True where a sector resets in period.
+
+    period: the period being calculated (the length of the history so far)
+    freq: array of update frequencies
+    lag: array of update lags
+    """
+    return (period - lag) % freq == 0
+
+
+def step(wages, prices, wage_shares, wages_due, prices_due, freq_w, freq_f,
+         mu, phi, a, v_w, v_f, freq_max):
+    """
+    Calculates wages, prices and wage shares for the next period from those in
+    the last period. Follows the same difference equations as Sector.update,
+    keeping the order of operations so that the results match exactly. Works
+    on arrays of any shape as long as everything broadcasts, which lets the
+    batched runs use it too.
+
+    wages, prices, wage_shares: values in the last period
+    wages_due, prices_due: masks of which sectors reset wages/prices
+    v_w, v_f, freq_max: global parameters (scalars or broadcastable arrays)
+    """
+    wage_change = (freq_w / freq_max) * mu * (v_w - wage_shares)
+    new_wages = np.where(wages_due, wages * (1 + wage_change), wages)
+    price_change = (freq_f / freq_max) * (wage_shares - v_f) * phi
+    new_prices = np.where(prices_due, prices * (1 + price_change), prices)
+    new_wage_shares = (new_wages * a) / new_prices
+    return new_wages, new_prices, new_wage_shares
+
+
+class ArrayEngine:
+    """
+    Holds the state of every sector in the economy as arrays and advances all
+    of them at once. Built either from a list of Sector objects (including
+    whatever history they already have) or straight from parameter arrays,
+    and can write its histories back into Sector objects, so the Economy can
+    hand control back and forth between the two.
+
+    Sectors with identical parameters and histories follow exactly the same
+    path, so by default they are merged into a single cohort which is
+    simulated once and carries the summed index weight of its members.
+    Histories are stored as a list with one array per period, where entry i
+    of each array belongs to cohort i; cohort_of_sector maps each sector to
+    its cohort.
+
+    When all frequencies and lags are whole numbers, an UpdateCalendar is used
+    so that only the cohorts which reset in a period are touched; everything
+    else is carried forward as is.
+    """
+
+    def __init__(self, params, wages, prices, wage_shares, global_params,
+                 dedupe=True):
+        """
+        params: matrix with one row per sector and one column per name in
+            ENGINE_PARAMS
+        wages, prices, wage_shares: history matrices with one row per sector
+            and one column per period so far
+        dedupe: whether to merge identical sectors into cohorts
+        """
+        self.global_params = global_params
+        self.n_sectors = len(params)
+        weight_column = ENGINE_PARAMS.index('index_weight')
+        if dedupe and self.n_sectors > 0:
+            # everything apart from the index weight has to match
+            behaviour = np.delete(params, weight_column, axis=1)
+            key = np.hstack([behaviour, wages, prices, wage_shares])
+            _, members, inverse = np.unique(key, axis=0, return_index=True,
+                                            return_inverse=True)
+            self.cohort_of_sector = inverse.reshape(-1)
+            weights = np.bincount(self.cohort_of_sector,
+                                  weights=params[:, weight_column],
+                                  minlength=len(members))
+        else:
+            members = np.arange(self.n_sectors)
+            self.cohort_of_sector = members
+            # copied so that it is contiguous, like the deduped weights;
+            # a strided column gives a differently rounded dot product, and a
+            # restored checkpoint has to add up the index the same way
+            weights = params[:, weight_column].copy()
+        self.n_cohorts = len(members)
+        for column, name in enumerate(ENGINE_PARAMS):
+            setattr(self, name, params[members, column])
+        self.index_weight = weights
+        self.wages = list(wages[members].T.copy())
+        self.prices = list(prices[members].T.copy())
+        self.wage_shares = list(wage_shares[members].T.copy())
+        # number of early periods dropped from the histories by trim
+        self.first_period = 0
+        self.build_calendars()
+        # shocks change prices without updating the wage share, so in the
+        # period after a shock every wage share has to be recalculated, or
+        # just those of the cohorts in stale_cohorts if only they were shocked
+        self.shares_stale = True
+        self.stale_cohorts = np.empty(0, dtype=np.int64)
+
+    @classmethod
+    def from_sectors(cls, sectors, global_params, dedupe=True):
+        """
+        Builds an engine from a list of Sector objects, taking over whatever
+        history they already have.
+        """
+        n_sectors = len(sectors)
+        params = param_matrix([sector.params for sector in sectors],
+                              ENGINE_PARAMS)
+        histories = []
+        for attribute in ['wages', 'prices', 'wage_shares']:
+            if n_sectors == 0:
+                histories.append(np.zeros((0, 1)))
+            else:
+                histories.append(np.array([getattr(sector, attribute)
+                                           for sector in sectors], dtype=float))
+        return cls(params, *histories, global_params, dedupe=dedupe)
+
+    @classmethod
+    def from_arrays(cls, columns, global_params, dedupe=True):
+        """
+        Builds an engine for new sectors straight from arrays of their
+        parameters, without any Sector objects.
+
+        columns: dict of parameter arrays with one entry per sector, keyed by
+            the names in params.PARAMETER_INDICES, with phi_bar and mu_bar
+            already added (see params.sector_arrays)
+        """
+        params = np.column_stack([columns[name] for name in ENGINE_PARAMS])
+        wages = np.asarray(columns['w0'], dtype=float)[:, None]
+        prices = np.asarray(columns['p0'], dtype=float)[:, None]
+        wage_shares = (wages * params[:, [ENGINE_PARAMS.index('a')]]) / prices
+        return cls(params, wages, prices, wage_shares, global_params,
+                   dedupe=dedupe)
+
+    def build_calendars(self):
+        """Sets up the update calendars, if the frequencies allow it."""
+        self.wage_calendar = None
+        self.price_calendar = None
+        if (UpdateCalendar.supports(self.freq_w, self.lag_w) and
+                UpdateCalendar.supports(self.freq_f, self.lag_f)):
+            self.wage_calendar = UpdateCalendar(self.freq_w, self.lag_w)
+            self.price_calendar = UpdateCalendar(self.freq_f, self.lag_f)
+
+    def get_state(self, history=True):
+        """
+        Everything needed to rebuild the engine exactly, as a dict of arrays
+        (see from_state).
+
+        history: whether to include every period so far or only the last
+            two, which is all that advancing and shocks need
+        """
+        keep = len(self.wages) if history else min(2, len(self.wages))
+        state = {name : getattr(self, name) for name in ENGINE_PARAMS}
+        state.update({
+            'cohort_of_sector' : self.cohort_of_sector,
+            'wages' : np.array(self.wages[-keep:]),
+            'prices' : np.array(self.prices[-keep:]),
+            'wage_shares' : np.array(self.wage_shares[-keep:]),
+            'first_period' : np.array(self.get_n_periods() - keep),
+            'shares_stale' : np.array(self.shares_stale),
+            'stale_cohorts' : self.stale_cohorts
+        })
+        return state
+
+    @classmethod
+    def from_state(cls, state, global_params):
+        """Rebuilds an engine from the arrays returned by get_state."""
+        engine = cls.__new__(cls)
+        engine.global_params = global_params
+        for name in ENGINE_PARAMS:
+            setattr(engine, name, np.array(state[name]))
+        engine.cohort_of_sector = np.array(state['cohort_of_sector'])
+        engine.n_sectors = len(engine.cohort_of_sector)
+        engine.n_cohorts = len(engine.index_weight)
+        engine.wages = list(np.array(state['wages']))
+        engine.prices = list(np.array(state['prices']))
+        engine.wage_shares = list(np.array(state['wage_shares']))
+        engine.first_period = int(state['first_period'])
+        engine.shares_stale = bool(state['shares_stale'])
+        engine.stale_cohorts = np.array(state['stale_cohorts'])
+        engine.build_calendars()
+        return engine
+
+    def get_n_periods(self):
+        """
+        Number of periods so far, including the initial values and any
+        periods dropped by trim.
+        """
+        return self.first_period + len(self.wages)
+
+    def trim(self, keep):
+        """
+        Forgets all but the last keep periods of history, so memory no longer
+        grows with the number of periods. Advancing works just as before,
+        but the dropped periods can't be read or written back any more.
+        Returns the number of periods dropped.
+        """
+        n_dropped = max(len(self.wages) - keep, 0)
+        if n_dropped:
+            for history in (self.wages, self.prices, self.wage_shares):
+                del history[:n_dropped]
+            self.first_period += n_dropped
+        return n_dropped
+
+    def check_full_history(self):
+        """Raises a RuntimeError if trim has dropped any periods."""
+        if self.first_period:
+            raise RuntimeError(f"the first {self.first_period} periods have "
+                               "been trimmed from the engine's history")
+
+    def cohort_sizes(self):
+        """Number of sectors in each cohort."""
+        return np.bincount(self.cohort_of_sector, minlength=self.n_cohorts)
+
+    def advance(self):
+        """Advances every sector by a single period."""
+        if self.wage_calendar is not None:
+            self.advance_scheduled()
+        else:
+            self.advance_masked()
+
+    def advance_masked(self):
+        """Advances every sector, testing each one for an update."""
+        period = self.get_n_periods()
+        wages_due = update_mask(period, self.freq_w, self.lag_w)
+        prices_due = update_mask(period, self.freq_f, self.lag_f)
+        global_params = self.global_params
+        new_wages, new_prices, new_wage_shares = step(
+            self.wages[-1], self.prices[-1], self.wage_shares[-1],
+            wages_due, prices_due, self.freq_w, self.freq_f, self.mu,
+            self.phi, self.a, global_params.v_w, global_params.v_f,
+            global_params.frequency_max)
+        self.wages.append(new_wages)
+        self.prices.append(new_prices)
+        self.wage_shares.append(new_wage_shares)
+        self.stale_cohorts = self.stale_cohorts[:0]
+
+    def advance_scheduled(self):
+        """
+        Advances every sector, but only calculates anything for the cohorts
+        which the calendars say are due this period.
+        """
+        period = self.get_n_periods()
+        last_wage_shares = self.wage_shares[-1]
+        wages = self.wages[-1].copy()
+        prices = self.prices[-1].copy()
+        wages_due = self.reset_wages(period, wages, last_wage_shares)
+        prices_due = self.reset_prices(period, prices, last_wage_shares)
+        if self.shares_stale:
+            wage_shares = (wages * self.a) / prices
+            self.shares_stale = False
+        else:
+            wage_shares = last_wage_shares.copy()
+            for due in (wages_due, prices_due, self.stale_cohorts):
+                wage_shares[due] = (wages[due] * self.a[due]) / prices[due]
+        self.stale_cohorts = self.stale_cohorts[:0]
+        self.wages.append(wages)
+        self.prices.append(prices)
+        self.wage_shares.append(wage_shares)
+
+    def reset_wages(self, period, wages, last_wage_shares):
+        """
+        Updates, in place, the wages of the cohorts whose wages reset in
+        period, and returns the indices of those cohorts.
+        """
+        global_params = self.global_params
+        wages_due = self.wage_calendar.due(period)
+        if len(wages_due):
+            wage_change = ((self.freq_w[wages_due] /
+                            global_params.frequency_max) *
+                           self.mu[wages_due] *
+                           (global_params.v_w - last_wage_shares[wages_due]))
+            wages[wages_due] = wages[wages_due] * (1 + wage_change)
+        return wages_due
+
+    def reset_prices(self, period, prices, last_wage_shares):
+        """
+        Updates, in place, the prices of the cohorts whose prices reset in
+        period, and returns the indices of those cohorts.
+        """
+        global_params = self.global_params
+        prices_due = self.price_calendar.due(period)
+        if len(prices_due):
+            price_change = ((self.freq_f[prices_due] /
+                             global_params.frequency_max) *
+                            (last_wage_shares[prices_due] - global_params.v_f)
+                            * self.phi[prices_due])
+            prices[prices_due] = prices[prices_due] * (1 + price_change)
+        return prices_due
+
+    def is_per_sector(self):
+        """Whether every sector is its own cohort, in the order added."""
+        return (self.n_cohorts == self.n_sectors and
+                np.array_equal(self.cohort_of_sector,
+                               np.arange(self.n_sectors)))
+
+    def split_cohorts(self, index_weight):
+        """
+        Gives every sector its own cohort again, in the order the sectors
+        were added, for when they are about to stop moving together (e.g. a
+        separate shock for each). Only the summed weight of a cohort is
+        kept, so the sectors' own index weights have to be passed back in.
+
+        index_weight: array with every sector's index weight
+        """
+        cohorts = self.cohort_of_sector
+        for name in ENGINE_PARAMS:
+            if name != 'index_weight':
+                setattr(self, name, getattr(self, name)[cohorts])
+        self.index_weight = np.array(index_weight, dtype=float)
+        for history in (self.wages, self.prices, self.wage_shares):
+            history[:] = [values[cohorts] for values in history]
+        self.stale_cohorts = np.flatnonzero(
+            np.isin(cohorts, self.stale_cohorts))
+        self.cohort_of_sector = np.arange(self.n_sectors)
+        self.n_cohorts = self.n_sectors
+        self.build_calendars()
+
+    def shock(self, size):
+        """
+        Array version of Sector.shock: raises every sector's latest price by
+        size times its price in the period before. size can also be an array
+        with one entry per cohort, which only makes sense once every sector
+        is its own cohort (see split_cohorts).
+        """
+        if np.ndim(size) and np.shape(size) != (self.n_cohorts,):
+            raise ValueError(f"expected one shock per cohort "
+                             f"({self.n_cohorts}), got shape "
+                             f"{np.shape(size)}")
+        self.prices[-1] = self.prices[-1] + size * self.prices[-2]
+        self.shares_stale = True
+
+    def shock_if_prices_update(self, size):
+        """
+        Array version of Sector.shock_if_prices_update: only the sectors
+        whose prices reset in the latest period are shocked. The price
+        calendar already knows which cohorts those are, so only they are
+        touched.
+        """
+        last_period = self.get_n_periods() - 1
+        if self.price_calendar is not None:
+            due = self.price_calendar.due(last_period)
+        else:
+            due = np.flatnonzero(update_mask(last_period, self.freq_f,
+                                             self.lag_f))
+        if len(due) == 0:
+            return
+        prices = self.prices[-1]
+        prices[due] = prices[due] + size * self.prices[-2][due]
+        self.stale_cohorts = np.concatenate([self.stale_cohorts, due])
+
+    def raw_index_series(self):
+        """
+        Returns an array with the raw (non-normalized) price index in every
+        period, i.e. the index-weighted sum of prices.
+        """
+        self.check_full_history()
+        return np.array(self.prices) @ self.index_weight
+
+    def raw_index_value(self, period):
+        """
+        Raw price index in a single period.
+
+        period: the period to fetch the raw index value for (negative
+            periods count back from the latest one)
+        """
+        if period >= 0:
+            if period < self.first_period:
+                self.check_full_history()
+            period -= self.first_period
+        return float(self.prices[period] @ self.index_weight)
+
+    def sector_value(self, name, sector, period):
+        """
+        One sector's wages, price or wage share in a single period, read
+        from its cohort.
+
+        name: 'wages', 'prices' or 'wage_shares'
+        sector: the sector's position in the economy
+        period: as in raw_index_value
+        """
+        if period >= 0:
+            if period < self.first_period:
+                self.check_full_history()
+            period -= self.first_period
+        cohort = self.cohort_of_sector[sector]
+        return float(getattr(self, name)[period][cohort])
+
+    def sector_history(self, name, sector):
+        """One sector's whole history of name, as an array."""
+        self.check_full_history()
+        cohort = self.cohort_of_sector[sector]
+        return np.array([values[cohort] for values in getattr(self, name)])
+
+    def write_back(self, sectors):
+        """
+        Copies the histories held by the engine back into the Sector objects
+        it was built from, so that they can be used directly again. Each
+        sector gets the history of its cohort.
+        """
+        self.check_full_history()
+        wages = np.array(self.wages).T[self.cohort_of_sector]
+        prices = np.array(self.prices).T[self.cohort_of_sector]
+        wage_shares = np.array(self.wage_shares).T[self.cohort_of_sector]
+        for i, sector in enumerate(sectors):
+            sector.set_histories(wages[i].tolist(), prices[i].tolist(),
+                                 wage_shares[i].tolist())
@@ -0,0 +1,105 @@
+"""
+Runs the replicates of an experiment over a pool of worker processes. Every
+replicate gets its own seed, spawned from a single root seed, and reseeds the
+random state it uses before it starts, so the results depend only on the root
+seed and the replicate number, not on how many workers there are or which
+worker ran what.
+"""
+import os
+import random as rd
+import numpy as np
+from settings import Settings
+from gen import Generator
+
+
+def mean_yoy_inflation(economy):
+    """
+    Summary function used by most experiments: the average year-over-year
+    inflation rate over the run.
+    """
+    return float(economy.year_over_year_inflation_series().mean())
+
+
+class TaskSpec:
+    """
+    Everything needed to run one replicate of an experiment in another
+    process: a snapshot of the settings, the size of the economy, how long to
+    run it, and a summary function which turns the finished economy into the
+    result that is sent back. The summary function has to be defined at the
+    top level of a module so that it can be pickled.
+    """
+
+    def __init__(self, settings : Settings, n_sectors, n_periods,
+                 summary=mean_yoy_inflation):
+        self.settings = settings.copy()
+        self.n_sectors = n_sectors
+        self.n_periods = n_periods
+        self.summary = summary
+
+
+def seed_replicate(seed_sequence):
+    """
+    Seeds the global random and np.random state, which the generator and the
+    stochastic shocks draw from, from a replicate's seed sequence.
+    """
+    state = seed_sequence.generate_state(4)
+    rd.seed(int.from_bytes(state.tobytes(), 'little'))
+    np.random.seed(state)
+
+
+def run_replicate(spec : TaskSpec, seed_sequence):
+    """
+    Runs a single replicate and returns its summary. The caller's global
+    random state is put back afterwards, which matters when replicates are
+    run in the calling process.
+    """
+    python_state = rd.getstate()
+    numpy_state = np.random.get_state()
+    try:
+        seed_replicate(seed_sequence)
+        economy = Generator().generate(spec.settings, spec.n_sectors)
+        economy.advance_n(spec.n_periods)
+        return spec.summary(economy)
+    finally:
+        rd.setstate(python_state)
+        np.random.set_state(numpy_state)
+
+
+class ReplicateExecutor:
+    """
+    Spreads the replicates of a TaskSpec over a process pool and returns the
+    results in replicate order. With one worker everything runs in the
+    calling process, which gives exactly the same results.
+    """
+
+    def __init__(self, workers=None):
+        # None uses every core
+        self.workers = workers
+
+    def run(self, spec : TaskSpec, n_replicates, seed=None):
+        """
+        Runs n_replicates replicates of spec and returns a list with the
+        result of each one.
+
+        seed: root seed. Results are identical for the same seed whatever the
+            number of workers; None draws a fresh one.
+        """
+        seeds = np.random.SeedSequence(seed).spawn(n_replicates)
+        return self.run_tasks([spec] * n_replicates, seeds)
+
+    def run_tasks(self, specs, seeds):
+        """
+        Runs one replicate for each pair of TaskSpec and seed sequence, all
+        in the same pool, and returns the results in order. Lets replicates
+        of different experiments share the workers.
+        """
+        if self.workers == 1:
+            return [run_replicate(spec, child)
+                    for spec, child in zip(specs, seeds)]
+        # only needed by the parent, so workers don't pay for importing it
+        from concurrent.futures import ProcessPoolExecutor
+        n_workers = self.workers or os.cpu_count() or 1
+        chunksize = max(1, len(seeds) // (4 * n_workers))
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            return list(pool.map(run_replicate, specs, seeds,
+                                 chunksize=chunksize))
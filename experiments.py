@@ -2,13 +2,27 @@
 This file contains various experiments I am doing to study the behavior of the
 model.
 """
+import sys
 from graphing import GraphingHelper
-from settings import Settings
+from settings import Settings, settings_record
 from gen import Generator
-from tqdm import tqdm
+from montecarlo import BatchRunner
+from executor import TaskSpec
+from adaptive import AdaptiveSweep, summarize
+import simcache
 
 N_SIMS = 100
 
+def progress(iterable):
+    """
+    Wraps iterable in a tqdm progress bar when there's a terminal to show it
+    on. tqdm is only imported then, so batch workers never load it.
+    """
+    if not sys.stderr.isatty():
+        return iterable
+    from tqdm import tqdm
+    return tqdm(iterable)
+
 def equilibrium_wage(settings : Settings):
     """
     From a settings object, get the global equilibrium value.
@@ -30,65 +44,136 @@ def gen_simple_staggered_economy():
     this_sector = test_economy.sectors[0]
     this_sector.params.print_params()
 
-def one_sector_economy(lags_match : bool, n_periods):
+def one_sector_economy(lags_match : bool, n_periods,
+                       statistic='yoy_inflation.mean'):
+    """
+    Runs a single sector economy starting at the equilibrium wage and
+    returns one summary statistic of the run (see online.STATISTICS), by
+    default the average YoY inflation rate.
+    """
     settings = Settings()
     settings.set_lags_match(lags_match)
     eq_wage = equilibrium_wage(settings)
     settings.set_sector_default('w0', eq_wage)
     gen = Generator()
     test_economy = gen.generate(settings, 1)
-    test_economy.advance_n(n_periods)
-    yoy_inflation = test_economy.year_over_year_inflation_series()
-    return sum(yoy_inflation) / len(yoy_inflation)
+    # only the statistic is kept, not the history
+    return float(test_economy.run_summary(n_periods, [statistic])[statistic])
 
-def get_average_when_lags_match():
+def get_average_when_lags_match(statistic='yoy_inflation.mean', seed=None):
     """
     Get the average YoY inflation rate when lags match. All economies have same
     initial conditions and vary over lag structure only.
     """
-    inflation_rates = []
-    for i in tqdm(range(N_SIMS)):
-        inflation_rates.append(one_sector_economy(lags_match=True, 
-                                                  n_periods=100))
-    return sum(inflation_rates) / len(inflation_rates)
+    return batched_one_sector_average(lags_match=True, n_periods=100,
+                                      statistic=statistic, seed=seed)
+
+def get_average_no_lag_match(statistic='yoy_inflation.mean', seed=None):
+    return batched_one_sector_average(lags_match=False, n_periods=100,
+                                      statistic=statistic, seed=seed)
+
+def batched_one_sector_average(lags_match : bool, n_periods,
+                               statistic='yoy_inflation.mean', seed=None):
+    """
+    Same as averaging one_sector_economy over N_SIMS runs, but with all the
+    runs simulated together in one batch, keeping only the statistic. With a
+    seed the result is reproducible, so it is looked up in the default
+    result cache (if one is enabled) before anything is simulated.
+    """
+    settings = Settings()
+    settings.set_lags_match(lags_match)
+    settings.set_sector_default('w0', equilibrium_wage(settings))
 
-def get_average_no_lag_match():
-    inflation_rates = []
-    for i in tqdm(range(N_SIMS)):
-        inflation_rates.append(one_sector_economy(lags_match=False, 
-                                                  n_periods=100))
-    return sum(inflation_rates) / len(inflation_rates)
+    def compute():
+        summary = BatchRunner(seed).run_summary(settings, 1, n_periods,
+                                                N_SIMS, [statistic])
+        return float(summary[statistic].mean())
+    return simcache.cached_call(
+        'batched_one_sector_average', compute, seed,
+        settings=settings_record(settings), n_periods=n_periods,
+        n_sims=N_SIMS, statistic=statistic)
 
 
 def yoy_inflation_based_on_desire_offset(lags_match : bool, n_sectors, 
-                                         n_periods):
+                                         n_periods,
+                                         statistic='yoy_inflation.mean',
+                                         seed=None):
     """
     Next: do a 50 sector economy.
     Let the difference between worker and employer targets range from 0.01 to 0.4
     in increments of 0.01.
+    The N_SIMS economies at each offset are simulated together as one batch,
+    and only the statistic asked for (averaged over them) is kept. With a
+    seed the whole sweep is reproducible and goes through the default result
+    cache, if one is enabled.
     """
     increment = 0.01
-    desire_offsets = []
-    inflation_rate = []
-    gen = Generator()
     settings = Settings()
     settings.set_lags_match(lags_match)
     eq_value = 0.6
-    for i in tqdm(range(80)):
-        desire_offset = (i + 1) * increment
-        desire_offsets.append(desire_offset)
-        rates = []
-        for _ in range(N_SIMS):
+    # v_w and v_f are set by the sweep itself, so they are left out of the
+    # cache key
+    record = settings_record(settings)
+    del record['global_defaults']['v_w'], record['global_defaults']['v_f']
+    inputs = {'settings' : record, 'n_sectors' : n_sectors,
+              'n_periods' : n_periods, 'n_sims' : N_SIMS,
+              'statistic' : statistic}
+
+    def compute():
+        desire_offsets = []
+        inflation_rate = []
+        runner = BatchRunner(seed)
+        for i in progress(range(80)):
+            desire_offset = (i + 1) * increment
+            desire_offsets.append(desire_offset)
             v_w = eq_value + desire_offset / 2
             v_f = eq_value - desire_offset / 2
-            settings.set_global_default('v_w', v_w)
-            settings.set_global_default('v_f', v_f)
-            test_economy = gen.generate(settings, n_sectors)
-            test_economy.advance_n(n_periods)
-            yoy_inflation = test_economy.year_over_year_inflation_series()
-            rates.append(sum(yoy_inflation) / len(yoy_inflation))
-        inflation_rate.append(sum(rates) / len(rates))
-    return [desire_offsets, inflation_rate]
+            # each point gets its own copy, so nothing is left changed
+            # whether or not compute runs (i.e. on a cache hit)
+            point = settings.copy()
+            point.set_global_default('v_w', v_w)
+            point.set_global_default('v_f', v_f)
+            summary = runner.run_summary(point, n_sectors, n_periods,
+                                         N_SIMS, [statistic])
+            inflation_rate.append(float(summary[statistic].mean()))
+        return [desire_offsets, inflation_rate]
+    return simcache.cached_call('yoy_inflation_based_on_desire_offset',
+                                compute, seed, **inputs)
+
+
+def adaptive_desire_offset_sweep(lags_match : bool, n_sectors, n_periods,
+                                 target_half_width=0.0005, budget=None,
+                                 seed=None, workers=None):
+    """
+    The same sweep over v_w - v_f as yoy_inflation_based_on_desire_offset,
+    but instead of N_SIMS replicates everywhere, each offset gets replicates
+    until the 95% confidence interval of its average YoY inflation rate is
+    within target_half_width (see adaptive.AdaptiveSweep), or the budget (a
+    cap on replicates for the whole sweep) runs out. Returns the offsets,
+    the estimates, the number of replicates used and whether the target was
+    reached at each offset, and the totals over the sweep as a dict with
+    'replicates' and 'converged' (the number of offsets that reached it).
+    """
+    increment = 0.01
+    settings = Settings()
+    settings.set_lags_match(lags_match)
+    eq_value = 0.6
+    desire_offsets = []
+    specs = []
+    for i in range(80):
+        desire_offset = (i + 1) * increment
+        desire_offsets.append(desire_offset)
+        settings.set_global_default('v_w', eq_value + desire_offset / 2)
+        settings.set_global_default('v_f', eq_value - desire_offset / 2)
+        # TaskSpec takes its own copy of the settings
+        specs.append(TaskSpec(settings, n_sectors, n_periods))
+    sweep = AdaptiveSweep(target_half_width, budget=budget, workers=workers)
+    table = summarize(sweep.run(specs, seed))
+    totals = {'replicates' : int(table['n_replicates'].sum()),
+              'converged' : int(table['converged'].sum())}
+    return [desire_offsets, table['mean'].tolist(),
+            table['n_replicates'].tolist(), table['converged'].tolist(),
+            totals]
 
 
 def compare_lag_constraints():
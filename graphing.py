@@ -1,9 +1,69 @@
-import matplotlib
-matplotlib.use('TkAgg') # don't know why I did this, but it helped with my bugs
-import matplotlib.pyplot as plt
+import os
+import sys
+import numpy as np
 from sectors import Sector
 from economy import Economy
 
+# don't know why I did this, but it helped with my bugs
+INTERACTIVE_BACKEND = 'TkAgg'
+# used with no display, drawing to image files instead of windows
+HEADLESS_BACKEND = 'Agg'
+DEFAULT_FIGURE_DIRECTORY = 'figures'
+
+# None works it out from the environment (see is_headless)
+headless = None
+figure_directory = DEFAULT_FIGURE_DIRECTORY
+
+
+def set_headless(value=True, directory=None):
+    """
+    Sets whether graphs are saved to files instead of shown in windows. Has
+    to be called before the first graph to change the matplotlib backend.
+
+    directory: where GraphingHelpers without an output directory of their
+        own save graphs
+    """
+    global headless, figure_directory
+    headless = value
+    if directory is not None:
+        figure_directory = directory
+
+
+def is_headless():
+    """
+    Whether graphs go to files: if set with set_headless, otherwise if
+    matplotlib has been told to use Agg or there's no display to draw on.
+    """
+    if headless is not None:
+        return headless
+    if os.environ.get('MPLBACKEND', '').lower() == 'agg':
+        return True
+    return (sys.platform.startswith('linux') and
+            not os.environ.get('DISPLAY') and
+            not os.environ.get('WAYLAND_DISPLAY'))
+
+
+class LazyPyplot:
+    """
+    Stands in for matplotlib.pyplot until the first graph is drawn, so that
+    importing this module (and everything that imports it) doesn't import
+    matplotlib, which is slow and needs a display with TkAgg. On first use
+    the backend is picked, pyplot is imported and replaces this object.
+    """
+
+    def __getattr__(self, name):
+        global plt
+        import matplotlib
+        if 'MPLBACKEND' not in os.environ:
+            matplotlib.use(HEADLESS_BACKEND if is_headless()
+                           else INTERACTIVE_BACKEND)
+        import matplotlib.pyplot as pyplot
+        plt = pyplot
+        return getattr(pyplot, name)
+
+
+plt = LazyPyplot()
+
 class GraphingHelper:
     """
     This class handles all graphing that I need to do. Right now, it just
@@ -11,9 +71,27 @@ class GraphingHelper:
     plot the data value against the index of the data.
     """
 
-    def __init__(self):
-        # nothing happens
-        pass
+    def __init__(self, output_directory=None):
+        # where graphs are saved when headless (or always, if given)
+        self.output_directory = output_directory
+        self.n_saved = 0
+
+    def show(self, name):
+        """
+        Shows the current figure in a window or, when headless or given an
+        output directory, saves it there as a numbered PNG file named after
+        the graph, and returns the file name.
+        """
+        if self.output_directory is None and not is_headless():
+            plt.show()
+            return None
+        directory = self.output_directory or figure_directory
+        os.makedirs(directory, exist_ok=True)
+        self.n_saved += 1
+        filename = os.path.join(directory, f'{self.n_saved:03d}_{name}.png')
+        plt.savefig(filename)
+        plt.close()
+        return filename
 
     def simple_graph_wage_share(self, sector : Sector):
         """
@@ -32,7 +110,7 @@ class GraphingHelper:
         plt.ylabel('Wage Share of Income')
         
         plt.legend()
-        plt.show()
+        self.show('wage_share')
 
     def graph_wages_prices(self, sector):
         """
@@ -40,7 +118,7 @@ class GraphingHelper:
         """
         self.basic_plot(sector.wages)
         self.basic_plot(sector.prices)
-        plt.show()
+        self.show('wages_prices')
 
     def graph_price_index(self, economy : Economy):
         """
@@ -48,16 +126,16 @@ class GraphingHelper:
         """
         price_index = economy.calculate_price_index()
         self.basic_plot(price_index)
-        plt.show()
+        self.show('price_index')
 
     def graph_period_to_period_inflation(self, economy : Economy):
         """
         Graphs a period to period inflation rate.
         """
         inflation_data = economy.period_to_period_inflation_series()
-        convert_to_percent(inflation_data)
+        inflation_data = convert_to_percent(inflation_data)
         self.basic_plot(inflation_data)
-        plt.show()
+        self.show('period_to_period_inflation')
 
     def graph_yoy_inflation(self, economy : Economy):
         """
@@ -65,31 +143,31 @@ class GraphingHelper:
         year is 12 periods.)
         """
         inflation_data = economy.year_over_year_inflation_series()
-        convert_to_percent(inflation_data)
+        inflation_data = convert_to_percent(inflation_data)
         self.basic_plot(inflation_data)
         plt.title("Year Over Year Inflation")
         plt.xlabel("Period")
         plt.ylabel("Inflation Rate (percent)")
-        plt.show()
+        self.show('yoy_inflation')
 
     def graph_ptp_moving_average(self, economy : Economy, window):
         """Graphs a moving average of inflation data with some specified
         window over which the average is calculated."""
         moving_avg = economy.get_ptp_moving_average(window)
-        convert_to_percent(moving_avg)
+        moving_avg = convert_to_percent(moving_avg)
         self.basic_plot(moving_avg)
-        plt.show()
+        self.show('ptp_moving_average')
 
     def graph_yoy_moving_average(self, economy : Economy, window):
         """Graphs a moving average of inflation data with some specified
         window over which the average is calculated."""
         moving_avg = economy.get_yoy_moving_average(window)
-        convert_to_percent(moving_avg)
+        moving_avg = convert_to_percent(moving_avg)
         self.basic_plot(moving_avg)
         plt.title(f"\"Year Over Year\" Inflation - {window} Month Moving Average")
         plt.xlabel("Period")
         plt.ylabel("Inflation Rate (percent)")
-        plt.show()
+        self.show('yoy_moving_average')
 
     def basic_plot(self, data_series):
         """
@@ -116,16 +194,17 @@ class GraphingHelper:
         plt.title("Wage-Price Change Synchronization" + 
                   " and Average Inflation Rate")
         plt.legend()
-        plt.show()
+        self.show('compare_lines')
 
 
 def convert_to_percent(data_series):
     """
-    Free-standing function that takes in a data series and multiplies every
-    value in it by 100 to turn it into a percent.
+    Free-standing function that takes in a data series (a list or an array)
+    and returns an array with every value multiplied by 100 to turn it into a
+    percent. The original series is left alone, since the economy's series
+    are shared with its cache.
     """
-    for i in range(len(data_series)):
-        data_series[i] *= 100
+    return np.asarray(data_series) * 100
 
 
 
@@ -0,0 +1,268 @@
+"""
+Memory accounting, for capacity planning of big runs. measure breaks down
+how many bytes an Economy is holding (sector histories, parameters, shock
+history, derived series), project works out the same breakdown and the peak
+for a run of a given size before it starts, and tracing measures what a run
+actually allocates with tracemalloc.
+
+The sizes of Python objects are CPython's (from sys.getsizeof), so the
+numbers are close but not exact. In particular a float object that appears
+more than once is counted every time, and a sector advanced on its own
+reuses last period's float whenever it doesn't reset, so the histories of
+unvectorized runs are overestimated.
+"""
+import sys
+import tracemalloc
+from contextlib import contextmanager
+import numpy as np
+from params import PARAM_DTYPE
+from engine import ENGINE_PARAMS
+
+FLOAT_BYTES = 8 # a float64 in an array
+PY_FLOAT_BYTES = sys.getsizeof(1.0) # a Python float object
+POINTER_BYTES = 8 # a slot in a list
+ARRAY_HEADER_BYTES = sys.getsizeof(np.empty(0)) # an array without its data
+LIST_HEADER_BYTES = sys.getsizeof([])
+# a Sector object, its attribute dict and its SectorParams view, roughly
+SECTOR_OBJECT_BYTES = 400
+# number of derived series (price index, inflation, a couple of moving
+# averages) a typical analysis keeps in the series cache at once
+TYPICAL_DERIVED_SERIES = 5
+
+CATEGORIES = ['sector_histories', 'parameters', 'shock_history',
+              'derived_series']
+
+
+def format_bytes(n_bytes):
+    """e.g. 1536 -> '1.5 KiB'."""
+    for unit in ['B', 'KiB', 'MiB', 'GiB']:
+        if abs(n_bytes) < 1024 or unit == 'GiB':
+            return (f"{n_bytes:.0f} {unit}" if unit == 'B'
+                    else f"{n_bytes:.1f} {unit}")
+        n_bytes /= 1024
+
+
+def float_list_bytes(values):
+    """Bytes in a list of Python floats."""
+    return sys.getsizeof(values) + len(values) * PY_FLOAT_BYTES
+
+
+def array_list_bytes(arrays):
+    """
+    Bytes in a list of arrays, counting memory shared between them (e.g.
+    rows of the same matrix) once.
+    """
+    total = sys.getsizeof(arrays)
+    owners = {}
+    for array in arrays:
+        total += ARRAY_HEADER_BYTES
+        owner = array if array.base is None else array.base
+        owners[id(owner)] = owner
+    return total + sum(owner.nbytes for owner in owners.values())
+
+
+def value_bytes(value):
+    """Bytes in an array, a float, or a list or tuple of them."""
+    if isinstance(value, np.ndarray):
+        return ARRAY_HEADER_BYTES + (value.nbytes if value.base is None else 0)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(value_bytes(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class MemoryReport:
+    """
+    Bytes per category in CATEGORIES, with a finer breakdown of each, and
+    for projections the transient peak on top of what is held.
+    """
+
+    def __init__(self, details, transient=0):
+        # dict of category : dict of item : bytes
+        self.details = details
+        self.transient = transient
+
+    def get_bytes(self, category):
+        return sum(self.details.get(category, {}).values())
+
+    def total(self):
+        """Bytes held, in every category."""
+        return sum(self.get_bytes(category) for category in CATEGORIES)
+
+    def peak(self):
+        """Bytes held plus the transient peak."""
+        return self.total() + self.transient
+
+    def as_dict(self):
+        report = {category : self.get_bytes(category)
+                  for category in CATEGORIES}
+        report.update({'total' : self.total(), 'transient' : self.transient,
+                       'peak' : self.peak()})
+        return report
+
+    def print_report(self):
+        for category in CATEGORIES:
+            n_bytes = self.get_bytes(category)
+            print(f"{category:<24}{format_bytes(n_bytes):>12}")
+            for item, n_bytes in self.details.get(category, {}).items():
+                print(f"    {item:<20}{format_bytes(n_bytes):>12}")
+        print(f"{'total':<24}{format_bytes(self.total()):>12}")
+        if self.transient:
+            print(f"{'transient':<24}{format_bytes(self.transient):>12}")
+            print(f"{'peak':<24}{format_bytes(self.peak()):>12}")
+
+
+def measure(economy):
+    """
+    What an Economy is holding right now, as a MemoryReport (see
+    Economy.memory_report).
+    """
+    histories = {}
+    engine = economy.engine
+    if engine is not None:
+        for name in ['wages', 'prices', 'wage_shares']:
+            histories[f'engine.{name}'] = array_list_bytes(
+                getattr(engine, name))
+    if economy._sectors is not None:
+        sectors = economy._sectors
+        histories['sector_objects'] = (sys.getsizeof(sectors) +
+                                       len(sectors) * SECTOR_OBJECT_BYTES)
+        # the sectors' own lists, which are left as they were while the
+        # engine is running
+        for name in ['wages', 'prices', 'wage_shares']:
+            histories[f'sectors.{name}'] = sum(
+                float_list_bytes(getattr(sector, '_' + name))
+                for sector in sectors)
+    parameters = {'param_table' : economy.param_table.data.nbytes}
+    if engine is not None:
+        parameters['engine'] = sum(
+            value_bytes(getattr(engine, name)) for name in
+            ENGINE_PARAMS + ['cohort_of_sector'])
+    shocks = {'shocks' : float_list_bytes(economy.shocks)}
+    for name in ['aggregate_shocks', 'local_shocks']:
+        path = getattr(economy, name)
+        if path is not None and path.path is not None:
+            shocks[name] = value_bytes([path.innovations, path.path])
+    derived = {}
+    if economy.raw_index is not None:
+        derived['raw_index'] = value_bytes(economy.raw_index.data)
+    if economy.index_tail is not None:
+        derived['index_tail'] = (sys.getsizeof(economy.index_tail) +
+                                 len(economy.index_tail) * PY_FLOAT_BYTES)
+    derived['series_cache'] = sum(
+        value_bytes(value)
+        for value in economy.series_cache.entries.values()
+        if isinstance(value, (np.ndarray, list, tuple)))
+    return MemoryReport({'sector_histories' : histories,
+                         'parameters' : parameters,
+                         'shock_history' : shocks,
+                         'derived_series' : derived})
+
+
+def project(n_sectors, n_periods, vectorized=True, n_cohorts=None,
+            shocks=False, sector_access=False,
+            derived_series=TYPICAL_DERIVED_SERIES):
+    """
+    Projects the memory of a run of n_sectors over n_periods, before it
+    starts, as a MemoryReport whose peak is the most it should need at once.
+
+    vectorized: whether the array engine is used
+    n_cohorts: number of distinct sectors the engine simulates, if identical
+        sectors are merged (see engine.ArrayEngine); defaults to n_sectors,
+        the worst case
+    shocks: whether a shock is recorded every period (stochastic or single
+        shocks)
+    sector_access: whether the Sector objects are changed after the run
+        (e.g. economy.sectors[0].prices[-1] = 1), which copies the engine's
+        histories back into Python lists
+    derived_series: number of period-long series kept in the series cache
+    """
+    if n_cohorts is None:
+        n_cohorts = n_sectors
+    periods = n_periods + 1 # including period 0
+    history_list = LIST_HEADER_BYTES + periods * POINTER_BYTES
+    sector_lists = 3 * n_sectors * (LIST_HEADER_BYTES +
+                                    periods * (POINTER_BYTES + PY_FLOAT_BYTES))
+    sector_objects = n_sectors * SECTOR_OBJECT_BYTES
+    histories = {}
+    transient = 0
+    if vectorized:
+        histories['engine'] = 3 * (history_list + periods * (
+            ARRAY_HEADER_BYTES + n_cohorts * FLOAT_BYTES))
+        # rebuilding the index stacks every period's prices into a matrix
+        transient = periods * n_cohorts * FLOAT_BYTES
+        if sector_access:
+            histories['sector_objects'] = sector_objects
+            histories['sectors'] = sector_lists
+            # write_back stacks each history and expands it to one row per
+            # sector before making the lists
+            transient = 3 * periods * (n_cohorts + n_sectors) * FLOAT_BYTES
+    else:
+        histories['sector_objects'] = sector_objects
+        histories['sectors'] = sector_lists
+    parameters = {'param_table' : n_sectors * PARAM_DTYPE.itemsize}
+    if vectorized:
+        parameters['engine'] = (len(ENGINE_PARAMS) + 1) * (
+            ARRAY_HEADER_BYTES + n_cohorts * FLOAT_BYTES)
+    shock_history = {'shocks' : LIST_HEADER_BYTES + (
+        periods * (POINTER_BYTES + PY_FLOAT_BYTES) if shocks else 0)}
+    # the raw index doubles its capacity as it grows, so it can be up to
+    # twice the number of periods
+    derived = {'raw_index' : ARRAY_HEADER_BYTES + 2 * periods * FLOAT_BYTES,
+               'series_cache' : derived_series * (
+                   ARRAY_HEADER_BYTES + periods * FLOAT_BYTES)}
+    return MemoryReport({'sector_histories' : histories,
+                         'parameters' : parameters,
+                         'shock_history' : shock_history,
+                         'derived_series' : derived}, transient)
+
+
+class TraceResult:
+    """
+    What tracemalloc saw while tracing: the bytes still allocated at the end
+    and the peak, both relative to when tracing started, and a snapshot to
+    find where they were allocated.
+    """
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self.snapshot = None
+
+    def top(self, n=10, key_type='lineno'):
+        """The n source lines (or files) that allocated the most."""
+        if self.snapshot is None:
+            return []
+        return self.snapshot.statistics(key_type)[:n]
+
+    def print_report(self, n=10):
+        print(f"current: {format_bytes(self.current)}, "
+              f"peak: {format_bytes(self.peak)}")
+        for statistic in self.top(n):
+            print(statistic)
+
+
+@contextmanager
+def tracing(snapshot=True):
+    """
+    Traces the memory allocated inside the with block and fills in the
+    TraceResult it yields once the block ends. Tracing slows everything
+    down a lot, so it's only for finding out where the memory goes.
+
+    snapshot: whether to also take a tracemalloc snapshot at the end
+    """
+    result = TraceResult()
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    start, _ = tracemalloc.get_traced_memory()
+    try:
+        yield result
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        result.current = current - start
+        result.peak = peak - start
+        if snapshot:
+            result.snapshot = tracemalloc.take_snapshot()
+        if not already_tracing:
+            tracemalloc.stop()
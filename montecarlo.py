@@ -0,0 +1,171 @@
+"""
+Batched Monte Carlo runs. Instead of generating and advancing one Economy per
+replicate, a whole (replicate x sector) matrix of economies is drawn from a
+Settings object and advanced together with the same vectorized step the array
+engine uses. Only the price index of each replicate is kept, which is all the
+experiments end up looking at.
+"""
+import numpy as np
+from collections import deque
+from settings import Settings
+from gen import BulkSampler
+from engine import update_mask, step
+from shocks import ShockPath, ALPHA, SIGMA_ETA, SIGMA_EPSILON
+import analytics
+import online
+
+
+class BatchResult:
+    """
+    The output of a batched run. Holds the price index of every replicate,
+    normalized to 1 in period 0, as an array of shape
+    (n_replicates, n_periods + 1). Summary series are calculated from it on
+    request, one row per replicate.
+    """
+
+    def __init__(self, price_index, global_params):
+        self.price_index = price_index
+        self.global_params = global_params
+
+    def get_n_replicates(self):
+        return self.price_index.shape[0]
+
+    def lagged_inflation(self, lag):
+        """
+        Rate of change of each replicate's price index compared to 'lag'
+        periods earlier, as in Economy.lagged_inflation_series.
+
+        lag: the length of the lag for the lagged series
+        """
+        return analytics.lagged_inflation(self.price_index, lag)
+
+    def period_to_period_inflation(self):
+        """Period-to-period inflation of each replicate."""
+        return self.lagged_inflation(1)
+
+    def yoy_inflation(self):
+        """Year-over-year inflation of each replicate (a year is 12 periods)."""
+        return self.lagged_inflation(analytics.PERIODS_PER_YEAR)
+
+    def mean_yoy_inflation(self):
+        """
+        Average year-over-year inflation rate of each replicate, the summary
+        the experiments use. Returns an array with one value per replicate.
+        """
+        return self.yoy_inflation().mean(axis=1)
+
+
+class BatchRunner:
+    """
+    Runs many independent economies at once. Parameters for every replicate
+    and sector are drawn in one go by a gen.BulkSampler from a NumPy random
+    generator, so a seed makes the whole batch reproducible.
+    """
+
+    def __init__(self, rng=None):
+        # accepts a seed or an existing numpy Generator
+        self.rng = np.random.default_rng(rng)
+
+    def run(self, settings : Settings, n_sectors, n_periods, n_replicates):
+        """
+        Draws n_replicates economies of n_sectors each according to settings,
+        advances them all by n_periods and returns a BatchResult.
+        """
+        global_params, params = self.draw(settings, n_sectors, n_replicates)
+        price_index = self.simulate(settings, global_params, params,
+                                    n_periods)
+        return BatchResult(price_index, global_params)
+
+    def run_summary(self, settings : Settings, n_sectors, n_periods,
+                    n_replicates, statistics=('yoy_inflation.mean',)):
+        """
+        Like run, but keeps no price index: only the statistics asked for are
+        worked out as the batch advances, with online accumulators. Returns a
+        dict with an array of one value per replicate for each statistic.
+
+        statistics: names like 'yoy_inflation.mean'; see online.SERIES and
+            online.STATISTICS
+        """
+        global_params, params = self.draw(settings, n_sectors, n_replicates)
+        summary = online.Summary(statistics)
+        tail = deque(maxlen=analytics.PERIODS_PER_YEAR + 1)
+        for period, (raw_values, wage_shares) in enumerate(self.iter_periods(
+                settings, global_params, params, n_periods)):
+            tail.append(raw_values)
+            if period == 0:
+                # as in Economy.run_summary, period 0 only starts the tail and
+                # the n periods after it are the ones summarized
+                continue
+            record = analytics.tail_inflation(tail)
+            if summary.needs_cross_sector_stats():
+                record['wage_share_mean'] = wage_shares.mean(axis=1)
+            summary.add_record(record)
+        return summary.results()
+
+    def draw(self, settings : Settings, n_sectors, n_replicates):
+        """
+        Draws the global and sector parameters of every replicate, returning
+        two dicts of arrays (see gen.BulkSampler).
+        """
+        sampler = BulkSampler(settings, self.rng)
+        global_params = sampler.draw_global_params(n_replicates)
+        params = sampler.draw_sector_params(global_params, n_sectors,
+                                            n_replicates)
+        # as in SectorParams, the sector's own phi and mu are added to the
+        # global values
+        params['phi'] = params['phi'] + global_params['phi_bar']
+        params['mu'] = params['mu'] + global_params['mu_bar']
+        return global_params, params
+
+    def simulate(self, settings : Settings, global_params, params, n_periods):
+        """
+        Advances every replicate by n_periods. Returns the normalized price
+        index of each replicate, shape (n_replicates, n_periods + 1).
+        """
+        n_replicates = params['w0'].shape[0]
+        raw_index = np.empty((n_replicates, n_periods + 1))
+        for period, (raw_values, _) in enumerate(self.iter_periods(
+                settings, global_params, params, n_periods)):
+            raw_index[:, period] = raw_values
+        return raw_index / raw_index[:, :1]
+
+    def iter_periods(self, settings : Settings, global_params, params,
+                     n_periods):
+        """
+        Advances every replicate by n_periods, yielding the raw price index of
+        each replicate and the matrix of wage shares, first for period 0 and
+        then after each step. Only the latest period is ever held.
+        """
+        wages = params['w0']
+        prices = params['p0']
+        wage_shares = (wages * params['a']) / prices
+        weights = params['index_weight']
+        n_replicates = wages.shape[0]
+        yield (prices * weights).sum(axis=1), wage_shares
+        # aggregate AR(1) shocks are drawn separately for each replicate, and
+        # idiosyncratic ones for each sector of each replicate
+        aggregate_shocks = None
+        local_shocks = None
+        if settings.is_stochastic():
+            aggregate_shocks = ShockPath(ALPHA, SIGMA_ETA, (n_replicates, 1),
+                                         self.rng)
+        if settings.is_locally_stochastic():
+            local_shocks = ShockPath(ALPHA, SIGMA_EPSILON, wages.shape,
+                                     self.rng)
+        for period in range(1, n_periods + 1):
+            wages_due = update_mask(period, params['freq_w'], params['lag_w'])
+            prices_due = update_mask(period, params['freq_f'], params['lag_f'])
+            last_prices = prices
+            wages, prices, wage_shares = step(
+                wages, prices, wage_shares, wages_due, prices_due,
+                params['freq_w'], params['freq_f'], params['mu'],
+                params['phi'], params['a'], global_params['v_w'],
+                global_params['v_f'], global_params['freq_max'])
+            if aggregate_shocks is not None or local_shocks is not None:
+                shocks = 0.0
+                if aggregate_shocks is not None:
+                    shocks = aggregate_shocks.next()
+                if local_shocks is not None:
+                    shocks = shocks + local_shocks.next()
+                prices = prices + shocks * last_prices
+            yield (prices * weights).sum(axis=1), wage_shares
@@ -0,0 +1,121 @@
+"""
+Online summary statistics, for runs where only a few numbers are wanted at
+the end (e.g. the average year-over-year inflation rate) and there's no need
+to keep the whole history around to calculate them. Statistics are named
+'<series>.<statistic>', e.g. 'yoy_inflation.mean' or 'inflation.max', and
+each series is fed one period at a time into a Welford accumulator.
+"""
+import numpy as np
+
+""" Series that can be summarized, and the key each one has in the period
+    records from Economy.iter_periods."""
+SERIES = {
+    'yoy_inflation' : 'yoy_inflation',
+    'inflation' : 'inflation', # period to period
+    'wage_share' : 'wage_share_mean' # average across sectors
+}
+
+STATISTICS = ['mean', 'variance', 'std', 'min', 'max', 'count']
+
+
+class RunningStats:
+    """
+    Welford's online algorithm for the mean and variance, plus the min and
+    max, of a series seen one value at a time. The values can also be
+    arrays, e.g. one per replicate, in which case everything is done
+    elementwise.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0 # sum of squared differences from the mean
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        """Adds the next value of the series."""
+        self.count += 1
+        delta = value - self.mean
+        self.mean = self.mean + delta / self.count
+        self.m2 = self.m2 + delta * (value - self.mean)
+        if self.min is None:
+            self.min = value
+            self.max = value
+        else:
+            self.min = np.minimum(self.min, value)
+            self.max = np.maximum(self.max, value)
+
+    def get(self, statistic):
+        """
+        Returns one of the statistics in STATISTICS. The variance is the
+        population variance, as in np.var. Everything but the count is NaN
+        before any values have been added.
+        """
+        if statistic == 'count':
+            return self.count
+        if self.count == 0:
+            return float('nan')
+        if statistic == 'mean':
+            return self.mean
+        if statistic == 'variance':
+            return self.m2 / self.count
+        if statistic == 'std':
+            return np.sqrt(self.m2 / self.count)
+        if statistic == 'min':
+            return self.min
+        if statistic == 'max':
+            return self.max
+        raise ValueError(f"unknown statistic '{statistic}'")
+
+
+def parse_statistic(name):
+    """
+    Splits a name like 'yoy_inflation.mean' into its series and statistic,
+    checking that both exist.
+    """
+    series, _, statistic = name.partition('.')
+    if series not in SERIES or statistic not in STATISTICS:
+        raise ValueError(f"unknown statistic '{name}': expected "
+                         "'<series>.<statistic>' with series one of "
+                         f"{list(SERIES)} and statistic one of {STATISTICS}")
+    return series, statistic
+
+
+class Summary:
+    """
+    The accumulators needed for a list of statistic names. Fed one period
+    record at a time, and only keeps a RunningStats for each series that was
+    asked about.
+    """
+
+    def __init__(self, statistics):
+        self.statistics = list(statistics)
+        self.accumulators = {}
+        for name in self.statistics:
+            series, _ = parse_statistic(name)
+            self.accumulators.setdefault(series, RunningStats())
+
+    def needs_cross_sector_stats(self):
+        """Whether any series comes from analytics.cross_sector_stats."""
+        return 'wage_share' in self.accumulators
+
+    def add_record(self, record):
+        """
+        Adds a period's values. record is a dict like the ones yielded by
+        Economy.iter_periods; series which are missing, None or NaN (e.g.
+        year-over-year inflation in the first year) are skipped.
+        """
+        for series, accumulator in self.accumulators.items():
+            value = record.get(SERIES[series])
+            if value is None or (np.ndim(value) == 0 and np.isnan(value)):
+                continue
+            accumulator.add(value)
+
+    def results(self):
+        """Returns a dict with the value of each statistic asked for."""
+        results = {}
+        for name in self.statistics:
+            series, statistic = parse_statistic(name)
+            results[name] = self.accumulators[series].get(statistic)
+        return results
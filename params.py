@@ -1,3 +1,5 @@
+import numpy as np
+
 class GlobalParams:
     """An object that stores the global parameters of the model:
         - v_w: the target wage share for workers
@@ -40,38 +42,231 @@ PARAMETER_INDICES = {
     9 : 'index_weight'
 }
 
+""" Structured dtype of a ParamTable: one float field for every name in
+    PARAMETER_INDICES, in the same order."""
+PARAM_DTYPE = np.dtype([(name, np.float64)
+                        for name in PARAMETER_INDICES.values()])
+
+class ParamTable:
+    """ Columnar store for the local parameters of many sectors, i.e. a
+        structured NumPy array with one row per sector and one field per
+        parameter, along with the GlobalParams that they all share. Whole
+        columns can be read or written at once, and a SectorParams object is
+        just a view of one row. Keeps spare capacity and doubles it when full,
+        the same as series.GrowingArray, so adding sectors one at a time is
+        cheap."""
+
+    def __init__(self, global_params : GlobalParams, capacity=16):
+        self.global_params = global_params
+        self.data = np.zeros(max(capacity, 1), dtype=PARAM_DTYPE)
+        self.length = 0
+        # called with no arguments before a value is changed through
+        # set_value or set_column (an Economy uses it to stop its engine)
+        self.listener = None
+
+    def __len__(self):
+        return self.length
+
+    """ Makes sure there is room for n_rows more rows."""
+    def reserve(self, n_rows):
+        needed = self.length + n_rows
+        if needed > len(self.data):
+            new_data = np.zeros(max(needed, 2 * len(self.data)),
+                                dtype=PARAM_DTYPE)
+            new_data[:self.length] = self.data[:self.length]
+            self.data = new_data
+
+    """ Adds a row and returns its index. values is a dict (or a SectorParams
+        data dict) with a final value for every name in PARAMETER_INDICES,
+        i.e. phi and mu already include phi_bar and mu_bar."""
+    def append(self, values):
+        self.reserve(1)
+        row = self.length
+        self.data[row] = tuple(map(values.__getitem__,
+                                   PARAMETER_INDICES.values()))
+        self.length += 1
+        return row
+
+    """ Adds a row for each entry of a dict of final parameter arrays (see
+        sector_arrays) and returns the range of the new row indices."""
+    def extend(self, columns):
+        n_rows = len(columns['w0'])
+        self.reserve(n_rows)
+        start = self.length
+        for name in PARAMETER_INDICES.values():
+            self.data[name][start:start + n_rows] = columns[name]
+        self.length += n_rows
+        return range(start, start + n_rows)
+
+    """ Returns the values of one parameter for every row. This is a view of
+        the table, so writing to it changes the table; it should be copied if
+        it has to outlive rows being added."""
+    def column(self, param_name):
+        return self.data[param_name][:self.length]
+
+    """ Returns a dict with the column of every parameter."""
+    def columns(self):
+        return {name : self.column(name)
+                for name in PARAMETER_INDICES.values()}
+
+    """ Sets one parameter for every row at once. values is a single value or
+        an array with one entry per row."""
+    def set_column(self, param_name, values):
+        if self.listener is not None:
+            self.listener()
+        self.data[param_name][:self.length] = values
+
+    """ Sets one parameter of one row."""
+    def set_value(self, row, param_name, value):
+        if self.listener is not None:
+            self.listener()
+        self.data[param_name][row] = value
+
+    """ Returns a SectorParams view of a row."""
+    def row(self, index):
+        return SectorParams.view(self, index)
+
+    """ Moves the values of a SectorParams object into a new row and
+        returns it. A standalone SectorParams is rebound to the new row, so
+        the same object carries on controlling the values. One that is
+        already a view of a row (of any table, including this one) can't
+        belong to two rows, so its values are copied and a view of the new
+        row is returned instead."""
+    def adopt(self, params):
+        if params.table is None:
+            row = self.append(params.values)
+            params.table = self
+            params.row = row
+            params.values = None
+            return params
+        self.reserve(1)
+        row = self.length
+        self.data[row] = params.table.data[params.row]
+        self.length += 1
+        return self.row(row)
+
+    """ Number of bytes taken up by the rows in use."""
+    def get_nbytes(self):
+        return self.length * PARAM_DTYPE.itemsize
+
+
 class SectorParams:
     """ An object that stores the local parameters for a given sector, 
         specifications listed below. Initialized with an array of data,
         which is processed according to the constant dict 
         PARAMETER_INDICES. Any param can then be accessed using the get
         method and set using the set method, which requires string arguments
-        with the name of the parameter."""
+        with the name of the parameter.
+        
+        Made on its own it keeps its values in a dict, as it always did.
+        Once its sector is added to an Economy the values move into a row of
+        the economy's ParamTable (see ParamTable.adopt) and this object only
+        records which table and row, so it costs next to nothing on top of
+        the row."""
+
+    __slots__ = ('table', 'row', 'values', 'global_params')
 
     def __init__(self, raw_param_data, global_params : GlobalParams):
-        self.data = {}
-        self.global_params = global_params
+        values = {}
         for index in PARAMETER_INDICES:
             # get the name of the parameter at index in the array
             param_name = PARAMETER_INDICES[index]
-            # convert to a float and store in the class's main data object
-            self.data[param_name] = float(raw_param_data[index])
+            # convert to a float and store it until the table is made
+            values[param_name] = float(raw_param_data[index])
         # need to add the local phi and mu values to the global value
-        self.data['phi'] += self.global_params.phi_bar
-        self.data['mu'] += self.global_params.mu_bar
+        values['phi'] += global_params.phi_bar
+        values['mu'] += global_params.mu_bar
+        self.table = None
+        self.row = None
+        self.values = values
+        self.global_params = global_params
+
+    """ Alternative constructor which takes a dict of parameter values that
+        are already final, i.e. phi and mu already include phi_bar and
+        mu_bar, so nothing is parsed or added."""
+    @classmethod
+    def from_values(cls, values, global_params : GlobalParams):
+        params = cls.__new__(cls)
+        params.table = None
+        params.row = None
+        params.values = {name : float(values[name])
+                         for name in PARAMETER_INDICES.values()}
+        params.global_params = global_params
+        return params
+
+    """ Alternative constructor which makes a view of an existing row of a
+        ParamTable, without copying anything."""
+    @classmethod
+    def view(cls, table : ParamTable, row):
+        params = cls.__new__(cls)
+        params.table = table
+        params.row = row
+        params.values = None
+        params.global_params = table.global_params
+        return params
+
+    """ Dict with the value of every parameter. This is a copy, so changes
+        have to go through set."""
+    @property
+    def data(self):
+        if self.values is not None:
+            return dict(self.values)
+        values = self.table.data[self.row]
+        return {name : float(values[name])
+                for name in PARAMETER_INDICES.values()}
 
     """ Method takes in a string (the name of a parameter) and returns the 
         value associated with that parameter for this sector.""" 
     def get(self, param_name):
-        return self.data[param_name]
+        if self.values is not None:
+            return self.values[param_name]
+        return float(self.table.data[param_name][self.row])
     
     """ Takes in a string and sets the value of that parementer to the
         value in the argument"""
     def set(self, param_name, value):
-        self.data[param_name] = value
+        if self.values is not None:
+            self.values[param_name] = value
+        else:
+            self.table.set_value(self.row, param_name, value)
 
     """ Prints out all sector parameters. Used for testing purposes."""
     def print_params(self):
-        for key in self.data.keys():
-            print(f"{key}: {self.data[key]}")
+        data = self.data
+        for key in data.keys():
+            print(f"{key}: {data[key]}")
         print('\n')
+
+
+def param_matrix(params_list, param_names):
+    """
+    Stacks the named parameters of a list of SectorParams into a matrix with
+    one row per SectorParams and one column per name. When they are all views
+    of the same table, as they are in an Economy, the values are read straight
+    from the table's columns.
+    """
+    tables = {id(params.table) for params in params_list}
+    if len(tables) == 1 and params_list[0].table is not None:
+        table = params_list[0].table
+        rows = np.fromiter((params.row for params in params_list),
+                           dtype=np.int64, count=len(params_list))
+        return np.column_stack([table.data[name][rows]
+                                for name in param_names])
+    matrix = np.array([[params.get(name) for name in param_names]
+                       for params in params_list], dtype=float)
+    return matrix.reshape(len(params_list), len(param_names))
+
+
+def sector_arrays(raw_columns, global_params : GlobalParams):
+    """
+    Array version of SectorParams.__init__ for many sectors at once. Takes a
+    dict of raw parameter arrays keyed by the names in PARAMETER_INDICES (with
+    local phi and mu, as in the CSV rows) and returns a dict of float arrays
+    with phi_bar and mu_bar added to phi and mu.
+    """
+    columns = {}
+    for name in PARAMETER_INDICES.values():
+        columns[name] = np.array(raw_columns[name], dtype=float)
+    columns['phi'] += global_params.phi_bar
+    columns['mu'] += global_params.mu_bar
+    return columns
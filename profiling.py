@@ -0,0 +1,108 @@
+"""
+Opt-in timing of the phases of a run, to see where the time actually goes:
+updating the sectors (and within that, the wage and price resets), applying
+shocks, and working out the price index and inflation series. Profiling
+works by replacing methods on the objects being profiled with timed
+wrappers, as instance attributes, so when it's off the code runs exactly as
+it would without this module and costs nothing.
+
+Times are wall time and inclusive, so e.g. the sector update time includes
+the wage and price resets inside it. A phase that calls itself (like the
+inflation series calling the price index) is only timed and counted once,
+at the outermost call.
+"""
+import time
+
+PHASES = ['sector_update', 'wage_reset', 'price_reset', 'shocks', 'index']
+
+""" Methods timed on an Economy, and the phase each one belongs to."""
+ECONOMY_PHASES = {
+    'update_sectors' : 'sector_update',
+    'apply_shocks' : 'shocks',
+    'latest_raw_index_value' : 'index',
+    'get_raw_index_series' : 'index',
+    'calculate_price_index' : 'index',
+    'period_to_period_inflation_series' : 'index',
+    'lagged_inflation_series' : 'index',
+    'get_yoy_moving_average' : 'index',
+    'get_ptp_moving_average' : 'index',
+    'get_inflation_ranges' : 'index'
+}
+
+""" Methods timed on an ArrayEngine or a Sector. The engine only has them
+    separately when it runs on update calendars; otherwise its wage and
+    price resets are done together and only count as the sector update."""
+RESET_PHASES = {
+    'reset_wages' : 'wage_reset',
+    'reset_prices' : 'price_reset'
+}
+
+
+class PhaseStats:
+    """
+    Cumulative wall time and number of calls for each phase in PHASES.
+    """
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.calls = dict.fromkeys(PHASES, 0)
+        # phases currently being timed, so nested calls aren't counted twice
+        self.active = set()
+
+    def reset(self):
+        """Sets every time and count back to zero."""
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.calls = dict.fromkeys(PHASES, 0)
+
+    def add(self, phase, seconds):
+        self.seconds[phase] += seconds
+        self.calls[phase] += 1
+
+    def get_stats(self):
+        """
+        Returns a dict with, for each phase, the total seconds, the number
+        of calls and the average seconds per call.
+        """
+        return {phase : {
+                    'seconds' : self.seconds[phase],
+                    'calls' : self.calls[phase],
+                    'per_call' : (self.seconds[phase] / self.calls[phase]
+                                  if self.calls[phase] else 0.0)}
+                for phase in PHASES}
+
+    def print_stats(self):
+        for phase, stats in self.get_stats().items():
+            print(f"{phase:<15}{stats['seconds']:>12.6f} s"
+                  f"{stats['calls']:>10} calls"
+                  f"{stats['per_call'] * 1e6:>12.2f} us/call")
+
+
+def timed(stats, phase, function):
+    """Wraps function so that its calls are timed as phase in stats."""
+    def wrapper(*args, **kwargs):
+        if phase in stats.active:
+            return function(*args, **kwargs)
+        stats.active.add(phase)
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            stats.add(phase, time.perf_counter() - start)
+            stats.active.discard(phase)
+    return wrapper
+
+
+def instrument(target, stats, methods):
+    """
+    Replaces the methods of target named in methods (a dict of method name
+    to phase) with timed versions. Doing it again does nothing.
+    """
+    for name, phase in methods.items():
+        if name not in vars(target):
+            setattr(target, name, timed(stats, phase, getattr(target, name)))
+
+
+def uninstrument(target, methods):
+    """Puts back the original methods replaced by instrument."""
+    for name in methods:
+        vars(target).pop(name, None)
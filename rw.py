@@ -1,11 +1,16 @@
 import csv
-from params import SectorParams
+from itertools import islice
+import numpy as np
+from params import SectorParams, GlobalParams, PARAMETER_INDICES
 
 """
 This module includes the methods that are used to interact with CSVs. Just
 read is implemented at present.
 """
 
+CHUNK_SIZE = 50000 # rows parsed at a time by read_param_columns
+WEIGHT_TOLERANCE = 1e-6 # how far the index weights may sum from 1
+
 def get_params(filename):
     """
     Reads in parameters from a CSV file and returns a list of lists of
@@ -22,18 +27,74 @@ def get_params(filename):
             all_params.append(row)
     return all_params
 
-def test_param_reading(filename):
+def read_param_columns(filename, chunk_size = CHUNK_SIZE):
+    """
+    Reads a parameter CSV (same layout as for get_params) straight into a
+    dict of float arrays, one per name in PARAMETER_INDICES. The file is
+    parsed chunk_size rows at a time, so there is never more than one chunk
+    of rows held as strings.
+
+    filename: the name of the CSV file to be read in.
+    chunk_size: number of rows to parse at a time
+    """
+    chunks = []
+    with open(filename, 'r', newline = '') as csv_file:
+        reader = csv.reader(csv_file)
+        next(reader) # skip header row
+        while True:
+            rows = list(islice(reader, chunk_size))
+            if not rows:
+                break
+            chunk = np.array(rows, dtype=float)
+            chunks.append(chunk[:, :len(PARAMETER_INDICES)])
+    if chunks:
+        data = np.concatenate(chunks)
+    else:
+        data = np.zeros((0, len(PARAMETER_INDICES)))
+    return {name : data[:, index].copy()
+            for index, name in PARAMETER_INDICES.items()}
+
+def validate_param_columns(columns):
+    """
+    Checks a dict of parameter arrays, as returned by read_param_columns, in
+    one vectorized pass: frequencies have to be at least 1, lags between 1
+    and their frequency, and the index weights have to sum to 1. Raises a
+    ValueError listing the first few bad rows (numbered from 0, not counting
+    the header) if not.
+    """
+    problems = []
+    for kind in ['w', 'f']:
+        freq = columns['freq_' + kind]
+        lag = columns['lag_' + kind]
+        checks = [(freq < 1, f'freq_{kind} < 1'),
+                  ((lag < 1) | (lag > freq),
+                   f'lag_{kind} not in [1, freq_{kind}]')]
+        for bad, description in checks:
+            rows = np.flatnonzero(bad)
+            if len(rows):
+                problems.append(f'{description} in {len(rows)} rows, '
+                                f'e.g. rows {rows[:5].tolist()}')
+    total_weight = float(np.sum(columns['index_weight']))
+    if len(columns['index_weight']) and \
+            abs(total_weight - 1) > WEIGHT_TOLERANCE:
+        problems.append(f'index weights sum to {total_weight}, not 1')
+    if problems:
+        raise ValueError('invalid sector parameters: ' + '; '.join(problems))
+
+def test_param_reading(filename, global_params : GlobalParams):
     """
     Test function for parameter reading. Turns a row of data directly into a
     SectorParams object and prints out the data for that object.
 
     filename: CSV file to be read in.
+    global_params: the global parameters, which SectorParams needs to add
+        phi_bar and mu_bar to each sector's own phi and mu
     """
     with open(filename, 'r', newline = '') as csv_file:
         reader = csv.reader(csv_file)
         next(reader)
         for row in reader:
-            these_params = SectorParams(row)
+            these_params = SectorParams(row, global_params)
             print(these_params.data)
             print('\n')
     
\ No newline at end of file
@@ -0,0 +1,74 @@
+"""
+Precomputed update calendar. A sector with frequency f and lag l resets in
+every period t with (t - l) % f == 0, i.e. whenever t % f == l % f. Grouping
+sectors into (frequency, lag) cohorts up front means that each period only the
+cohorts that are due have to be looked at, instead of testing every sector.
+"""
+import numpy as np
+
+
+class UpdateCalendar:
+    """
+    Groups sectors into cohorts by update frequency and lag, and returns the
+    sectors that reset in any given period. Built for one kind of update
+    (wages or prices) from arrays of frequencies and lags, where entry i
+    belongs to sector i.
+    """
+
+    def __init__(self, freq, lag):
+        self.n_sectors = len(freq)
+        # cohorts[f][r] holds the indices of the sectors with frequency f
+        # which reset whenever period % f == r
+        self.cohorts = {}
+        freq = np.asarray(freq).astype(np.int64)
+        lag = np.asarray(lag).astype(np.int64)
+        residues = lag % freq
+        for f in np.unique(freq):
+            in_freq = freq == f
+            by_residue = {}
+            for r in np.unique(residues[in_freq]):
+                by_residue[int(r)] = np.flatnonzero(in_freq & (residues == r))
+            self.cohorts[int(f)] = by_residue
+
+    @staticmethod
+    def supports(freq, lag):
+        """
+        The calendar only makes sense for whole-number frequencies and lags,
+        which is what the generators produce. Anything else (e.g. from a hand
+        written CSV) has to fall back on testing every sector.
+        """
+        freq = np.asarray(freq)
+        lag = np.asarray(lag)
+        return (np.all(freq == np.round(freq)) and np.all(freq >= 1)
+                and np.all(lag == np.round(lag)))
+
+    def due(self, period):
+        """
+        Returns an array with the indices of the sectors that reset in
+        period.
+
+        period: the period being calculated
+        """
+        due_cohorts = []
+        for f, by_residue in self.cohorts.items():
+            cohort = by_residue.get(period % f)
+            if cohort is not None:
+                due_cohorts.append(cohort)
+        if not due_cohorts:
+            return np.zeros(0, dtype=np.int64)
+        if len(due_cohorts) == 1:
+            return due_cohorts[0]
+        return np.concatenate(due_cohorts)
+
+    def get_n_cohorts(self):
+        """Number of distinct (frequency, lag) cohorts."""
+        return sum(len(by_residue) for by_residue in self.cohorts.values())
+
+    def mean_frequency(self):
+        """
+        Average update frequency over sectors. Roughly the factor by which the
+        calendar cuts the work done each period.
+        """
+        total = sum(f * sum(len(c) for c in by_residue.values())
+                    for f, by_residue in self.cohorts.items())
+        return total / self.n_sectors if self.n_sectors else 0
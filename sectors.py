@@ -1,60 +1,204 @@
+from collections.abc import MutableSequence
+import numpy as np
 from params import SectorParams
 
+class SectorHistory(MutableSequence):
+    """ One of a sector's time series (wages, prices or wage shares) as a
+        list-like object. While the sector belongs to an Economy whose array
+        engine is running, the values are read straight from the engine, so
+        the history is always up to date without anything being copied back.
+        Changing it hands control back to the sectors first (see
+        Economy.hand_to_sectors), so the change isn't lost, and otherwise it
+        is just the sector's own list."""
+
+    __slots__ = ('sector', 'name')
+
+    def __init__(self, sector, name):
+        self.sector = sector
+        self.name = name
+
+    """ The sector's own list of values. Only up to date when the engine
+        isn't running, unless take_over is set, in which case the sector is
+        handed control first."""
+    def values(self, take_over=False):
+        if take_over:
+            self.sector.take_over()
+        return getattr(self.sector, '_' + self.name)
+
+    def __len__(self):
+        engine = self.sector.get_engine()
+        if engine is None:
+            return len(self.values())
+        return engine.get_n_periods()
+
+    def __getitem__(self, index):
+        engine = self.sector.get_engine()
+        if engine is None:
+            return self.values()[index]
+        if isinstance(index, slice):
+            return engine.sector_history(self.name,
+                                         self.sector.index)[index].tolist()
+        return engine.sector_value(self.name, self.sector.index, index)
+
+    def __iter__(self):
+        engine = self.sector.get_engine()
+        if engine is None:
+            return iter(self.values())
+        return iter(engine.sector_history(self.name,
+                                          self.sector.index).tolist())
+
+    def __setitem__(self, index, value):
+        self.values(take_over=True)[index] = value
+
+    def __delitem__(self, index):
+        del self.values(take_over=True)[index]
+
+    def insert(self, index, value):
+        self.values(take_over=True).insert(index, value)
+
+    def __array__(self, dtype=None, copy=None):
+        engine = self.sector.get_engine()
+        if engine is None:
+            return np.array(self.values(), dtype=dtype)
+        return engine.sector_history(self.name,
+                                     self.sector.index).astype(dtype)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, SectorHistory)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
+
+
 class Sector:
     """ Implements the price and wage behavior of a single 
         sector of the economy. Includes storage of time series data, the 
         functionality to advance by a period, and return time series.
-        Initialized with a params object."""
+        Initialized with a params object.
+
+        The time series are SectorHistory objects around the sector's own
+        lists, so that a sector in an Economy always shows its current
+        history, even while the array engine is advancing it."""
     def __init__(self, params : SectorParams):
         self.params = params
-        self.wages = [params.get('w0')]
-        self.prices = [params.get('p0')]
-        self.wage_shares = [self.calc_wage_share()]
+        # the Economy this is a sector of and its position there, if any
+        self.economy = None
+        self.index = None
+        self._wages = [params.get('w0')]
+        self._prices = [params.get('p0')]
+        self._wage_shares = [self.calc_wage_share()]
+
+    @property
+    def wages(self):
+        return SectorHistory(self, 'wages')
+
+    @wages.setter
+    def wages(self, values):
+        self.take_over()
+        self._wages = values
+
+    @property
+    def prices(self):
+        return SectorHistory(self, 'prices')
+
+    @prices.setter
+    def prices(self, values):
+        self.take_over()
+        self._prices = values
+
+    @property
+    def wage_shares(self):
+        return SectorHistory(self, 'wage_shares')
+
+    @wage_shares.setter
+    def wage_shares(self, values):
+        self.take_over()
+        self._wage_shares = values
+
+    """ Marks this as the index'th sector of economy, so that its histories
+        are read from the economy's array engine while that is running."""
+    def attach(self, economy, index):
+        self.economy = economy
+        self.index = index
+
+    """ The economy's array engine, if this sector belongs to one and it is
+        running, and None otherwise."""
+    def get_engine(self):
+        if self.economy is None:
+            return None
+        return self.economy.engine
+
+    """ Makes the sector's own lists the real history again before they are
+        changed, taking them back from the economy's array engine."""
+    def take_over(self):
+        if self.economy is not None:
+            self.economy.hand_to_sectors()
+
+    """ Replaces the sector's own lists without handing anything back, for
+        the engine writing its histories back."""
+    def set_histories(self, wages, prices, wage_shares):
+        self._wages = wages
+        self._prices = prices
+        self._wage_shares = wage_shares
 
     
     """ Updates wages and prices for a single period, according to
         difference equation specifying the dynamics of the model."""
     def update(self):
+        if self.get_engine() is not None:
+            self.take_over()
         # get most recent wages, prices, wage share
-        last_wages = self.get_last_wages()
-        last_prices = self.get_last_prices()
-        last_wage_share = self.get_last_wage_share()
-        # stores global parameters
-        freq_max = self.params.global_params.frequency_max
-        v_f = self.params.global_params.v_f
-        v_w = self.params.global_params.v_w
+        last_wages = self._wages[-1]
+        last_prices = self._prices[-1]
+        last_wage_share = self._wage_shares[-1]
         # defaults to last value, only changes based on logic
         new_wages = last_wages
         new_prices = last_prices
         # first, check whether wages update
         if(self.wages_update()):
-            # get the fraction by which to adjust parameter
-            freq_fraction = self.params.get('freq_w') / freq_max
-            # get the departure from aspirational value
-            diff_from_desired = v_w - last_wage_share
-            mu = self.params.get('mu')
-            # calculate wage percent change based on formulaa
-            wage_percent_change = freq_fraction * mu * diff_from_desired
-            new_wages = last_wages * (1 + wage_percent_change)
-        self.wages.append(new_wages)
+            new_wages = self.reset_wages(last_wages, last_wage_share)
+        self._wages.append(new_wages)
         # next, check whether prices update
         if(self.prices_update()):
-            # get the fraction by which to adjust parameter
-            freq_fraction = self.params.get('freq_f') / freq_max
-            # get departure from aspiration value
-            diff_from_desired = last_wage_share - v_f
-            phi = self.params.get('phi')
-            prices_percent_change = freq_fraction * diff_from_desired * phi
-            new_prices = last_prices * (1 + prices_percent_change)
-        self.prices.append(new_prices)
+            new_prices = self.reset_prices(last_prices, last_wage_share)
+        self._prices.append(new_prices)
         # calculate new wage share and add to wage share series
-        self.wage_shares.append(self.calc_wage_share())
+        self._wage_shares.append(self.calc_wage_share())
+
+    """ New wages in a period where wages reset, given last period's wages
+        and wage share."""
+    def reset_wages(self, last_wages, last_wage_share):
+        freq_max = self.params.global_params.frequency_max
+        v_w = self.params.global_params.v_w
+        # get the fraction by which to adjust parameter
+        freq_fraction = self.params.get('freq_w') / freq_max
+        # get the departure from aspirational value
+        diff_from_desired = v_w - last_wage_share
+        mu = self.params.get('mu')
+        # calculate wage percent change based on formulaa
+        wage_percent_change = freq_fraction * mu * diff_from_desired
+        return last_wages * (1 + wage_percent_change)
+
+    """ New prices in a period where prices reset, given last period's prices
+        and wage share."""
+    def reset_prices(self, last_prices, last_wage_share):
+        freq_max = self.params.global_params.frequency_max
+        v_f = self.params.global_params.v_f
+        # get the fraction by which to adjust parameter
+        freq_fraction = self.params.get('freq_f') / freq_max
+        # get departure from aspiration value
+        diff_from_desired = last_wage_share - v_f
+        phi = self.params.get('phi')
+        prices_percent_change = freq_fraction * diff_from_desired * phi
+        return last_prices * (1 + prices_percent_change)
 
     """Checks whether wages update in the current period"""
     def wages_update(self):
         # gets the current period by finding the length of wages vector
         # since this includes a value at 0
-        current_period = len(self.wages)
+        current_period = len(self._wages)
         freq = self.params.get('freq_w')
         lag = self.params.get('lag_w')
         return (current_period - lag) % freq == 0 
@@ -62,7 +206,7 @@ class Sector:
     """Checks whether prices update in the current period."""
     def prices_update(self):
         # gets the current period by finding the length of the prices vector
-        current_period = len(self.prices)
+        current_period = len(self._prices)
         freq = self.params.get('freq_f')
         lag = self.params.get('lag_f')
         return (current_period - lag) % freq == 0
@@ -71,7 +215,7 @@ class Sector:
         period."""
     def calc_wage_share(self):
         a = self.params.get('a')
-        return (self.wages[-1] * a) / self.prices[-1]
+        return (self._wages[-1] * a) / self._prices[-1]
     
     """Time series of wages."""
     def get_wage_time_series(self):
@@ -137,8 +281,10 @@ class Sector:
         Assumes that the last period is greater than or equal to 1, as it calls
         the period before.
         """
-        previous_price = self.prices[-2]
-        self.prices[-1] += size * previous_price
+        if self.get_engine() is not None:
+            self.take_over()
+        previous_price = self._prices[-2]
+        self._prices[-1] += size * previous_price
 
     def shock_if_prices_update(self, size):
         """
@@ -146,12 +292,14 @@ class Sector:
         period. In general, called after regular price updating, so the period
         to check is actuall the length of the prices list - 1.
         """
-        last_period = len(self.prices) - 1
+        if self.get_engine() is not None:
+            self.take_over()
+        last_period = len(self._prices) - 1
         freq_f = self.params.get('freq_f')
         lag_f = self.params.get('lag_f')
-        previous_price = self.prices[-2]
+        previous_price = self._prices[-2]
         if (last_period - lag_f) % freq_f == 0:
-            self.prices[-1] += size * previous_price
+            self._prices[-1] += size * previous_price
 
 
 
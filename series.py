@@ -0,0 +1,96 @@
+"""
+Small containers for time series that are built up one period at a time as
+the economy advances.
+"""
+import numpy as np
+
+
+class GrowingArray:
+    """
+    A one-dimensional float array that can be appended to. Keeps spare
+    capacity and doubles it when full, so appending is O(1) on average and the
+    values so far can always be read as a NumPy array without copying.
+    """
+
+    def __init__(self, capacity=64):
+        self.data = np.empty(max(capacity, 1))
+        self.length = 0
+
+    def append(self, value):
+        """Adds a value to the end of the array."""
+        if self.length == len(self.data):
+            new_data = np.empty(2 * len(self.data))
+            new_data[:self.length] = self.data[:self.length]
+            self.data = new_data
+        self.data[self.length] = value
+        self.length += 1
+
+    def extend(self, values):
+        """Adds each of a sequence of values to the end of the array."""
+        for value in values:
+            self.append(value)
+
+    def set_last(self, value):
+        """Overwrites the most recent value."""
+        self.data[self.length - 1] = value
+
+    def view(self):
+        """
+        Returns the values so far as an array. This is a view of the internal
+        storage, so it should be copied if it has to outlive later appends.
+        """
+        return self.data[:self.length]
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        return self.view()[index]
+
+
+class SeriesCache:
+    """
+    Remembers series that are derived from the price index (inflation series,
+    moving averages), keyed by (series kind, lag, window), so asking for the
+    same series twice does not recalculate it. The owner has to call
+    invalidate whenever the underlying data changes. Counts hits and misses
+    so it is possible to see whether the cache is earning its keep.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, kind, calculate, lag=None, window=None):
+        """
+        Returns the cached series, calculating and storing it first if it is
+        not there. Arrays are stored read-only, since the same array is handed
+        to every caller; anyone who wants to change it has to copy it first.
+
+        kind: name of the series
+        calculate: function of no arguments which calculates the series
+        lag, window: the lag and moving average window, where relevant
+        """
+        key = (kind, lag, window)
+        if key in self.entries:
+            self.hits += 1
+        else:
+            self.misses += 1
+            value = calculate()
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False
+            self.entries[key] = value
+        return self.entries[key]
+
+    def invalidate(self):
+        """Forgets every stored series."""
+        self.entries.clear()
+
+    def get_stats(self):
+        """Returns a dict with the hit and miss counts and number of entries."""
+        return {
+            'hits' : self.hits,
+            'misses' : self.misses,
+            'entries' : len(self.entries)
+        }
@@ -1,6 +1,7 @@
 """
 Store default values for global parameters. Change these to affect the run.
 """
+import copy
 GLOBAL_DEFAULTS = {
     'v_w' : 0.7,
     'v_f' : 0.5,
@@ -88,13 +89,20 @@ class Settings:
     """
     
     def __init__(self):
-        self.global_defaults = GLOBAL_DEFAULTS
-        self.sector_defaults = SECTOR_DEFAULTS
-        self.is_default = IS_DEFAULT
-        self.rand_max = RAND_MAX
-        self.rand_min = RAND_MIN
-        self.constraints = OTHER_CONSTRAINTS
+        # each Settings object gets its own copies of the defaults, so that
+        # changing one doesn't change every other one made afterwards
+        self.global_defaults = dict(GLOBAL_DEFAULTS)
+        self.sector_defaults = dict(SECTOR_DEFAULTS)
+        self.is_default = dict(IS_DEFAULT)
+        self.rand_max = dict(RAND_MAX)
+        self.rand_min = dict(RAND_MIN)
+        self.constraints = dict(OTHER_CONSTRAINTS)
         self.agg_stoch = AGGREGATE_STOCHASTIC
+        self.local_stoch = LOCALLY_STOCHASTIC
+
+    def copy(self):
+        """A Settings object with the same values, to change on its own."""
+        return copy.deepcopy(self)
 
     def get_global_default(self, param_name):
         return self.global_defaults[param_name]
@@ -132,6 +140,13 @@ class Settings:
 
     def is_stochastic(self):
         return self.agg_stoch
+
+    def set_local_stoch(self, value):
+        """Set whether each sector gets its own idiosyncratic shock."""
+        self.local_stoch = value
+
+    def is_locally_stochastic(self):
+        return self.local_stoch
     
     def set_all_random(self):
         """
@@ -143,4 +158,18 @@ class Settings:
 
     def set_all_defaults(self):
         for key in self.is_default:
-            self.set_is_default(key, True)
\ No newline at end of file
+            self.set_is_default(key, True)
+
+
+def settings_record(settings : Settings):
+    """Everything in a Settings object, as a JSON-friendly dict."""
+    return {
+        'global_defaults' : dict(settings.global_defaults),
+        'sector_defaults' : dict(settings.sector_defaults),
+        'is_default' : dict(settings.is_default),
+        'rand_max' : dict(settings.rand_max),
+        'rand_min' : dict(settings.rand_min),
+        'constraints' : dict(settings.constraints),
+        'agg_stoch' : settings.is_stochastic(),
+        'local_stoch' : settings.is_locally_stochastic()
+    }
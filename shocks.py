@@ -0,0 +1,158 @@
+"""
+Random price shocks. The aggregate shock follows an AR(1) process,
+x_t = alpha * x_{t-1} + eta_t, and each sector can also get an idiosyncratic
+shock of its own following the same kind of process. Rather than drawing one
+normal per period, the innovations for many periods are drawn in one go and
+the path is worked out from them, all sectors at once. It is still worked
+out period by period, so the shocks come out exactly the same however the
+periods are split up between calls.
+"""
+import numpy as np
+
+# temporarily hard wiring constants here
+ALPHA = 0.4 # persistence of the shocks
+SIGMA_ETA = 0.01 # standard deviation of the aggregate innovations
+SIGMA_EPSILON = 0.01 # standard deviation of the idiosyncratic innovations
+# single shocks smaller than this (about 5.6e-17) are treated as having died
+# out. The change it would make to a price is negligible but not always
+# nothing: it is under half a unit in the last place of the price as long as
+# the price hasn't fallen since the period before, and can be a little over
+# otherwise, so dropping it can change the last bit of some prices.
+SHOCK_THRESHOLD = 2.0 ** -54
+
+SHOCK_BLOCK = 256 # most periods of shocks a ShockPath draws at once
+# most shocks (periods times entries) a ShockPath draws at once, unless a
+# single period has more
+SHOCK_DRAW_SIZE = 2 ** 20
+
+
+def block_periods(shape):
+    """
+    How many periods of shocks of the given shape are drawn at once: as
+    many as fit in SHOCK_DRAW_SIZE, between 1 and SHOCK_BLOCK.
+    """
+    size = int(np.prod(shape))
+    return int(min(max(SHOCK_DRAW_SIZE // max(size, 1), 1), SHOCK_BLOCK))
+
+
+def ar1_path(innovations, alpha, initial=0.0):
+    """
+    Works out x_t = alpha * x_{t-1} + innovations_t along the last axis.
+    Only the periods are looped over. Each value depends on nothing but the
+    one before and its own innovation, the same as updating once per period,
+    so where a path starts makes no difference to it.
+
+    innovations: array of innovations, one per period along the last axis
+    alpha: persistence of the process
+    initial: value of the process in the period before the first one
+        (a scalar or an array matching the other axes)
+    """
+    innovations = np.asarray(innovations, dtype=float)
+    path = np.empty(innovations.shape)
+    previous = np.asarray(initial, dtype=float)
+    for period in range(innovations.shape[-1]):
+        previous = alpha * previous + innovations[..., period]
+        path[..., period] = previous
+    return path
+
+
+class ShockPath:
+    """
+    An AR(1) shock process which hands out one period's shock at a time but
+    draws and calculates them in bulk. The shock can be a single number (the
+    aggregate shock) or an array of any shape, e.g. one entry per sector.
+
+    Draws come from rng (a numpy Generator) if one is given and from the
+    global np.random state otherwise, block periods at a time (by default
+    block_periods(shape)), whenever the last lot runs out. The block doesn't
+    depend on how many periods anyone asks for at once, so the draws, and
+    the order they're made in when other ShockPaths share the same random
+    state, come out the same however a run is split up.
+    """
+
+    def __init__(self, alpha=ALPHA, sigma=SIGMA_ETA, shape=(), rng=None,
+                 block=None):
+        self.alpha = alpha
+        self.sigma = sigma
+        self.shape = tuple(shape)
+        self.rng = rng
+        self.block = block_periods(self.shape) if block is None else block
+        self.last = np.zeros(self.shape) if self.shape else 0.0
+        self.innovations = None
+        self.path = None
+        self.position = 0
+
+    def draw_innovations(self, n_periods):
+        """
+        Draws the innovations for n_periods periods, with time along the
+        last axis.
+        """
+        size = (n_periods,) + self.shape
+        if self.rng is None:
+            draws = np.random.normal(0, self.sigma, size)
+        else:
+            draws = self.rng.normal(0, self.sigma, size)
+        return np.moveaxis(draws, 0, -1)
+
+    def get_state(self):
+        """
+        The part of the path that hasn't been handed out yet and the latest
+        value, as a dict of arrays, so that a checkpointed run carries on
+        with exactly the same shocks.
+        """
+        innovations = np.zeros(self.shape + (0,))
+        path = np.zeros(self.shape + (0,))
+        if self.path is not None:
+            innovations = self.innovations[..., self.position:]
+            path = self.path[..., self.position:]
+        return {
+            'last' : np.asarray(self.last),
+            'innovations' : innovations,
+            'path' : path
+        }
+
+    def set_state(self, state):
+        """Puts back a state returned by get_state."""
+        last = np.array(state['last'])
+        self.last = last if self.shape else float(last)
+        self.innovations = np.array(state['innovations'])
+        self.path = np.array(state['path'])
+        self.position = 0
+
+    def remaining(self):
+        """Number of periods drawn but not handed out yet."""
+        if self.path is None:
+            return 0
+        return self.path.shape[-1] - self.position
+
+    def recalculate(self):
+        """Works out the rest of the drawn path from the latest value."""
+        if self.remaining() > 0:
+            position = self.position
+            self.path[..., position:] = ar1_path(
+                self.innovations[..., position:], self.alpha, self.last)
+
+    def next(self, previous=None):
+        """
+        Returns the shock for the next period.
+
+        previous: the shock in the period before, if it may have been
+            changed from outside (e.g. a single shock added on top); the rest
+            of the path is recalculated from it if so
+        """
+        if previous is not None and previous != self.last:
+            self.last = previous
+            self.recalculate()
+        if self.remaining() == 0:
+            self.innovations = self.draw_innovations(self.block)
+            self.path = np.empty(self.innovations.shape)
+            self.position = 0
+            self.recalculate()
+        value = self.path[..., self.position]
+        self.position += 1
+        if self.shape:
+            value = value.copy()
+        else:
+            value = float(value)
+        self.last = value
+        return value
@@ -0,0 +1,199 @@
+"""
+A content-addressed disk cache for simulation results. Deterministic runs
+give the same output every time for the same inputs, so the inputs are
+hashed into a key and the output is stored under it; the next time the same
+run comes up it is read back instead of simulated. Entries are .npz files in
+a single directory, and the least recently used ones are deleted once the
+directory gets bigger than a size limit.
+
+Nothing is cached unless a cache is set, either on an Economy or as the
+default for everything with set_default_cache (or enable).
+"""
+import hashlib
+import os
+import tempfile
+import zipfile
+from functools import lru_cache
+import numpy as np
+import catalog
+
+DEFAULT_DIRECTORY = '.simcache'
+DEFAULT_MAX_BYTES = 512 * 2 ** 20 # 512 MB
+
+default_cache = None
+
+
+def update_digest(digest, value):
+    """
+    Feeds a value into a hash in a canonical way: dicts in key order, floats
+    by their exact repr, arrays by dtype, shape and bytes, each tagged with
+    its type so that e.g. 1 and 1.0 and '1' all hash differently.
+    """
+    if isinstance(value, dict):
+        digest.update(b'd')
+        for key in sorted(value):
+            update_digest(digest, key)
+            update_digest(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f'l{len(value)}'.encode())
+        for item in value:
+            update_digest(digest, item)
+    elif isinstance(value, np.ndarray):
+        array = np.ascontiguousarray(value)
+        digest.update(f'a{array.dtype.str}{array.shape}'.encode())
+        digest.update(array.tobytes())
+    elif isinstance(value, (float, np.floating)):
+        digest.update(f'f{float(value)!r}'.encode())
+    else:
+        digest.update(f'{type(value).__name__}:{value!r}'.encode())
+    digest.update(b';')
+
+
+def canonical_key(*parts):
+    """sha256 hex digest of any mix of dicts, lists, arrays and scalars."""
+    digest = hashlib.sha256()
+    update_digest(digest, parts)
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def current_code_version():
+    """catalog.code_version, worked out once per process."""
+    return catalog.code_version()
+
+
+class ResultCache:
+    """
+    The cache directory. Keys are the hashes from canonical_key and values
+    are dicts of arrays. Reading an entry marks it as recently used (by its
+    modification time), and writing one evicts the least recently used
+    entries until the directory is under max_bytes again. Counts hits,
+    misses and evictions.
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY,
+                 max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def get(self, key):
+        """Returns the dict of arrays stored under key, or None."""
+        path = self.path(key)
+        try:
+            with np.load(path) as entry:
+                arrays = {name : entry[name] for name in entry.files}
+        except (OSError, ValueError, zipfile.BadZipFile):
+            # missing, or half written by a run that was killed
+            self.misses += 1
+            return None
+        os.utime(path)
+        self.hits += 1
+        return arrays
+
+    def put(self, key, arrays):
+        """Stores a dict of arrays under key."""
+        # written to a temporary file first, so a reader never sees half an
+        # entry
+        handle, temporary = tempfile.mkstemp(suffix='.npz',
+                                             dir=self.directory)
+        with os.fdopen(handle, 'wb') as file:
+            np.savez(file, **arrays)
+        os.replace(temporary, self.path(key))
+        self.evict()
+
+    def entries(self):
+        """List of (last used, size, path) for every entry."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        """Deletes least recently used entries until under max_bytes."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        """Deletes every entry."""
+        for _, _, path in self.entries():
+            os.remove(path)
+
+    def get_stats(self):
+        """
+        Returns a dict with the hit, miss and eviction counts, and the number
+        of entries and bytes on disk.
+        """
+        entries = self.entries()
+        return {
+            'hits' : self.hits,
+            'misses' : self.misses,
+            'evictions' : self.evictions,
+            'entries' : len(entries),
+            'bytes' : sum(size for _, size, _ in entries)
+        }
+
+    def print_stats(self):
+        for name, value in self.get_stats().items():
+            print(f"{name}: {value}")
+
+
+def set_default_cache(cache):
+    """Sets the cache used by every Economy without one of its own."""
+    global default_cache
+    default_cache = cache
+
+
+def get_default_cache():
+    return default_cache
+
+
+def enable(directory=DEFAULT_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES):
+    """Makes a ResultCache the default and returns it."""
+    cache = ResultCache(directory, max_bytes)
+    set_default_cache(cache)
+    return cache
+
+
+def cached_call(name, compute, seed=None, **inputs):
+    """
+    Returns compute(), unless the default cache already has the result for
+    the same name, inputs, seed and code version. Only used with a seed,
+    since otherwise the result is random. The result has to be a number or
+    (nested) list of numbers; from the cache it comes back as one.
+
+    name: name of whatever is being computed
+    compute: function of no arguments which does the work
+    inputs: everything else the result depends on
+    """
+    cache = default_cache
+    if cache is None or seed is None:
+        return compute()
+    key = canonical_key('call', name, current_code_version(), seed, inputs)
+    entry = cache.get(key)
+    if entry is not None:
+        return entry['result'].tolist()
+    result = compute()
+    cache.put(key, {'result' : np.asarray(result)})
+    return result
@@ -0,0 +1,339 @@
+"""
+Sweeps that can be split across machines with nothing shared between them
+but files. A sweep is described declaratively in a JSON file: the fixed
+settings, a grid of values to go over, and how many replicates of how big
+an economy to run at each point for how long. Every point gets its own seed
+spawned from the sweep's seed, so it comes out the same whichever shard
+runs it. Each shard writes a self-describing .npz file, and merge puts the
+shard files back together into exactly the arrays a single run of the
+whole sweep gives. A lost shard can just be run again on its own.
+
+    python sweep.py run lags.json --shard 3/8 --output-dir shards
+    python sweep.py merge lags.json --input-dir shards -o lags.npz
+    python sweep.py points lags.json
+
+A description looks like this (everything but grid/points is optional):
+
+    {
+        "name" : "lag_constraints",
+        "n_sectors" : 50, "n_periods" : 100, "replicates" : 100,
+        "seed" : 1,
+        "statistics" : ["yoy_inflation.mean"],
+        "globals" : {"mu_bar" : 0.5},
+        "sector_defaults" : {"w0" : 0.6},
+        "flags" : {"all_random" : false},
+        "grid" : {"lags_match" : [true, false]},
+        "points" : [{"v_w" : 0.605, "v_f" : 0.595},
+                    {"v_w" : 0.61, "v_f" : 0.59}]
+    }
+
+The sweep goes over every combination of the grid values, and for each of
+them every entry of points (for parameters that move together), in that
+order. Names in grid and points can be global parameters, sector defaults
+or flags (see FLAGS).
+"""
+import argparse
+import copy
+import itertools
+import json
+import os
+import sys
+import time
+import numpy as np
+import catalog
+import checkpoint
+import online
+import simcache
+from settings import Settings
+from montecarlo import BatchRunner
+
+DEFAULTS = {
+    'name' : 'sweep',
+    'n_sectors' : 50,
+    'n_periods' : 100,
+    'replicates' : 100,
+    'seed' : 0,
+    'statistics' : ['yoy_inflation.mean'],
+    'globals' : {},
+    'sector_defaults' : {},
+    'flags' : {},
+    'grid' : {},
+    'points' : [{}]
+}
+
+""" Settings switches that can be set in flags or swept over, and the
+    Settings method each one calls with its value."""
+FLAGS = {
+    'lags_match' : 'set_lags_match',
+    'stochastic' : 'set_agg_stoch',
+    'locally_stochastic' : 'set_local_stoch',
+    'all_random' : None # set_all_random if true
+}
+
+
+def load_description(filename):
+    """Reads a sweep description, filling in the defaults and checking it."""
+    with open(filename) as file:
+        return complete_description(json.load(file))
+
+
+def complete_description(description):
+    """
+    Fills in the defaults for anything missing from a description and
+    checks that everything in it makes sense, raising a ValueError if not.
+    """
+    unknown = set(description) - set(DEFAULTS)
+    if unknown:
+        raise ValueError("unknown keys in sweep description: "
+                         f"{sorted(unknown)}")
+    completed = copy.deepcopy(DEFAULTS)
+    completed.update(copy.deepcopy(description))
+    if not completed['points']:
+        completed['points'] = [{}]
+    for name in completed['statistics']:
+        online.parse_statistic(name)
+    names = (set(completed['globals']) | set(completed['sector_defaults']) |
+             set(completed['flags']) | set(completed['grid']))
+    for point in completed['points']:
+        names |= set(point)
+    for name in names:
+        if (name not in FLAGS and name not in Settings().global_defaults and
+                name not in Settings().sector_defaults):
+            raise ValueError(f"'{name}' is not a flag, global parameter or "
+                             "sector default")
+    return completed
+
+
+def description_key(description):
+    """Hash identifying a sweep, so shards of different sweeps don't mix."""
+    return simcache.canonical_key('sweep', description)
+
+
+def sweep_points(description):
+    """
+    Every point of the sweep, in order, as a dict of the values that are
+    set there.
+    """
+    grid = description['grid']
+    names = list(grid)
+    points = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        for extra in description['points']:
+            point = dict(zip(names, values))
+            point.update(extra)
+            points.append(point)
+    return points
+
+
+def apply_value(settings : Settings, name, value):
+    if name == 'all_random':
+        if value:
+            settings.set_all_random()
+    elif name in FLAGS:
+        getattr(settings, FLAGS[name])(value)
+    elif name in settings.global_defaults:
+        settings.set_global_default(name, value)
+    else:
+        settings.set_sector_default(name, value)
+
+
+def point_settings(description, point):
+    """The Settings for one point: the fixed values, then the point's own."""
+    settings = Settings()
+    for name, value in description['flags'].items():
+        apply_value(settings, name, value)
+    for group in ['globals', 'sector_defaults']:
+        for name, value in description[group].items():
+            apply_value(settings, name, value)
+    for name, value in point.items():
+        apply_value(settings, name, value)
+    return settings
+
+
+def run_point(description, point, seed_sequence):
+    """
+    Runs the replicates of one point, returning a dict with an array of one
+    value per replicate for each statistic.
+    """
+    runner = BatchRunner(seed_sequence)
+    return runner.run_summary(point_settings(description, point),
+                              description['n_sectors'],
+                              description['n_periods'],
+                              description['replicates'],
+                              description['statistics'])
+
+
+def shard_indices(n_points, shard, n_shards):
+    """
+    The points that belong to a shard. They're dealt out in turn rather than
+    in blocks, so neighbouring points (which tend to cost about the same)
+    are spread across the shards.
+    """
+    return list(range(shard, n_points, n_shards))
+
+
+def parse_shard(text):
+    """Turns 'i/N' into (i, N), checking that 0 <= i < N."""
+    shard, separator, n_shards = text.partition('/')
+    try:
+        shard, n_shards = int(shard), int(n_shards)
+    except ValueError:
+        shard = n_shards = -1
+    if not separator or not 0 <= shard < n_shards:
+        raise ValueError(f"expected a shard like 0/4, got '{text}'")
+    return shard, n_shards
+
+
+def shard_filename(directory, description, shard, n_shards):
+    return os.path.join(directory, f"{description['name']}.shard-"
+                                   f"{shard}-of-{n_shards}.npz")
+
+
+def run_shard(description, shard=0, n_shards=1, verbose=False):
+    """
+    Runs the points of one shard and returns them as a dict of arrays,
+    along with everything needed to tell later what they are: the
+    description, its hash, the code version, which shard of how many, and
+    the index and values of each point.
+    """
+    points = sweep_points(description)
+    seeds = np.random.SeedSequence(description['seed']).spawn(len(points))
+    indices = shard_indices(len(points), shard, n_shards)
+    values = {name : [] for name in description['statistics']}
+    for count, index in enumerate(indices):
+        results = run_point(description, points[index], seeds[index])
+        for name in description['statistics']:
+            values[name].append(results[name])
+        if verbose:
+            print(f"point {index} ({count + 1} of {len(indices)} in shard "
+                  f"{shard}/{n_shards}) done", flush=True)
+    arrays = {
+        'description' : np.array(json.dumps(description, sort_keys=True)),
+        'description_key' : np.array(description_key(description)),
+        'code_version' : np.array(catalog.code_version()),
+        'created' : np.array(time.time()),
+        'shard' : np.array(shard),
+        'n_shards' : np.array(n_shards),
+        'point_indices' : np.array(indices, dtype=np.int64),
+        'points' : np.array(json.dumps([points[index] for index in indices]))
+    }
+    for name in description['statistics']:
+        arrays[f'values.{name}'] = np.array(values[name], dtype=float).reshape(
+            len(indices), description['replicates'])
+    return arrays
+
+
+def write_shard(directory, description, shard, n_shards, verbose=False):
+    """Runs a shard and writes it to its file, returning the file name."""
+    os.makedirs(directory, exist_ok=True)
+    filename = shard_filename(directory, description, shard, n_shards)
+    checkpoint.write_snapshot(
+        filename, run_shard(description, shard, n_shards, verbose))
+    return filename
+
+
+def find_shards(directory, description):
+    """
+    Reads every shard file of this sweep in directory. Returns a dict of
+    shard number : arrays and the number of shards, checking that they all
+    belong to the same sweep split the same way.
+    """
+    key = description_key(description)
+    prefix = f"{description['name']}.shard-"
+    shards = {}
+    n_shards = None
+    for name in sorted(os.listdir(directory)):
+        if not (name.startswith(prefix) and name.endswith('.npz')):
+            continue
+        arrays = checkpoint.read_snapshot(os.path.join(directory, name))
+        if str(arrays['description_key']) != key:
+            raise ValueError(f"{name} belongs to a different sweep")
+        if n_shards is None:
+            n_shards = int(arrays['n_shards'])
+        elif int(arrays['n_shards']) != n_shards:
+            raise ValueError(f"{name} is from a sweep split into "
+                             f"{int(arrays['n_shards'])} shards, not "
+                             f"{n_shards}")
+        shards[int(arrays['shard'])] = arrays
+    return shards, n_shards
+
+
+def merge(description, directory):
+    """
+    Puts the shard files in directory back together. Returns the same
+    arrays as merging a single shard that ran the whole sweep: for each
+    statistic the values (points x replicates) and their means, the value
+    of each swept parameter at every point, and the description. Raises a
+    ValueError naming the missing shards if any are, so they can be rerun.
+    """
+    shards, n_shards = find_shards(directory, description)
+    if n_shards is None:
+        raise ValueError(f"no shards of '{description['name']}' in "
+                         f"{directory}")
+    missing = sorted(set(range(n_shards)) - set(shards))
+    if missing:
+        raise ValueError("missing shards " + ', '.join(
+            f"{shard}/{n_shards}" for shard in missing) +
+            "; rerun them with --shard")
+    versions = {str(arrays['code_version']) for arrays in shards.values()}
+    if len(versions) > 1:
+        print(f"warning: shards come from different code versions "
+              f"{sorted(versions)}", file=sys.stderr)
+    points = sweep_points(description)
+    merged = {'description' : np.array(json.dumps(description,
+                                                  sort_keys=True)),
+              'code_version' : np.array(sorted(versions)[0])}
+    for name in description['statistics']:
+        values = np.empty((len(points), description['replicates']))
+        for arrays in shards.values():
+            values[arrays['point_indices']] = arrays[f'values.{name}']
+        merged[f'values.{name}'] = values
+        merged[f'mean.{name}'] = values.mean(axis=1)
+    names = sorted({name for point in points for name in point})
+    for name in names:
+        merged[f'param.{name}'] = np.array([point.get(name, np.nan)
+                                            for point in points], dtype=float)
+    return merged
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Runs sweeps in shards across machines and merges them.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='run one shard of a sweep')
+    run_parser.add_argument('description', help='JSON sweep description')
+    run_parser.add_argument('--shard', default='0/1',
+                            help='which shard to run, as i/N (default 0/1)')
+    run_parser.add_argument('--output-dir', default='shards')
+    merge_parser = commands.add_parser('merge', help='merge shard files')
+    merge_parser.add_argument('description')
+    merge_parser.add_argument('--input-dir', default='shards')
+    merge_parser.add_argument('-o', '--output', required=True,
+                              help='.npz file for the merged arrays')
+    points_parser = commands.add_parser('points',
+                                        help='list the points of a sweep')
+    points_parser.add_argument('description')
+    args = parser.parse_args(argv)
+
+    try:
+        description = load_description(args.description)
+        if args.command == 'run':
+            shard, n_shards = parse_shard(args.shard)
+            filename = write_shard(args.output_dir, description, shard,
+                                   n_shards, verbose=True)
+            print(f"wrote {filename}")
+        elif args.command == 'merge':
+            checkpoint.write_snapshot(args.output,
+                                      merge(description, args.input_dir))
+            print(f"wrote {args.output}")
+        else:
+            for index, point in enumerate(sweep_points(description)):
+                print(index, json.dumps(point))
+    except ValueError as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
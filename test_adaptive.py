@@ -0,0 +1,47 @@
+"""
+Checks the adaptive replicate stopping in adaptive.py. Run with python -m
+pytest.
+"""
+import numpy as np
+from settings import Settings
+from executor import TaskSpec, mean_yoy_inflation
+from adaptive import AdaptiveSweep, PointResult, summarize
+
+
+def blown_up(economy):
+    return float('nan')
+
+
+def constant(economy):
+    return 1.0
+
+
+def specs(*summaries):
+    return [TaskSpec(Settings(), 2, 20, summary) for summary in summaries]
+
+
+def test_non_finite_spread_runs_to_max_replicates():
+    for value in [float('nan'), float('inf')]:
+        result = PointResult(0.95)
+        result.values = [1.0, value, 2.0]
+        assert result.replicates_needed(0.01) == float('inf')
+    result = PointResult(0.95)
+    result.values = [0.0, 1e100] # finite, but too many replicates to count
+    assert result.replicates_needed(1e-100) == float('inf')
+    sweep = AdaptiveSweep(0.01, min_replicates=2, max_replicates=8,
+                          workers=1)
+    table = summarize(sweep.run(specs(blown_up, constant), seed=0))
+    assert table['n_replicates'].tolist() == [8, 2]
+    assert table['converged'].tolist() == [False, True]
+    assert np.isnan(table['mean'][0]) and table['mean'][1] == 1.0
+
+
+def test_budget_and_seed():
+    sweep = AdaptiveSweep(1e-9, min_replicates=3, max_replicates=20,
+                          budget=10, workers=1)
+    points = specs(mean_yoy_inflation, mean_yoy_inflation)
+    first = summarize(sweep.run(points, seed=1))
+    # the earlier point gets its batches first when the budget runs out
+    assert first['n_replicates'].tolist() == [6, 4]
+    second = summarize(sweep.run(points, seed=1))
+    assert first['mean'].tolist() == second['mean'].tolist()
@@ -0,0 +1,83 @@
+"""
+Checks the array inflation calculations in analytics.py against the plain
+loops they replaced. Run with python -m pytest.
+"""
+import numpy as np
+import pytest
+import analytics
+from settings import Settings
+from gen import Generator
+
+
+@pytest.fixture
+def price_index():
+    rng = np.random.default_rng(0)
+    return np.cumprod(1 + rng.normal(0.002, 0.01, 200))
+
+
+def loop_lagged(price_index, lag):
+    return [(price_index[period] - price_index[period - lag]) /
+            price_index[period - lag]
+            for period in range(lag, len(price_index))]
+
+
+def loop_moving_average(series, window):
+    return [sum(series[start:start + window]) / window
+            for start in range(len(series) - window + 1)]
+
+
+@pytest.mark.parametrize('lag', [1, 12, 199, 250])
+def test_lagged_inflation(price_index, lag):
+    np.testing.assert_allclose(analytics.lagged_inflation(price_index, lag),
+                               loop_lagged(price_index, lag), rtol=1e-12)
+
+
+@pytest.mark.parametrize('window', [1, 6, 200, 201])
+def test_moving_average(price_index, window):
+    series = analytics.period_to_period_inflation(price_index)
+    np.testing.assert_allclose(analytics.moving_average(series, window),
+                               loop_moving_average(series, window),
+                               rtol=1e-9, atol=1e-15)
+
+
+def test_rows_are_independent(price_index):
+    # a batch with one price index per row gives each row's own result
+    batch = np.stack([price_index, price_index[::-1], 2 * price_index])
+    for function, argument in [(analytics.lagged_inflation, 12),
+                               (analytics.moving_average, 6)]:
+        together = function(batch, argument)
+        for row, values in zip(batch, together):
+            np.testing.assert_allclose(values, function(row, argument),
+                                       rtol=1e-12)
+
+
+def test_annualize():
+    assert analytics.annualize(0.01) == pytest.approx(1.01 ** 12 - 1)
+    assert analytics.annualize(0.05, periods=12) == pytest.approx(0.05)
+    assert analytics.annualize(0.21, periods=24) == pytest.approx(0.1)
+
+
+def test_range_queries(price_index):
+    ranges = analytics.InflationRanges(price_index)
+    assert ranges.get_n_periods() == len(price_index)
+    inflation = loop_lagged(price_index, 1)
+    for start, end in [(0, 1), (0, 199), (17, 60), (120, 132)]:
+        total = price_index[end] / price_index[start] - 1
+        assert ranges.inflation_between(start, end) == pytest.approx(
+            total, rel=1e-12)
+        assert ranges.annualized_between(start, end) == pytest.approx(
+            (1 + total) ** (12 / (end - start)) - 1, rel=1e-9)
+        assert ranges.mean_period_inflation_between(start, end) == (
+            pytest.approx(np.mean(inflation[start:end]), rel=1e-9))
+
+
+def test_economy_series():
+    economy = Generator().generate(Settings(), 20)
+    economy.advance_n(100)
+    price_index = economy.calculate_price_index()
+    np.testing.assert_allclose(economy.year_over_year_inflation_series(),
+                               loop_lagged(price_index, 12), rtol=1e-12)
+    np.testing.assert_allclose(
+        economy.get_yoy_moving_average(6),
+        loop_moving_average(loop_lagged(price_index, 12), 6),
+        rtol=1e-9, atol=1e-15)
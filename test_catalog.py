@@ -0,0 +1,56 @@
+"""
+Checks the results catalog and the code version results are tied to. Run
+with python -m pytest.
+"""
+import os
+import shutil
+import numpy as np
+import catalog
+from settings import Settings
+from gen import Generator
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def copy_modules(directory, names):
+    for name in names:
+        shutil.copy(os.path.join(HERE, name + '.py'), directory)
+
+
+def test_code_version_follows_model_code(tmp_path):
+    copy_modules(tmp_path, catalog.MODEL_MODULES)
+    version = catalog.code_version(tmp_path)
+    assert version == catalog.code_version()
+    # an experiment's results go through the cache under this version, so
+    # changing one has to change it
+    with open(tmp_path / 'experiments.py', 'a') as source:
+        source.write('\n# changed\n')
+    assert catalog.code_version(tmp_path) != version
+
+
+def test_code_version_ignores_tooling(tmp_path):
+    copy_modules(tmp_path, catalog.MODEL_MODULES)
+    version = catalog.code_version(tmp_path)
+    (tmp_path / 'bench.py').write_text('# changed\n')
+    assert catalog.code_version(tmp_path) == version
+
+
+def test_find_and_load(tmp_path):
+    results = catalog.ResultsCatalog(str(tmp_path))
+    settings = Settings()
+    settings.set_lags_match(True)
+    economy = Generator().generate_bulk(settings, 5, rng=0)
+    economy.advance_n(20)
+    run_id = results.add_economy(economy, settings, seed=0, label='a')
+    settings.set_global_default('v_w', 0.9)
+    results.add_run(settings, 5, 20, {'x' : np.arange(3)})
+    assert [run.id for run in results.find(lags_match=True)] == [
+        run_id, run_id + 1]
+    assert [run.id for run in results.find(desire_offset=(0.3, None))] == [
+        run_id + 1]
+    run = results.get_run(run_id)
+    np.testing.assert_array_equal(run.get_array('price_index'),
+                                  economy.calculate_price_index())
+    assert run.code_version == catalog.code_version()
+    assert run.settings['constraints']['lags_match']
+    results.close()
@@ -0,0 +1,112 @@
+"""
+Checks that a run picked up again from a checkpoint carries on exactly where
+it stopped, the same as one that never stopped. Run with python -m pytest.
+"""
+import os
+import random as rd
+import numpy as np
+import pytest
+from settings import Settings
+from gen import Generator
+from economy import Economy
+
+N_SECTORS = 20
+N_PERIODS = 60
+
+
+def make_settings():
+    settings = Settings()
+    settings.set_all_random()
+    return settings
+
+
+def bulk(stochastic=False, locally_stochastic=False):
+    economy = Generator().generate_bulk(make_settings(), N_SECTORS, rng=3)
+    economy.set_stochastic(stochastic)
+    if locally_stochastic:
+        economy.set_locally_stochastic(True)
+    return economy
+
+
+def global_random():
+    # shocks drawn from np.random rather than an rng of the economy's own
+    rd.seed(4)
+    np.random.seed(4)
+    economy = Generator().generate(make_settings(), N_SECTORS)
+    economy.set_stochastic(True)
+    return economy
+
+
+def unvectorized():
+    economy = bulk(stochastic=True)
+    economy.set_vectorized(False)
+    return economy
+
+
+def single_shock():
+    economy = bulk()
+    economy.single_shocks = True
+    economy.advance_n(5)
+    economy.do_single_shock(0.05)
+    return economy
+
+
+def assert_same(economy, expected):
+    assert economy.periods == expected.periods
+    assert economy.shocks == expected.shocks
+    np.testing.assert_array_equal(economy.calculate_price_index(),
+                                  expected.calculate_price_index())
+    for a, b in zip(economy.sectors, expected.sectors):
+        for name in ['wages', 'prices', 'wage_shares']:
+            assert list(getattr(a, name)) == list(getattr(b, name))
+
+
+@pytest.mark.parametrize('make', [
+    bulk, lambda: bulk(stochastic=True),
+    lambda: bulk(stochastic=True, locally_stochastic=True),
+    global_random, unvectorized, single_shock,
+], ids=['deterministic', 'stochastic', 'locally_stochastic', 'global_random',
+        'unvectorized', 'single_shock'])
+def test_resumed_same_as_carrying_on(tmp_path, make):
+    path = str(tmp_path / 'run.npz')
+    # the shocks don't depend on how a run is split, so this is also the
+    # same as going straight through
+    straight = make()
+    straight.advance_n(N_PERIODS)
+    run = make()
+    run.advance_n(40, checkpoint_every=15, checkpoint_path=path)
+    run.advance_n(N_PERIODS - 40)
+    # picked up from the last checkpoint, 30 periods in
+    economy = Economy.load_checkpoint(path)
+    assert economy.periods == run.periods - (N_PERIODS - 30)
+    economy.advance_n(N_PERIODS - 30)
+    assert_same(economy, run)
+    assert_same(economy, straight)
+
+
+def test_checkpoint_without_history(tmp_path):
+    path = str(tmp_path / 'run.npz')
+    run = bulk(stochastic=True)
+    run.advance_n(30)
+    run.save_checkpoint(path, history=False)
+    records = list(run.iter_periods(N_PERIODS))
+    economy = Economy.load_checkpoint(path)
+    assert list(economy.iter_periods(N_PERIODS)) == records
+    with pytest.raises(RuntimeError):
+        economy.calculate_price_index()
+
+
+def test_checkpoint_without_history_same_size(tmp_path):
+    economy = bulk()
+    sizes = []
+    for n in [30, 300]:
+        economy.advance_n(n)
+        path = str(tmp_path / f'{n}.npz')
+        economy.save_checkpoint(path, history=False)
+        sizes.append(os.path.getsize(path))
+    assert sizes[0] == sizes[1]
+
+
+def test_checkpoint_every_needs_path():
+    with pytest.raises(ValueError):
+        bulk().advance_n(10, checkpoint_every=5)
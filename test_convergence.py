@@ -0,0 +1,115 @@
+"""
+Checks convergence mode in Economy.advance_n: it finds fixed points and
+cycles, switches over only once every sector has settled, and the periods it
+extrapolates match simulating them. Run with python -m pytest.
+"""
+import math
+import random as rd
+import numpy as np
+import pytest
+import convergence
+from settings import Settings
+from gen import Generator
+from economy import Economy
+from params import GlobalParams
+
+
+def generated(n_sectors):
+    rd.seed(0)
+    np.random.seed(0)
+    return Generator().generate(Settings(), n_sectors)
+
+
+def handmade(frequencies):
+    economy = Economy(GlobalParams(0.7, 0.5, 0.5, 0.5, 12))
+    for freq_w, freq_f in frequencies:
+        economy.add_sector_from_data([0.6, 1, 1, 0.1, 0.1, freq_w, freq_f,
+                                      0, 0, 1 / len(frequencies)])
+    return economy
+
+
+def assert_same_run(make, n, rtol, **kwargs):
+    extrapolated = make()
+    report = extrapolated.advance_n(n, converge=True, **kwargs)
+    simulated = make()
+    simulated.advance_n(n)
+    assert report.converged
+    assert report.periods_simulated + report.periods_extrapolated == n
+    assert extrapolated.periods == simulated.periods
+    np.testing.assert_allclose(extrapolated.calculate_price_index(),
+                               simulated.calculate_price_index(), rtol=rtol)
+    for a, b in zip(extrapolated.sectors, simulated.sectors):
+        for name in ['wages', 'prices']:
+            np.testing.assert_allclose(getattr(a, name), getattr(b, name),
+                                       rtol=rtol)
+        np.testing.assert_allclose(a.wage_shares, b.wage_shares, atol=rtol)
+    return report
+
+
+def test_fixed_point():
+    report = assert_same_run(lambda: handmade([(1, 1)]), 400, 1e-9)
+    assert report.cycle_length == 1
+    assert report.periods_extrapolated > 0
+    # at a fixed point the wage share sits at its equilibrium
+    assert report.max_equilibrium_gap < 1e-9
+
+
+def test_cycle_of_sectors_with_different_frequencies():
+    frequencies = [(1, 1), (2, 3), (4, 2)]
+    report = assert_same_run(lambda: handmade(frequencies), 600, 1e-9)
+    assert report.cycle_length == math.lcm(*[math.lcm(w, f)
+                                             for w, f in frequencies])
+    assert report.periods_extrapolated > 0
+
+
+@pytest.mark.parametrize('n_sectors, n', [(1, 600), (5, 3000)])
+def test_generated_economy(n_sectors, n):
+    report = assert_same_run(lambda: generated(n_sectors), n, 1e-9)
+    assert report.switch_period == n - report.periods_extrapolated
+
+
+def test_looser_tolerance_switches_earlier():
+    strict = generated(1).advance_n(600, converge=True)
+    loose = generated(1).advance_n(600, converge=True, tolerance=1e-9)
+    assert loose.converged and strict.converged
+    assert loose.switch_period < strict.switch_period
+
+
+def test_too_short_to_settle():
+    economy = generated(1)
+    report = economy.advance_n(50, converge=True)
+    assert not report.converged
+    assert report.periods_simulated == 50
+    assert report.periods_extrapolated == 0
+    simulated = generated(1)
+    simulated.advance_n(50)
+    np.testing.assert_array_equal(economy.calculate_price_index(),
+                                  simulated.calculate_price_index())
+
+
+def test_longer_cycle_than_max_cycle_not_looked_for():
+    # the (2, 3) sector repeats every 6 periods
+    frequencies = [(1, 1), (2, 3), (4, 2)]
+    assert handmade(frequencies).advance_n(600, converge=True,
+                                           max_cycle=6).converged
+    assert not handmade(frequencies).advance_n(600, converge=True,
+                                               max_cycle=5).converged
+
+
+def test_stochastic_never_extrapolated():
+    economy = generated(1)
+    economy.set_stochastic(True)
+    report = economy.advance_n(600, converge=True)
+    assert not report.converged
+    assert report.periods_simulated == 600
+
+
+def test_periodic_checks():
+    # every period grows by 1.5, then the growth over a cycle of 2 repeats
+    growing = 1.5 ** np.arange(9.0)[:, None]
+    assert convergence.is_periodic(growing, 1, 1e-12)
+    wobbling = growing * np.array([1, 2] * 4 + [1])[:, None]
+    assert not convergence.is_periodic(wobbling, 1, 1e-12)
+    assert convergence.is_periodic(wobbling, 2, 1e-12)
+    assert convergence.is_repeating(np.array([[0.3], [0.4]] * 3), 2, 0)
+    assert not convergence.is_repeating(np.array([[0.3], [0.4]] * 3), 1, 0.05)
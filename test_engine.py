@@ -0,0 +1,208 @@
+"""
+Checks that the array engine gives the same results as updating every
+Sector object on its own, which is what the model did before the engine
+existed. Run with python -m pytest.
+"""
+import random as rd
+import numpy as np
+import pytest
+from settings import Settings
+from gen import Generator
+from economy import Economy
+from params import GlobalParams, SectorParams
+from montecarlo import BatchRunner
+
+N_SECTORS = 40
+N_PERIODS = 60
+RTOL = 1e-12
+
+
+def make_settings(all_random=False, lags_match=False):
+    settings = Settings()
+    if all_random:
+        settings.set_all_random()
+    settings.set_lags_match(lags_match)
+    return settings
+
+
+def seed(value):
+    rd.seed(value)
+    np.random.seed(value)
+
+
+def make_pair(settings, n_sectors=N_SECTORS, seed_value=0):
+    """The same economy twice, one run by the engine and one without."""
+    economies = []
+    for _ in range(2):
+        seed(seed_value)
+        economies.append(Generator().generate(settings, n_sectors))
+    economies[1].set_vectorized(False)
+    return economies
+
+
+def assert_same(vectorized, unvectorized, index=True):
+    if index:
+        np.testing.assert_allclose(vectorized.calculate_price_index(),
+                                   unvectorized.calculate_price_index(),
+                                   rtol=RTOL)
+        for name in ['period_to_period_inflation_series',
+                     'year_over_year_inflation_series']:
+            np.testing.assert_allclose(getattr(vectorized, name)(),
+                                       getattr(unvectorized, name)(),
+                                       rtol=RTOL, atol=1e-15)
+    np.testing.assert_allclose(vectorized.shocks, unvectorized.shocks,
+                               rtol=RTOL)
+    for a, b in zip(vectorized.sectors, unvectorized.sectors):
+        for name in ['wages', 'prices', 'wage_shares']:
+            np.testing.assert_allclose(np.array(getattr(a, name)),
+                                       np.array(getattr(b, name)), rtol=RTOL)
+
+
+def run_both(pair, steps):
+    """Applies each step (a function of the economy) to both economies."""
+    for economy in pair:
+        for step in steps:
+            step(economy)
+    return pair
+
+
+def advance(n):
+    return lambda economy: economy.advance_n(n)
+
+
+@pytest.mark.parametrize('settings', [
+    make_settings(),
+    make_settings(lags_match=True),
+    make_settings(all_random=True),
+], ids=['default', 'lags_match', 'random'])
+def test_deterministic(settings):
+    vectorized, unvectorized = run_both(make_pair(settings),
+                                        [advance(N_PERIODS)])
+    assert vectorized.engine is not None and unvectorized.engine is None
+    assert_same(vectorized, unvectorized)
+
+
+def test_shared_shock():
+    pair = run_both(make_pair(make_settings(all_random=True)), [
+        advance(10),
+        lambda economy: economy.shock_all_sectors(0.05),
+        advance(N_PERIODS)])
+    assert_same(*pair)
+
+
+def test_per_sector_shock():
+    # identical sectors are merged into cohorts by the engine, so this also
+    # checks that they are split up before they get different shocks
+    sizes = np.linspace(-0.02, 0.05, N_SECTORS)
+    vectorized, unvectorized = run_both(
+        make_pair(make_settings(lags_match=True)), [
+            advance(10),
+            lambda economy: economy.shock_all_sectors(sizes),
+            advance(N_PERIODS)])
+    assert vectorized.engine.n_cohorts == N_SECTORS
+    assert_same(vectorized, unvectorized)
+    with pytest.raises(ValueError):
+        vectorized.shock_all_sectors(np.ones(3))
+
+
+@pytest.mark.parametrize('stochastic, locally_stochastic', [
+    (True, False), (False, True), (True, True)],
+    ids=['aggregate', 'local', 'both'])
+def test_stochastic(stochastic, locally_stochastic):
+    def start(economy):
+        economy.set_stochastic(stochastic)
+        economy.set_locally_stochastic(locally_stochastic)
+        np.random.seed(1)
+    assert_same(*run_both(make_pair(make_settings(all_random=True)), [
+        start, advance(N_PERIODS)]))
+
+
+def test_added_sector():
+    def add(economy):
+        economy.add_sector_from_data([0.6, 1, 1, 0, 0, 3, 4, 2, 3, 0.2])
+    # the new sector's history starts late, which the price index can't take,
+    # so only the histories are compared
+    assert_same(*run_both(make_pair(make_settings()), [
+        advance(5), add, advance(N_PERIODS)]), index=False)
+
+
+def test_float_frequencies():
+    # whole-number frequencies are the usual case, these have to work too
+    def make(vectorized):
+        economy = Economy(GlobalParams(0.7, 0.5, 0.5, 0.5, 12),
+                          vectorized=vectorized)
+        for freq_w, freq_f, lag_w, lag_f in [(1.5, 2.5, 1, 2), (3, 1.5, 2, 1),
+                                             (2.5, 2.5, 2, 2), (1, 4.5, 1, 3)]:
+            economy.add_sector_from_data([0.6, 1, 1, 0.5, 0.5, freq_w, freq_f,
+                                          lag_w, lag_f, 0.25])
+        return economy
+    assert_same(*run_both([make(True), make(False)], [advance(N_PERIODS)]))
+
+
+def test_reading_sectors_midway():
+    def read(economy):
+        economy.sectors[0].prices[-1]
+    assert_same(*run_both(make_pair(make_settings(all_random=True)), [
+        advance(7), read, advance(N_PERIODS)]))
+
+
+def test_held_sector_stays_current():
+    vectorized, unvectorized = make_pair(make_settings(all_random=True))
+    held = [economy.get_sector(0) for economy in (vectorized, unvectorized)]
+    for economy in (vectorized, unvectorized):
+        economy.advance_n(5)
+    assert vectorized.engine is not None
+    assert len(held[0].wages) == 6
+    # a parameter set on a held sector has to reach the running engine
+    for sector in held:
+        sector.params.set('phi', 9.0)
+    for economy in (vectorized, unvectorized):
+        economy.advance_n(5)
+    assert_same(vectorized, unvectorized)
+
+
+def test_history_changes_reach_engine():
+    vectorized, unvectorized = make_pair(make_settings())
+    for economy in (vectorized, unvectorized):
+        economy.advance_n(5)
+        economy.sectors[1].prices[-1] *= 1.1
+        economy.advance_n(5)
+    assert_same(vectorized, unvectorized)
+
+
+def test_reading_sectors_keeps_engine():
+    economy = make_pair(make_settings())[0]
+    for _ in range(5):
+        economy.advance()
+        engine = economy.engine
+        economy.get_sector(0).prices[-1]
+        assert economy.engine is engine
+
+
+def test_added_params_stay_bound():
+    economy = Generator().generate(make_settings(), 3)
+    params = SectorParams([0.6, 1, 1, 0, 0, 3, 4, 2, 3, 0.2],
+                          economy.global_params)
+    economy.add_sector(params)
+    assert economy.get_sector(3).params is params
+    params.set('mu', 2.0)
+    assert economy.get_param_column('mu')[3] == 2.0
+
+
+def test_batch_summary_matches_economy():
+    settings = make_settings(all_random=True)
+    statistics = ['inflation.mean', 'yoy_inflation.mean', 'wage_share.mean',
+                  'wage_share.count']
+    economy = Generator().generate_bulk(settings, N_SECTORS, rng=5)
+    single = economy.run_summary(N_PERIODS, statistics)
+    batch = BatchRunner(5).run_summary(settings, N_SECTORS, N_PERIODS, 1,
+                                       statistics)
+    for name in statistics:
+        np.testing.assert_allclose(batch[name], [single[name]], rtol=RTOL)
+
+
+def test_raw_index_is_read_only():
+    economy = Generator().generate(make_settings(), N_SECTORS)
+    economy.advance_n(10)
+    with pytest.raises(ValueError):
+        economy.get_raw_index_series()[3] = 0.0
@@ -0,0 +1,34 @@
+"""
+Checks that replicates depend only on the root seed, and that the settings
+they run with can't be changed from outside. Run with python -m pytest.
+"""
+import settings as settings_module
+from settings import Settings
+from executor import TaskSpec, ReplicateExecutor
+
+
+def test_settings_are_independent():
+    settings = Settings()
+    settings.set_global_default('v_w', 0.9)
+    settings.set_all_random()
+    assert Settings().get_global_default('v_w') == 0.7
+    assert Settings().check_if_default('w0')
+    assert settings_module.GLOBAL_DEFAULTS['v_w'] == 0.7
+    copied = settings.copy()
+    copied.set_global_default('v_w', 0.8)
+    assert settings.get_global_default('v_w') == 0.9
+
+
+def test_task_keeps_its_settings():
+    settings = Settings()
+    spec = TaskSpec(settings, 5, 20)
+    settings.set_global_default('v_w', 0.9)
+    assert spec.settings.get_global_default('v_w') == 0.7
+
+
+def test_same_results_for_any_number_of_workers():
+    spec = TaskSpec(Settings(), 5, 30)
+    serial = ReplicateExecutor(workers=1).run(spec, 6, seed=3)
+    pooled = ReplicateExecutor(workers=2).run(spec, 6, seed=3)
+    assert serial == pooled
+    assert serial != ReplicateExecutor(workers=1).run(spec, 6, seed=4)
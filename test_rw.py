@@ -0,0 +1,100 @@
+"""
+Checks loading sector parameters from CSV files in chunks: the sectors are
+the same as adding each row on its own, however big the chunks, and bad
+parameters are caught. Run with python -m pytest.
+"""
+import csv
+import numpy as np
+import pytest
+import rw
+from economy import Economy
+from params import GlobalParams, PARAMETER_INDICES
+
+N_ROWS = 23
+
+
+def make_rows(n_rows=N_ROWS):
+    rng = np.random.default_rng(0)
+    freq_w = rng.integers(1, 13, n_rows)
+    freq_f = rng.integers(1, 13, n_rows)
+    return np.column_stack([
+        rng.uniform(0.5, 1, n_rows), rng.uniform(0.5, 1.5, n_rows),
+        rng.uniform(0.5, 1.5, n_rows), rng.uniform(0, 0.2, n_rows),
+        rng.uniform(0, 0.2, n_rows), freq_w, freq_f,
+        rng.integers(1, freq_w + 1), rng.integers(1, freq_f + 1),
+        np.full(n_rows, 1 / n_rows)])
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(PARAMETER_INDICES.values())
+        writer.writerows(rows.tolist())
+    return str(path)
+
+
+def make_economy():
+    return Economy(GlobalParams(0.7, 0.5, 0.5, 0.5, 12))
+
+
+def row_by_row(rows):
+    economy = make_economy()
+    for row in rows:
+        economy.add_sector_from_data(row)
+    return economy
+
+
+@pytest.mark.parametrize('chunk_size', [1, 5, N_ROWS, 1000])
+def test_same_as_row_by_row(tmp_path, chunk_size):
+    rows = make_rows()
+    economy = make_economy()
+    economy.add_sectors_from_csv(write_csv(tmp_path / 'sectors.csv', rows),
+                                 chunk_size=chunk_size)
+    expected = row_by_row(rows)
+    for name in PARAMETER_INDICES.values():
+        np.testing.assert_array_equal(economy.get_param_column(name),
+                                      expected.get_param_column(name))
+    for each in [economy, expected]:
+        each.advance_n(40)
+    np.testing.assert_array_equal(economy.calculate_price_index(),
+                                  expected.calculate_price_index())
+
+
+def test_read_param_columns(tmp_path):
+    rows = make_rows()
+    # columns after the parameters are left out
+    extra = np.column_stack([rows, np.arange(N_ROWS)])
+    filename = write_csv(tmp_path / 'sectors.csv', extra)
+    columns = rw.read_param_columns(filename, chunk_size=4)
+    assert list(columns) == list(PARAMETER_INDICES.values())
+    for index, name in PARAMETER_INDICES.items():
+        np.testing.assert_array_equal(columns[name], rows[:, index])
+
+
+def test_empty_file(tmp_path):
+    filename = write_csv(tmp_path / 'sectors.csv',
+                         np.zeros((0, len(PARAMETER_INDICES))))
+    columns = rw.read_param_columns(filename)
+    assert all(len(column) == 0 for column in columns.values())
+    rw.validate_param_columns(columns)
+
+
+@pytest.mark.parametrize('column, value, message', [
+    (5, 0, 'freq_w < 1'),
+    (6, 0.5, 'freq_f < 1'),
+    (7, 0, 'lag_w not in'),
+    (8, 13, 'lag_f not in'),
+    (9, 0.5, 'index weights sum to'),
+])
+def test_bad_rows_caught(tmp_path, column, value, message):
+    rows = make_rows()
+    rows[[3, 17], column] = value
+    filename = write_csv(tmp_path / 'sectors.csv', rows)
+    with pytest.raises(ValueError, match=message) as error:
+        make_economy().add_sectors_from_csv(filename)
+    if column != 9:
+        assert 'rows [3, 17]' in str(error.value)
+    # and loaded anyway if asked not to check
+    economy = make_economy()
+    economy.add_sectors_from_csv(filename, validate=False)
+    assert len(economy.sectors) == N_ROWS
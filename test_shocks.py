@@ -0,0 +1,57 @@
+"""
+Checks that the pre-drawn shock paths come out exactly the same however a
+run is split up, and the same as drawing and updating once per period. Run
+with python -m pytest.
+"""
+import numpy as np
+import pytest
+import shocks
+from settings import Settings
+from gen import Generator
+
+
+def split_run(splits, stochastic, locally_stochastic):
+    settings = Settings()
+    settings.set_all_random()
+    settings.set_agg_stoch(stochastic)
+    settings.set_local_stoch(locally_stochastic)
+    economy = Generator().generate_bulk(settings, 10, rng=2)
+    for n in splits:
+        economy.advance_n(n)
+    return economy
+
+
+@pytest.mark.parametrize('stochastic, locally_stochastic', [
+    (True, False), (False, True), (True, True)])
+def test_same_however_split(stochastic, locally_stochastic):
+    runs = [split_run(splits, stochastic, locally_stochastic)
+            for splits in [[40], [20, 20], [1] * 40, [7, 300 - 7]]]
+    whole = runs[0]
+    for economy in runs[1:3]:
+        assert economy.shocks == whole.shocks
+        np.testing.assert_array_equal(economy.calculate_price_index(),
+                                      whole.calculate_price_index())
+    # a longer run starts with the same shocks as a shorter one
+    assert runs[3].shocks[:len(whole.shocks)] == whole.shocks
+
+
+def test_path_same_as_one_period_at_a_time():
+    rng = np.random.default_rng(0)
+    path = shocks.ShockPath(rng=rng, shape=(3,))
+    drawn = np.array([path.next() for _ in range(50)])
+    rng = np.random.default_rng(0)
+    value = np.zeros(3)
+    for period in range(50):
+        value = shocks.ALPHA * value + rng.normal(0, shocks.SIGMA_ETA, 3)
+        assert np.array_equal(drawn[period], value)
+
+
+def test_path_follows_changed_shock():
+    # a single shock added on top carries on from the new value
+    path = shocks.ShockPath(rng=np.random.default_rng(1))
+    first = path.next()
+    second = path.next(first + 0.05)
+    rng = np.random.default_rng(1)
+    draws = rng.normal(0, shocks.SIGMA_ETA, 10)
+    assert first == draws[0]
+    assert second == shocks.ALPHA * (first + 0.05) + draws[1]
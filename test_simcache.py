@@ -0,0 +1,98 @@
+"""
+Checks that the result cache is transparent, a hit giving the same result
+and leaving everything in the same state as a miss, and that the least
+recently used entries are evicted first. Run with python -m pytest.
+"""
+import os
+import numpy as np
+import pytest
+import settings as settings_module
+import simcache
+import experiments
+from settings import Settings
+from gen import Generator
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = simcache.enable(str(tmp_path))
+    yield cache
+    simcache.set_default_cache(None)
+
+
+def defaults():
+    return (dict(settings_module.GLOBAL_DEFAULTS),
+            dict(settings_module.SECTOR_DEFAULTS))
+
+
+def test_cached_call(cache):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return [[1.5, 2.0], [3.0, 4.25]]
+    first = simcache.cached_call('f', compute, 0, x=1)
+    second = simcache.cached_call('f', compute, 0, x=1)
+    assert first == second
+    assert len(calls) == 1
+    simcache.cached_call('f', compute, 0, x=2)
+    simcache.cached_call('f', compute, None, x=1) # no seed, never cached
+    assert len(calls) == 3
+    assert cache.get_stats()['hits'] == 1
+
+
+def run_experiments():
+    sweep = experiments.yoy_inflation_based_on_desire_offset(
+        lags_match=True, n_sectors=1, n_periods=20, seed=1)
+    return sweep, experiments.get_average_when_lags_match(seed=1)
+
+
+def test_experiments_hit_same_as_miss(tmp_path):
+    before = defaults()
+    uncached = run_experiments()
+    assert defaults() == before
+    simcache.enable(str(tmp_path))
+    try:
+        missed = run_experiments()
+        assert defaults() == before
+        hit = run_experiments()
+        assert defaults() == before
+        assert simcache.get_default_cache().get_stats()['hits'] == 2
+    finally:
+        simcache.set_default_cache(None)
+    assert missed == uncached
+    assert hit == uncached
+
+
+def test_economy_hit_same_as_miss(tmp_path):
+    settings = Settings()
+    settings.set_all_random()
+    uncached, missed, hit = [Generator().generate_bulk(settings, 20, rng=0)
+                             for _ in range(3)]
+    cache = simcache.ResultCache(str(tmp_path))
+    missed.result_cache = hit.result_cache = cache
+    for economy in (uncached, missed, hit):
+        economy.advance_n(30)
+        # carrying on after the cached periods has to give the same too
+        economy.advance_n(1)
+    assert cache.get_stats()['hits'] == 2
+    for economy in (missed, hit):
+        np.testing.assert_array_equal(economy.calculate_price_index(),
+                                      uncached.calculate_price_index())
+    for economy in (missed, hit):
+        for a, b in zip(economy.sectors, uncached.sectors):
+            assert list(a.prices) == list(b.prices)
+
+
+def test_least_recently_used_evicted(tmp_path):
+    cache = simcache.ResultCache(str(tmp_path), max_bytes=10 ** 9)
+    for number, key in enumerate(['a', 'b', 'c']):
+        cache.put(key, {'x' : np.zeros(1000)})
+        os.utime(cache.path(key), (number, number))
+    assert cache.get('a') is not None # now the most recently used
+    size = os.path.getsize(cache.path('a'))
+    cache.max_bytes = 2 * size
+    cache.evict()
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.get_stats()['evictions'] == 1
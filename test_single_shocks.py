@@ -0,0 +1,68 @@
+"""
+Checks single shocks (do_single_shock): they only reach the sectors whose
+prices reset, the engine applies them the same as the Sector objects, and
+they stop being applied once they have died out. Run with python -m pytest.
+"""
+import numpy as np
+import pytest
+from settings import Settings
+from gen import Generator
+from shocks import ALPHA, SHOCK_THRESHOLD
+
+N_SECTORS = 30
+SIZE = 0.05
+
+
+def shocked(vectorized=True, threshold=None, size=SIZE, n_periods=80):
+    economy = Generator().generate_bulk(Settings(), N_SECTORS, rng=0)
+    economy.set_vectorized(vectorized)
+    if threshold is not None:
+        economy.set_shock_threshold(threshold)
+    economy.single_shocks = True
+    economy.advance_n(9)
+    economy.do_single_shock(size)
+    economy.advance_n(n_periods)
+    return economy
+
+
+def prices(economy):
+    return np.array([list(sector.prices) for sector in economy.sectors])
+
+
+@pytest.mark.parametrize('threshold', [None, 0], ids=['default', 'never'])
+def test_engine_same_as_sectors(threshold):
+    vectorized = shocked(True, threshold)
+    unvectorized = shocked(False, threshold)
+    assert vectorized.shocks == unvectorized.shocks
+    np.testing.assert_allclose(prices(vectorized), prices(unvectorized),
+                               rtol=1e-12)
+
+
+def test_only_due_sectors_shocked():
+    economy = shocked(n_periods=0)
+    unshocked = prices(shocked(size=0.0, n_periods=0))
+    last_period = unshocked.shape[1] - 1
+    due = ((last_period - economy.get_param_column('lag_f')) %
+           economy.get_param_column('freq_f') == 0)
+    assert due.any() and not due.all()
+    changed = prices(economy)[:, -1] != unshocked[:, -1]
+    assert (changed == due).all()
+    np.testing.assert_allclose(
+        prices(economy)[due, -1],
+        unshocked[due, -1] + SIZE * unshocked[due, -2], rtol=1e-15)
+
+
+def test_stops_once_died_out():
+    economy = shocked()
+    applied = [shock for shock in economy.shocks if shock != 0]
+    np.testing.assert_allclose(
+        applied, SIZE * ALPHA ** np.arange(len(applied)), rtol=1e-12)
+    # recorded as 0 from the first period it would be below the threshold
+    assert abs(ALPHA * applied[-1]) < SHOCK_THRESHOLD <= abs(applied[-1])
+    tail = economy.shocks[economy.shocks.index(applied[-1]) + 1:]
+    assert tail and all(shock == 0.0 for shock in tail)
+
+
+def test_dropped_shock_negligible():
+    np.testing.assert_allclose(prices(shocked()),
+                               prices(shocked(threshold=0)), rtol=1e-15)